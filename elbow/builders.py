@@ -1,24 +1,34 @@
 import logging
+import multiprocessing as mp
 import shutil
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
 from datetime import datetime
 from functools import partial
 from glob import iglob
 from pathlib import Path
-from typing import Any, Callable, Iterable, List, Optional, Tuple, Union
+from queue import Empty
+from typing import Any, Callable, Iterable, List, Optional, Sequence, Tuple, Union
 
 import pandas as pd
+from pyarrow import compute as pc
+from pyarrow import parquet as pq
 
+from elbow.dataset import update_manifest
 from elbow.extractors import Extractor
 from elbow.filters import FileModifiedIndex, hash_partitioner
 from elbow.pipeline import Pipeline
 from elbow.record import RecordBatch
-from elbow.sinks import BufferedParquetWriter
+from elbow.sinks import BufferedParquetWriter, SQLiteSink
+from elbow.sources import ArchiveSource
 from elbow.typing import StrOrPath
 from elbow.utils import atomicopen, cpu_count
 
 logger = logging.getLogger(__name__)
 
+# Seconds between checks for failed workers while waiting on the worker queue.
+_QUEUE_POLL_INTERVAL = 1.0
+_EMPTY = object()
+
 
 def build_table(
     source: Union[str, Iterable[StrOrPath]],
@@ -27,13 +37,17 @@ def build_table(
     workers: Optional[int] = None,
     worker_id: Optional[int] = None,
     max_failures: Optional[int] = 0,
+    dtype_backend: Optional[str] = None,
+    sparse_threshold: Optional[float] = None,
 ) -> pd.DataFrame:
     """
     Extract records from a stream of files and load into a pandas DataFrame
 
     Args:
         source: shell-style file pattern as in `glob.glob()` or iterable of paths.
-            Patterns containing '**' will match any files and zero or more directories
+            Patterns containing '**' will match any files and zero or more directories.
+            Can also be an `ArchiveSource`, streaming the members of tar or zip
+            archives as file objects.
         extract: extract function mapping file paths to records
         workers: number of parallel processes. If `None` or 1, run in the main
             process. Setting to -1 runs as many processes as there are cores available.
@@ -41,6 +55,11 @@ def build_table(
             Specifying the number of workers is required in this case. Incompatible with
             overwrite.
         max_failures: number of failures to tolerate
+        dtype_backend: backend for non-extension columns. ``None`` for default numpy
+            dtypes, or ``"pyarrow"`` for ``pd.ArrowDtype`` columns.
+        sparse_threshold: optional density threshold. Inferred multi-dimensional
+            array columns that are mostly zeros are stored as ``sparse_ndarray``. See
+            `elbow.record.RecordBatch`.
 
     Returns:
         A DataFrame containing the concatenated records (in arbitrary order)
@@ -53,9 +72,14 @@ def build_table(
         extract=extract,
         workers=workers,
         max_failures=max_failures,
+        dtype_backend=dtype_backend,
+        sparse_threshold=sparse_threshold,
     )
 
     results = _run_pool(_worker, workers, worker_id)
+    if len(results) == 1:
+        # Avoid the copy in concat.
+        return results[0]
     df = pd.concat(results, axis=0, ignore_index=True)
     return df
 
@@ -67,21 +91,23 @@ def _build_table_worker(
     extract: Extractor,
     workers: int,
     max_failures: Optional[int],
+    dtype_backend: Optional[str] = None,
+    sparse_threshold: Optional[float] = None,
 ):
     if isinstance(source, str):
         source = iglob(source, recursive=True)
 
     if workers > 1:
-        partitioner = hash_partitioner(worker_id, workers)
-        source = filter(partitioner, source)
+        source = _partition_source(source, worker_id, workers)
 
-    batch = RecordBatch()
+    batch = RecordBatch(sparse_threshold=sparse_threshold)
     pipe = Pipeline(
         source=source, extract=extract, sink=batch.append, max_failures=max_failures
     )
     pipe.run()
 
-    df = batch.to_df()
+    # The batch is discarded, so release it during conversion to save memory.
+    df = batch.to_df(dtype_backend=dtype_backend, release=True)
     return df
 
 
@@ -97,13 +123,16 @@ def build_parquet(
     max_failures: Optional[int] = 0,
     path_column: str = "file_path",
     mtime_column: str = "mod_time",
+    sparse_threshold: Optional[float] = None,
 ) -> None:
     """
     Extract records from a stream of files and save as a Parquet dataset
 
     Args:
         source: shell-style file pattern as in `glob.glob()` or iterable of paths.
-            Patterns containing '**' will match any files and zero or more directories
+            Patterns containing '**' will match any files and zero or more directories.
+            Can also be an `ArchiveSource`, streaming the members of tar or zip
+            archives as file objects.
         extract: extract function mapping file paths to records
         output: path to output parquet dataset directory
         incremental: update dataset incrementally with only new or changed files.
@@ -114,8 +143,19 @@ def build_parquet(
             Specifying the number of workers is required in this case. Incompatible with
             overwrite.
         max_failures: number of extract failures to tolerate
-        path_column: file path column name, only used when `incremental=True`.
-        mtime_column: file path column modified time, only used when `incremental=True`.
+        path_column: file path column name. Used to filter for new or changed files
+            when `incremental=True` and for the manifest statistics.
+        mtime_column: file modified time column name. Used to filter for new or
+            changed files when `incremental=True` and for the manifest statistics.
+        sparse_threshold: optional density threshold. Inferred multi-dimensional
+            array columns that are mostly zeros are stored as ``sparse_ndarray``. See
+            `elbow.record.RecordBatch`.
+
+    A JSON manifest ``_manifest`` listing each part file with its row count, byte size,
+    schema hash, and per-row-group min/max of the `path_column` and `mtime_column` is
+    maintained in the `output` directory. Incremental parts also record which
+    previously extracted files they supersede. See `elbow.dataset.DatasetManifest` and
+    `elbow.dataset.read_latest()`.
     """
     workers, worker_id = _check_workers(workers, worker_id)
     if worker_id is not None and overwrite:
@@ -138,6 +178,7 @@ def build_parquet(
         max_failures=max_failures,
         path_column=path_column,
         mtime_column=mtime_column,
+        sparse_threshold=sparse_threshold,
     )
 
     _run_pool(_worker, workers, worker_id)
@@ -154,12 +195,19 @@ def _build_parquet_worker(
     max_failures: Optional[int],
     path_column: str,
     mtime_column: str,
+    sparse_threshold: Optional[float] = None,
 ):
     start = datetime.now()
-    output = Path(output)
+    root = output = Path(output)
     if isinstance(source, str):
         source = iglob(source, recursive=True)
 
+    # TODO: maybe let user specify partition key function? By default we will get
+    # random assignment of paths to workers.
+    if workers > 1:
+        source = _partition_source(source, worker_id, workers)
+
+    file_mod_index = None
     if incremental and output.exists():
         # NOTE: Race to read index while other workers try to write.
         # But it shouldn't matter since each worker gets a unique partition.
@@ -168,12 +216,6 @@ def _build_parquet_worker(
         )
         source = filter(file_mod_index, source)
 
-    # TODO: maybe let user specify partition key function? By default we will get
-    # random assignment of paths to workers.
-    if workers > 1:
-        partitioner = hash_partitioner(worker_id, workers)
-        source = filter(partitioner, source)
-
     # Include start time in file name in case of multiple incremental loads.
     start_fmt = start.strftime("%Y%m%d%H%M%S")
     output = output / f"part-{start_fmt}-{worker_id:04d}-of-{workers:04d}.parquet"
@@ -183,16 +225,224 @@ def _build_parquet_worker(
 
     # Using atomicopen to avoid partial output files and empty file errors.
     with atomicopen(output, "wb") as f:
-        with BufferedParquetWriter(where=f) as writer:
+        with BufferedParquetWriter(
+            where=f, sparse_threshold=sparse_threshold
+        ) as writer:
             # TODO: should this just be a function?
             pipe = Pipeline(
                 source=source, extract=extract, sink=writer, max_failures=max_failures
             )
             counts = pipe.run()
 
+    # Register the new part in the dataset manifest. Nothing gets written if there
+    # were no records.
+    if output.exists():
+        supersedes = None
+        if file_mod_index is not None:
+            supersedes = (
+                path_column,
+                _superseded_paths(output, file_mod_index, path_column),
+            )
+        update_manifest(
+            root,
+            output,
+            stats_columns=[path_column, mtime_column],
+            created=start.timestamp(),
+            supersedes=supersedes,
+        )
     return counts
 
 
+def _superseded_paths(
+    part: Path, file_mod_index: FileModifiedIndex, path_column: str
+) -> List[str]:
+    """
+    Find the paths in a new part that were already present in the dataset.
+    """
+    paths = pq.read_table(part, columns=[path_column])[path_column]
+    paths = pc.unique(paths).to_pylist()
+    return [path for path in paths if path in file_mod_index]
+
+
+def build_sqlite(
+    source: Union[str, Iterable[StrOrPath]],
+    extract: Extractor,
+    output: StrOrPath,
+    *,
+    table: str = "elbow",
+    index: Optional[Sequence[str]] = ("file_path",),
+    overwrite: bool = False,
+    workers: Optional[int] = None,
+    max_failures: Optional[int] = 0,
+    batch_size: int = 10000,
+) -> None:
+    """
+    Extract records from a stream of files and save as a SQLite database table
+
+    Records are extracted in parallel by the workers and sent in batches to a single
+    writer running in the main process. If a worker fails, the remaining workers are
+    cancelled and its exception is raised.
+
+    Args:
+        source: shell-style file pattern as in `glob.glob()` or iterable of paths.
+            Patterns containing '**' will match any files and zero or more directories.
+            Can also be an `ArchiveSource`, streaming the members of tar or zip
+            archives as file objects.
+        extract: extract function mapping file paths to records
+        output: path to output SQLite database file
+        table: name of the output table
+        index: columns to index after all records are inserted. Missing columns are
+            skipped with a warning.
+        overwrite: overwrite previous results.
+        workers: number of parallel extract processes. If `None` or 1, run in the main
+            process. Setting to -1 runs as many processes as there are cores available.
+        max_failures: number of extract failures to tolerate
+        batch_size: number of records per batch sent to the writer and inserted per
+            transaction.
+    """
+    workers, _ = _check_workers(workers, None)
+
+    if Path(output).exists():
+        if overwrite:
+            Path(output).unlink()
+        else:
+            raise FileExistsError(f"SQLite output {output} already exists")
+    # Leftover write-ahead log files would be replayed into the new database.
+    for suffix in ("-wal", "-shm"):
+        journal = Path(f"{output}{suffix}")
+        if journal.exists():
+            journal.unlink()
+    Path(output).parent.mkdir(parents=True, exist_ok=True)
+
+    with SQLiteSink(output, table=table, index=index, batch_size=batch_size) as sink:
+        if workers == 1:
+            pipe = Pipeline(
+                source=_iter_source(source),
+                extract=extract,
+                sink=sink,
+                max_failures=max_failures,
+            )
+            pipe.run()
+            return
+
+        with mp.Manager() as manager:
+            # Bounded queue so that fast workers can't run away from the writer.
+            queue = manager.Queue(maxsize=4 * workers)
+            _worker = partial(
+                _build_sqlite_worker,
+                source=source,
+                extract=extract,
+                queue=queue,
+                workers=workers,
+                max_failures=max_failures,
+                batch_size=batch_size,
+            )
+
+            with ProcessPoolExecutor(workers) as pool:
+                futures = [pool.submit(_worker, ii) for ii in range(workers)]
+                error = _drain_queue(queue, futures, sink)
+            if error is not None:
+                raise error
+
+
+def _drain_queue(
+    queue: Any, futures: List[Future], sink: SQLiteSink
+) -> Optional[BaseException]:
+    """
+    Write batches from the worker queue until each worker has sent its final `None`,
+    or has finished without sending it (e.g. if it couldn't be started).
+
+    After the first worker exception, pending workers are cancelled and the remaining
+    batches are discarded, so that running workers don't block on a full queue. The
+    exception is returned.
+    """
+    error = None
+    done = 0
+    while done < len(futures):
+        try:
+            batch = queue.get(timeout=_QUEUE_POLL_INTERVAL)
+        except Empty:
+            batch = _EMPTY
+        if batch is None:
+            done += 1
+        elif batch is not _EMPTY and error is None:
+            sink.write_table(batch)
+
+        if error is None:
+            error = _worker_exception(futures)
+            if error is not None:
+                logger.warning("Generated exception in worker", exc_info=error)
+                for future in futures:
+                    future.cancel()
+
+        # Batches are put synchronously, so once all the workers are finished and the
+        # queue is empty, nothing else is coming.
+        if batch is _EMPTY and all(future.done() for future in futures):
+            break
+    return error
+
+
+def _worker_exception(futures: List[Future]) -> Optional[BaseException]:
+    for future in futures:
+        if future.done() and not future.cancelled():
+            exc = future.exception()
+            if exc is not None:
+                return exc
+    return None
+
+
+def _build_sqlite_worker(
+    worker_id: int,
+    *,
+    source: Union[str, Iterable[StrOrPath]],
+    extract: Extractor,
+    queue: Any,
+    workers: int,
+    max_failures: Optional[int],
+    batch_size: int,
+):
+    try:
+        source = _partition_source(_iter_source(source), worker_id, workers)
+
+        batch = RecordBatch()
+
+        def _sink(record):
+            batch.append(record)
+            if len(batch) >= batch_size:
+                queue.put(batch.to_arrow())
+                batch.clear()
+
+        pipe = Pipeline(
+            source=source, extract=extract, sink=_sink, max_failures=max_failures
+        )
+        counts = pipe.run()
+
+        if len(batch) > 0:
+            queue.put(batch.to_arrow())
+    finally:
+        queue.put(None)
+    return counts
+
+
+def _iter_source(source: Union[str, Iterable[StrOrPath]]) -> Iterable[StrOrPath]:
+    if isinstance(source, str):
+        source = iglob(source, recursive=True)
+    return source
+
+
+def _partition_source(
+    source: Iterable[StrOrPath], worker_id: int, workers: int
+) -> Iterable[StrOrPath]:
+    """
+    Select the worker's partition of the source. Archive sources are partitioned by
+    archive, so that each archive is read by exactly one worker.
+    """
+    partitioner = hash_partitioner(worker_id, workers)
+    if isinstance(source, ArchiveSource):
+        return source.filter_archives(partitioner)
+    return filter(partitioner, source)
+
+
 def _check_workers(workers: Optional[int], worker_id: Optional[int]) -> Tuple[int, int]:
     if workers is None:
         workers = 1
@@ -0,0 +1,348 @@
+"""
+Parquet dataset manifest for fast planning, and merge-on-read of incrementally built
+datasets.
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import pyarrow as pa
+from pyarrow import compute as pc
+from pyarrow import dataset as ds
+from pyarrow import parquet as pq
+from pyarrow.fs import LocalFileSystem
+
+from elbow.typing import StrOrPath
+from elbow.utils import atomicopen
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore
+
+__all__ = ["MANIFEST_NAME", "DatasetManifest", "update_manifest", "read_latest"]
+
+MANIFEST_NAME = "_manifest"
+MANIFEST_VERSION = 1
+
+logger = logging.getLogger(__name__)
+
+_true = pc.scalar(True)
+
+
+class DatasetManifest:
+    """
+    A manifest of the part files in a Parquet dataset directory, with per-part row
+    counts, byte sizes, schema hashes and per-row-group min/max statistics for a few key
+    columns.
+
+    The manifest is stored as a small JSON file ``_manifest`` in the dataset directory.
+    (Like ``_metadata``, files starting with ``"_"`` are ignored by pyarrow and pandas
+    when reading the dataset.) Readers can use it to plan reads without opening the
+    footer of every part, and to skip parts that can't match a filter.
+
+    Example::
+
+        manifest = DatasetManifest.load("dset.pqds")
+        table = manifest.dataset("dset.pqds").to_table(columns=["file_path"])
+    """
+
+    def __init__(
+        self,
+        parts: Optional[List[Dict[str, Any]]] = None,
+        schemas: Optional[Dict[str, str]] = None,
+    ):
+        self.parts = [] if parts is None else parts
+        self.schemas = {} if schemas is None else schemas
+
+    @classmethod
+    def load(cls, root: StrOrPath) -> Optional["DatasetManifest"]:
+        """
+        Load the manifest for the dataset at `root`. Returns `None` if there's no
+        manifest.
+        """
+        path = Path(root) / MANIFEST_NAME
+        if not path.exists():
+            return None
+        with path.open() as f:
+            state = json.load(f)
+        if state.get("version") != MANIFEST_VERSION:
+            logger.warning("Ignoring manifest %s with unknown version", path)
+            return None
+        return cls(parts=state["parts"], schemas=state["schemas"])
+
+    def save(self, root: StrOrPath) -> None:
+        """
+        Atomically save the manifest to the dataset directory `root`.
+        """
+        state = {
+            "version": MANIFEST_VERSION,
+            "parts": self.parts,
+            "schemas": self.schemas,
+        }
+        with atomicopen(Path(root) / MANIFEST_NAME, "w") as f:
+            json.dump(state, f)
+
+    def add_part(self, part: Dict[str, Any], schema: pa.Schema) -> None:
+        """
+        Add (or replace) a part entry.
+        """
+        self.schemas.setdefault(part["schema"], _encode_schema(schema))
+        self.parts = [p for p in self.parts if p["name"] != part["name"]]
+        self.parts.append(part)
+
+    def files(self, root: StrOrPath) -> List[str]:
+        """
+        List the part file paths under the dataset directory `root`.
+        """
+        return [str(Path(root) / part["name"]) for part in self.parts]
+
+    def num_rows(self) -> int:
+        """
+        Total number of rows in the dataset.
+        """
+        return sum(part["num_rows"] for part in self.parts)
+
+    def schema(self) -> pa.Schema:
+        """
+        The unified schema of all parts.
+        """
+        schemas = [_decode_schema(self.schemas[part["schema"]]) for part in self.parts]
+        if not schemas:
+            return pa.schema([])
+        return pa.unify_schemas(schemas)
+
+    def is_complete(self, root: StrOrPath) -> bool:
+        """
+        Check that the manifest covers exactly the parquet files present in `root`.
+        """
+        names = {
+            name
+            for name in os.listdir(root)
+            if name.endswith(".parquet") and not name.startswith(("_", "."))
+        }
+        return names == {part["name"] for part in self.parts}
+
+    def dataset(self, root: StrOrPath) -> ds.Dataset:
+        """
+        Construct a pyarrow dataset for the parts in the manifest. Part footers are not
+        opened up front for schema discovery.
+
+        The min/max statistics of each part are attached as its partition expression,
+        so that filtered reads (e.g. ``dset.to_table(filter=pc.field("file_path") ==
+        path)``) skip the parts that can't match without opening them.
+        """
+        schema = self.schema()
+        return ds.FileSystemDataset.from_paths(
+            self.files(root),
+            schema=schema,
+            format=ds.ParquetFileFormat(),
+            filesystem=LocalFileSystem(),
+            partitions=[_stats_expression(part, schema) for part in self.parts],
+        )
+
+    def __len__(self) -> int:
+        return len(self.parts)
+
+
+def read_latest(
+    root: StrOrPath,
+    columns: Optional[List[str]] = None,
+    filter: Optional[ds.Expression] = None,
+) -> pa.Table:
+    """
+    Read the latest view of an incrementally built dataset, dropping rows for files
+    that were re-extracted in a later incremental build.
+
+    Rather than loading everything and de-duplicating, rows are dropped per part with a
+    filter on the path column, using the superseded paths recorded in the manifest.
+    Parts that nothing supersedes are read as is.
+
+    Args:
+        root: path to the parquet dataset directory written by `build_parquet()`
+        columns: optional list of columns to read
+        filter: optional pyarrow dataset filter expression, applied to each part
+
+    Returns:
+        A pyarrow Table with the current rows (in part order)
+    """
+    manifest = DatasetManifest.load(root)
+    if manifest is None or not manifest.is_complete(root):
+        raise ValueError(f"Dataset {root} doesn't have an up to date manifest")
+
+    dset = manifest.dataset(root)
+    # Parts whose statistics rule out the filter are skipped.
+    fragments = {
+        Path(frag.path).name: frag
+        for frag in dset.get_fragments(filter=_true if filter is None else filter)
+    }
+    parts = sorted(manifest.parts, key=lambda part: part.get("created", 0.0))
+
+    # Walk from newest to oldest, accumulating the paths superseded by later parts.
+    tables = []
+    superseded: Dict[str, List[str]] = {}
+    for part in reversed(parts):
+        expr = filter
+        for path_column, paths in superseded.items():
+            mask = ~pc.field(path_column).isin(paths)
+            expr = mask if expr is None else (expr & mask)
+
+        if part["name"] in fragments:
+            table = fragments[part["name"]].to_table(
+                schema=dset.schema, columns=columns, filter=expr
+            )
+            tables.append(table)
+
+        if "supersedes" in part:
+            path_column = part["supersedes"]["column"]
+            superseded.setdefault(path_column, []).extend(part["supersedes"]["paths"])
+
+    tables.reverse()
+    if not tables:
+        return dset.to_table(columns=columns, filter=filter)
+    return pa.concat_tables(tables)
+
+
+def _part_info(
+    path: StrOrPath,
+    stats_columns: Sequence[str] = (),
+) -> Tuple[Dict[str, Any], pa.Schema]:
+    """
+    Collect the manifest entry and schema for a single parquet part file, including
+    min/max statistics per row group for `stats_columns`.
+    """
+    path = Path(path)
+    metadata = pq.read_metadata(path)
+    schema = metadata.schema.to_arrow_schema()
+
+    col_indices = {
+        metadata.schema.column(ii).path: ii for ii in range(metadata.num_columns)
+    }
+
+    row_groups = []
+    for ii in range(metadata.num_row_groups):
+        group = metadata.row_group(ii)
+        stats = {}
+        for name in stats_columns:
+            if name not in col_indices:
+                continue
+            col_stats = group.column(col_indices[name]).statistics
+            if col_stats is None or not col_stats.has_min_max:
+                continue
+            if not _is_json_scalar(col_stats.min):
+                continue
+            null_count = col_stats.null_count if col_stats.has_null_count else None
+            stats[name] = [col_stats.min, col_stats.max, null_count]
+        row_groups.append({"num_rows": group.num_rows, "stats": stats})
+
+    info = {
+        "name": path.name,
+        "num_rows": metadata.num_rows,
+        "num_bytes": path.stat().st_size,
+        "schema": _schema_hash(schema),
+        "row_groups": row_groups,
+    }
+    return info, schema
+
+
+def update_manifest(
+    root: StrOrPath,
+    part: StrOrPath,
+    stats_columns: Sequence[str] = (),
+    created: Optional[float] = None,
+    supersedes: Optional[Tuple[str, List[str]]] = None,
+) -> None:
+    """
+    Add the parquet `part` file to the manifest for the dataset at `root`. Safe to call
+    concurrently from multiple processes (on platforms supporting ``fcntl``).
+
+    Args:
+        root: dataset directory
+        part: path to the new part file
+        stats_columns: columns to collect row group min/max statistics for
+        created: part creation timestamp, used to order parts. Defaults to the file
+            modified time.
+        supersedes: optional tuple of a path column name and a list of paths in that
+            column superseded by this part.
+    """
+    info, schema = _part_info(part, stats_columns=stats_columns)
+    info["created"] = Path(part).stat().st_mtime if created is None else created
+    if supersedes is not None and supersedes[1]:
+        path_column, paths = supersedes
+        info["supersedes"] = {"column": path_column, "paths": sorted(paths)}
+    with _lock(Path(root) / "_manifest.lock"):
+        manifest = DatasetManifest.load(root) or DatasetManifest()
+        manifest.add_part(info, schema)
+        manifest.save(root)
+
+
+def _stats_expression(part: Dict[str, Any], schema: pa.Schema) -> ds.Expression:
+    """
+    Construct an expression that holds for every row of a part, from the min/max
+    statistics of its row groups. Only columns with statistics for every row group and
+    no nulls are used, since null rows don't satisfy range comparisons.
+    """
+    expr = _true
+    row_groups = part.get("row_groups", [])
+    if not row_groups:
+        return expr
+
+    names = set.intersection(*(set(group["stats"]) for group in row_groups))
+    for name in sorted(names):
+        stats = [group["stats"][name] for group in row_groups]
+        if any(len(stat) < 3 or stat[2] != 0 for stat in stats):
+            continue
+        if schema.get_field_index(name) < 0:
+            continue
+        typ = schema.field(name).type
+        if not (
+            pa.types.is_integer(typ)
+            or pa.types.is_floating(typ)
+            or pa.types.is_string(typ)
+            or pa.types.is_large_string(typ)
+        ):
+            continue
+        try:
+            lo = pa.scalar(min(stat[0] for stat in stats), type=typ)
+            hi = pa.scalar(max(stat[1] for stat in stats), type=typ)
+        except (pa.ArrowException, TypeError):
+            continue
+        expr = expr & (pc.field(name) >= lo) & (pc.field(name) <= hi)
+    return expr
+
+
+@contextmanager
+def _lock(path: Path):
+    """
+    Hold an exclusive advisory lock on `path` while in context.
+    """
+    with path.open("a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _is_json_scalar(value: Any) -> bool:
+    return isinstance(value, (str, int, float, bool))
+
+
+def _encode_schema(schema: pa.Schema) -> str:
+    return base64.b64encode(schema.serialize().to_pybytes()).decode()
+
+
+def _decode_schema(encoded: str) -> pa.Schema:
+    return pa.ipc.read_schema(pa.py_buffer(base64.b64decode(encoded)))
+
+
+def _schema_hash(schema: pa.Schema) -> str:
+    return hashlib.md5(schema.serialize().to_pybytes()).hexdigest()
@@ -13,6 +13,9 @@
 
 from ._json import *  # noqa
 from ._ndarray import *  # noqa
+from ._nested import *  # noqa
 from ._pickle import *  # noqa
+from ._serializers import *  # noqa
+from ._sparse import *  # noqa
 from .base import *  # noqa
 from .inference import *  # noqa
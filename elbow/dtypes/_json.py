@@ -1,12 +1,19 @@
 import json
-from typing import Any, Iterable, Optional, Union
+from typing import Any, Dict, Iterable, List, Optional, Union
 
 import numpy as np
 import pyarrow as pa
+import pyarrow.compute as pc
 from pandas.api.extensions import register_extension_dtype
 
 from ._pandas_array import PandasArray
-from .base import PaExtensionArray, PaExtensionScalar, PaExtensionType, PdExtensionDtype
+from .base import (
+    PaExtensionArray,
+    PaExtensionScalar,
+    PaExtensionType,
+    PdExtensionDtype,
+    binary_buffers,
+)
 
 __all__ = [
     "PaJSONType",
@@ -19,16 +26,61 @@ __all__ = [
 class PaJSONType(PaExtensionType):
     """
     PyArrow extension type for holding JSON-encoded objects.
+
+    By default, objects are stored as JSON strings. Alternatively, a "shredded" layout
+    stores dict objects in a struct with native typed fields plus a ``"__rest__"`` JSON
+    string field holding any remaining keys (or the whole value for non-dicts). This
+    way, the shredded fields are stored natively in Parquet, with statistics and column
+    pruning.
+
+    Args:
+        fields: optional mapping of shredded field names to types. Only ``bool``,
+            ``int64``, ``double`` and ``string`` fields are supported.
+        auto: infer the shredded fields from the first batch of values packed with
+            ``pack_array()``. Shredded fields are keys present in all dict values, with
+            values of a consistent scalar type. Until then, values are stored as JSON
+            strings.
     """
 
-    def __init__(self):
-        super().__init__(pa.string(), "json")
+    def __init__(
+        self,
+        fields: Optional[Union[pa.StructType, Dict[str, pa.DataType]]] = None,
+        auto: bool = False,
+    ):
+        if fields is not None and auto:
+            raise ValueError("Only one of fields or auto can be set")
+
+        self.auto = auto
+        self.fields: Optional[pa.StructType] = None
+        if fields is not None:
+            self.fields = pa.struct(fields)
+            for field in self.fields:
+                if field.type not in _SHRED_PY_TYPES:
+                    raise ValueError(f"Unsupported shredded field type {field}")
+                if field.name == REST_FIELD:
+                    raise ValueError(f"Field name {REST_FIELD} is reserved")
+
+        if self.fields is None:
+            storage_type = pa.string()
+        else:
+            storage_type = pa.struct(list(self.fields) + [(REST_FIELD, pa.string())])
+        super().__init__(storage_type, "json")
 
     def __arrow_ext_serialize__(self):
+        if self.auto:
+            return b"auto"
+        # Shredded fields are recovered from the storage type.
+        if self.fields is not None:
+            return b"shred"
         return b""
 
     @classmethod
     def __arrow_ext_deserialize__(cls, storage_type, serialized):
+        if serialized == b"auto":
+            return PaJSONType(auto=True)
+        if pa.types.is_struct(storage_type):
+            fields = [field for field in storage_type if field.name != REST_FIELD]
+            return PaJSONType(fields=pa.struct(fields))
         return PaJSONType()
 
     def __arrow_ext_scalar_class__(self):
@@ -40,29 +92,155 @@ class PaJSONType(PaExtensionType):
     def to_pandas_dtype(self):
         return PdJSONDtype()
 
-    def pack(self, value: Any) -> Optional[str]:
+    def pack(self, value: Any) -> Optional[Union[str, Dict[str, Any]]]:
         """
-        Pack an object by serializing with json
+        Pack an object by serializing with json, or shredding into a dict of fields
+        for the shredded layout.
         """
         if value is None:
             return value
+        if self.fields is not None:
+            return self._shred(value)
         return json.dumps(value)
 
-    def unpack(self, value: Union[pa.Scalar, Optional[str]]) -> Optional[Any]:
+    def pack_array(self, values: Iterable[Any]) -> pa.ExtensionArray:
+        """
+        Pack a sequence of objects into an array of this type. For ``auto`` types, the
+        returned array has a concrete shredded type inferred from the values.
+        """
+        if self.auto:
+            values = list(values)
+            return PaJSONType(fields=_infer_fields(values)).pack_array(values)
+        if self.fields is None:
+            return super().pack_array(values)
+
+        # Shred into columns
+        values = list(values)
+        mask = np.array([v is None for v in values], dtype=bool)
+        columns: Dict[str, List[Any]] = {field.name: [] for field in self.storage_type}
+        for value in values:
+            row = {} if value is None else self._shred(value)
+            for name, col in columns.items():
+                col.append(row.get(name))
+
+        arrays = [
+            pa.array(columns[field.name], type=field.type)
+            for field in self.storage_type
+        ]
+        storage = pa.StructArray.from_arrays(
+            arrays,
+            fields=list(self.storage_type),
+            mask=pa.array(mask) if mask.any() else None,
+        )
+        return pa.ExtensionArray.from_storage(self, storage)
+
+    def _shred(self, value: Any) -> Dict[str, Any]:
+        assert self.fields is not None
+        if not isinstance(value, dict):
+            return {REST_FIELD: json.dumps(value)}
+
+        row = {}
+        rest = {}
+        for key, val in value.items():
+            if key in self._py_types and _is_instance(val, self._py_types[key]):
+                row[key] = val
+            else:
+                rest[key] = val
+        if rest:
+            row[REST_FIELD] = json.dumps(rest)
+        return row
+
+    @property
+    def _py_types(self) -> Dict[str, type]:
+        assert self.fields is not None
+        return {field.name: _SHRED_PY_TYPES[field.type] for field in self.fields}
+
+    def unpack(
+        self, value: Union[pa.Scalar, Optional[str], Dict[str, Any]]
+    ) -> Optional[Any]:
         """
         Unpack a string pyarrow scalar back to a python object by deserializing with
-        json.
+        json (or a struct scalar by merging the shredded fields).
         """
         if value is None or pa.compute.is_null(value).as_py():
             return None
         if isinstance(value, pa.Scalar):
             value = value.as_py()
+        if self.fields is not None:
+            assert isinstance(value, dict)
+            value = dict(value)
+            rest = value.pop(REST_FIELD, None)
+            return _unshred(value, None if rest is None else json.loads(rest))
+        assert isinstance(value, str)
         return json.loads(value)
 
     def __str__(self) -> str:
+        if self.auto:
+            return "json<auto>"
+        if self.fields is not None:
+            fields = ", ".join(f"{field.name}: {field.type}" for field in self.fields)
+            return f"json<{fields}>"
         return "json"
 
 
+REST_FIELD = "__rest__"
+
+_SHRED_PY_TYPES = {
+    pa.bool_(): bool,
+    pa.int64(): int,
+    pa.float64(): float,
+    pa.string(): str,
+}
+
+
+def _is_instance(value: Any, typ: type) -> bool:
+    # Exact type check so that e.g. bools aren't shredded as ints.
+    if type(value) is not typ:
+        return False
+    if isinstance(value, int):
+        return -(2**63) <= value < 2**63
+    return True
+
+
+def _infer_fields(values: List[Any]) -> pa.StructType:
+    """
+    Infer the shredded fields for a batch of values. Fields are keys present in all
+    dict values, with non-null values all of the same scalar type.
+    """
+    values = [v for v in values if v is not None]
+    if not values or not all(isinstance(v, dict) for v in values):
+        return pa.struct([])
+
+    keys = [key for key in values[0] if all(key in v for v in values)]
+    py_to_pa = {py_type: pa_type for pa_type, py_type in _SHRED_PY_TYPES.items()}
+
+    fields = []
+    for key in keys:
+        if key == REST_FIELD:
+            continue
+        types = {type(v[key]) for v in values if v[key] is not None}
+        if len(types) != 1:
+            continue
+        py_type = types.pop()
+        if py_type in py_to_pa and all(
+            _is_instance(v[key], py_type) for v in values if v[key] is not None
+        ):
+            fields.append((key, py_to_pa[py_type]))
+    return pa.struct(fields)
+
+
+def _unshred(row: Dict[str, Any], rest: Any) -> Any:
+    """
+    Merge shredded fields and the decoded remainder back into the original value.
+    """
+    if rest is not None and not isinstance(rest, dict):
+        return rest
+    value = {key: val for key, val in row.items() if val is not None}
+    if rest:
+        value.update(rest)
+    return value
+
+
 pa.register_extension_type(PaJSONType())
 
 
@@ -72,6 +250,28 @@ class PaJSONArray(PaExtensionArray):
     and numpy conversion (``array.to_numpy()``).
     """
 
+    def to_numpy(self, **kwargs):
+        """
+        Convert to a numpy object array, decoding the whole column (or shredded
+        remainder) with a single ``json.loads()`` call.
+        """
+        if not pa.types.is_struct(self.storage.type):
+            values = _loads_column(self.storage)
+            return np.fromiter(values, dtype=object, count=len(values))
+
+        storage = self.storage
+        names = [field.name for field in storage.type if field.name != REST_FIELD]
+        columns = [storage.field(name).to_pylist() for name in names]
+        rests = _loads_column(storage.field(REST_FIELD))
+        valid = storage.is_valid().to_numpy(zero_copy_only=False)
+
+        out = np.empty(len(self), dtype=object)
+        for ii in range(len(self)):
+            if valid[ii]:
+                row = {name: col[ii] for name, col in zip(names, columns)}
+                out[ii] = _unshred(row, rests[ii])
+        return out
+
     @classmethod
     def from_sequence(cls, values: Iterable[Any]) -> "PaJSONArray":
         """
@@ -81,6 +281,19 @@ class PaJSONArray(PaExtensionArray):
         return cls._from_sequence(values, PaJSONType())
 
 
+def _loads_column(array: pa.Array) -> List[Any]:
+    """
+    Decode a JSON string array with a single ``json.loads()`` call.
+    """
+    # Join the column into one JSON list, with nulls as "null"
+    array = pc.fill_null(array, "null")
+    array = pc.binary_join_element_wise(array, "", ",")
+    offsets, data = binary_buffers(array)
+    # Drop trailing comma
+    body = bytes(data[offsets[0] : max(offsets[-1] - 1, offsets[0])])
+    return json.loads(b"[" + body + b"]")
+
+
 @register_extension_dtype
 class PdJSONDtype(PdExtensionDtype):
     """
@@ -123,4 +336,10 @@ class PdJSONArray(PandasArray):
         return PdJSONArray(scalars, copy=copy)
 
     def __arrow_array__(self, type: Optional[pa.DataType] = None) -> PaJSONArray:
+        if isinstance(type, PaJSONType):
+            return type.pack_array(self._ndarray)
+        if type is not None and pa.types.is_struct(type):
+            # pyarrow passes the storage type when converting to an extension type.
+            typ = PaJSONType.__arrow_ext_deserialize__(type, b"")
+            return typ.pack_array(self._ndarray)
         return PaJSONArray.from_sequence(self._ndarray)
@@ -1,11 +1,31 @@
-from typing import Any, Dict, Iterable, Optional, Union
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+    Union,
+)
 
 import numpy as np
 import pyarrow as pa
 from pandas.api.extensions import register_extension_dtype
 
+from elbow.utils import cpu_count
+
 from ._pandas_array import PandasArray
-from .base import PaExtensionArray, PaExtensionScalar, PaExtensionType, PdExtensionDtype
+from .base import (
+    PaExtensionArray,
+    PaExtensionScalar,
+    PaExtensionType,
+    PdExtensionDtype,
+    binary_buffers,
+)
 
 __all__ = [
     "PaNDArrayType",
@@ -22,28 +42,114 @@ class PaNDArrayType(PaExtensionType):
         - data: flattened array data
         - shape: original array shape
 
+    If a fixed `shape` is given, the type is instead backed by a plain list of the
+    flattened array data, with the shape stored once in the type metadata. This is more
+    compact and faster to convert, but all arrays must have the same shape. With
+    ``shape="auto"``, the layout is picked from the first batch of arrays packed with
+    ``pack_array()``, like ``json<auto>``: fixed if all the arrays have the same shape,
+    otherwise ragged.
+
+    If a `codec` is given, each array is instead encoded as a compressed binary blob,
+    in a struct with fields:
+
+        - data: compressed array data
+        - shape: original array shape
+
+    The flattened data are optionally delta encoded (for integer types) and byte
+    shuffled before compression, which often compresses images and volumes much better
+    than generic Parquet page compression. Arrays are encoded and decoded in parallel
+    over rows with a thread pool.
+
+    Args:
+        item_type: array item type
+        shape: optional fixed array shape, or ``"auto"`` to detect a fixed shape from
+            the first batch
+        codec: optional compression codec, one of the codecs supported by
+            ``pyarrow.Codec`` (e.g. ``"zstd"``, ``"lz4"``, ``"gzip"``)
+        shuffle: byte shuffle the data before compression
+        delta: delta encode the (flattened) data before compression. Only supported
+            for integer types.
+
     See `here <https://arrow.apache.org/docs/python/extending_types.html>`_ for more
     details on extension types.
     """
 
-    def __init__(self, item_type: Optional[pa.DataType] = None):
+    def __init__(
+        self,
+        item_type: Optional[pa.DataType] = None,
+        shape: Optional[Union[Sequence[int], str]] = None,
+        codec: Optional[str] = None,
+        shuffle: bool = True,
+        delta: bool = False,
+    ):
         if item_type is None:
             item_type = pa.float32()
-        fields = {
-            "data": pa.list_(item_type),
-            "shape": pa.list_(pa.int64()),
-        }
         self.item_type = item_type
-        super().__init__(pa.struct(fields), "ndarray")
+        # Until resolved, auto types use the ragged layout.
+        self.auto = shape == "auto"
+        self.shape: Optional[Tuple[int, ...]] = None
+        if shape is not None and not self.auto:
+            if isinstance(shape, str):
+                raise ValueError(f"Invalid shape {shape}; expected a tuple or 'auto'")
+            self.shape = tuple(int(dim) for dim in shape)
+
+        if codec is not None:
+            codec = codec.lower()
+            if not pa.Codec.is_available(codec):
+                raise ValueError(f"Compression codec {codec} not available")
+        elif delta:
+            raise ValueError("Delta encoding requires a codec")
+        if delta and not pa.types.is_integer(item_type):
+            raise ValueError(f"Delta encoding not supported for type {item_type}")
+        self.codec = codec
+        self.shuffle = shuffle
+        self.delta = delta
+
+        if codec is not None:
+            fields = {
+                "data": pa.binary(),
+                "shape": pa.list_(pa.int64()),
+            }
+            storage_type = pa.struct(fields)
+        elif self.shape is None:
+            fields = {
+                "data": pa.list_(item_type),
+                "shape": pa.list_(pa.int64()),
+            }
+            storage_type = pa.struct(fields)
+        else:
+            # NOTE: A variable size list rather than a fixed size list, since pyarrow
+            # can't write fixed size lists containing nulls to parquet.
+            storage_type = pa.list_(item_type)
+        super().__init__(storage_type, "ndarray")
 
     def __arrow_ext_serialize__(self):
-        return str(self.item_type).encode()
+        serialized = str(self.item_type)
+        if self.auto:
+            serialized += ";shape=auto"
+        elif self.shape is not None:
+            serialized += ";shape=" + ",".join(str(dim) for dim in self.shape)
+        if self.codec is not None:
+            serialized += f";codec={self.codec};shuffle={int(self.shuffle)}"
+            serialized += f";delta={int(self.delta)}"
+        return serialized.encode()
 
     @classmethod
     def __arrow_ext_deserialize__(cls, storage_type, serialized):
-        alias = serialized.decode()
+        alias, *params = serialized.decode().split(";")
         item_type = pa.lib.ensure_type(alias)
-        return cls(item_type)
+        kwargs = {}
+        for param in params:
+            key, val = param.split("=", 1)
+            if key == "shape" and val == "auto":
+                kwargs["shape"] = val
+            elif key == "shape":
+                kwargs["shape"] = tuple(int(dim) for dim in val.split(",") if dim)
+            elif key == "codec":
+                kwargs["codec"] = val
+            elif key in {"shuffle", "delta"}:
+                kwargs[key] = val == "1"
+        return cls(item_type, **kwargs)
 
     def __arrow_ext_scalar_class__(self):
         return PaExtensionScalar
@@ -54,35 +160,225 @@ class PaNDArrayType(PaExtensionType):
     def to_pandas_dtype(self):
         return PdNDArrayDtype()
 
-    def pack(self, value: Optional[np.ndarray]) -> Optional[Dict[str, Any]]:
+    def pack(self, value: Optional[np.ndarray]) -> Optional[Any]:
         """
-        Convert an array to a dict with ``"data"`` and ``"shape"`` fields, for pyarrow
-        consumption.
+        Convert an array to a dict with ``"data"`` and ``"shape"`` fields (or just the
+        flattened data for a fixed shape), for pyarrow consumption.
         """
         if value is None:
             return value
         value = np.asarray(value)
+        if self.codec is not None:
+            return {"data": self.encode(value), "shape": value.shape}
         dtype = self.item_type.to_pandas_dtype()
-        data = value.flatten().astype(dtype)
+        # Only copies if the array is non-contiguous or needs casting.
+        data = np.ravel(value).astype(dtype, copy=False)
+        if self.shape is not None:
+            self._check_shape(value.shape)
+            return data
         return {"data": data, "shape": value.shape}
 
+    def pack_array(self, values: Iterable[Optional[np.ndarray]]) -> pa.ExtensionArray:
+        """
+        Pack a sequence of arrays into an array of this type. The arrays are
+        concatenated into one contiguous buffer with a single copy, rather than
+        flattened and converted one by one. For ``auto`` types, the returned array has
+        a concrete type with a fixed shape if all the arrays have the same shape.
+        """
+        if self.auto:
+            values = list(values)
+            return self._resolve(values).pack_array(values)
+
+        dtype = self.item_type.to_pandas_dtype()
+        if np.dtype(dtype) == object:
+            return super().pack_array(values)
+
+        values = list(values)
+        mask = np.array([v is None for v in values], dtype=bool)
+        arrays = [np.asarray(v) for v in values if v is not None]
+
+        if self.codec is not None:
+            storage = self._pack_encoded(arrays, mask)
+        elif self.shape is not None:
+            storage = self._pack_fixed(arrays, mask, dtype)
+        else:
+            storage = self._pack_ragged(arrays, mask, dtype)
+        return pa.ExtensionArray.from_storage(self, storage)
+
+    def _resolve(self, values: List[Optional[np.ndarray]]) -> "PaNDArrayType":
+        """
+        Resolve an ``auto`` type to a concrete type for a batch of arrays.
+        """
+        shapes = {np.shape(v) for v in values if v is not None}
+        shape = shapes.pop() if len(shapes) == 1 else None
+        return PaNDArrayType(
+            self.item_type,
+            shape=shape,
+            codec=self.codec,
+            shuffle=self.shuffle,
+            delta=self.delta,
+        )
+
+    def _pack_ragged(
+        self, arrays: List[np.ndarray], mask: np.ndarray, dtype: Any
+    ) -> pa.Array:
+        sizes = np.zeros(len(mask), dtype=np.int64)
+        sizes[~mask] = [arr.size for arr in arrays]
+        ndims = np.zeros(len(mask), dtype=np.int64)
+        ndims[~mask] = [arr.ndim for arr in arrays]
+
+        if arrays:
+            flat = np.concatenate([arr.reshape(-1) for arr in arrays])
+            flat = flat.astype(dtype, copy=False)
+            shape_flat = np.fromiter(
+                (dim for arr in arrays for dim in arr.shape),
+                dtype=np.int64,
+                count=int(ndims.sum()),
+            )
+        else:
+            flat = np.empty(0, dtype=dtype)
+            shape_flat = np.empty(0, dtype=np.int64)
+
+        data = pa.ListArray.from_arrays(
+            _offsets(sizes), pa.array(flat, type=self.item_type)
+        )
+        shape = pa.ListArray.from_arrays(
+            _offsets(ndims), pa.array(shape_flat, type=pa.int64())
+        )
+        storage = pa.StructArray.from_arrays(
+            [data, shape],
+            fields=list(self.storage_type),
+            mask=pa.array(mask) if mask.any() else None,
+        )
+        return storage
+
+    def _pack_fixed(
+        self, arrays: List[np.ndarray], mask: np.ndarray, dtype: Any
+    ) -> pa.Array:
+        assert self.shape is not None
+        for arr in arrays:
+            self._check_shape(arr.shape)
+
+        # Stack into one contiguous (N, *shape) buffer. Null rows are empty.
+        if arrays:
+            stacked = np.stack(arrays).astype(dtype, copy=False)
+        else:
+            stacked = np.empty((0,) + self.shape, dtype=dtype)
+
+        sizes = np.where(mask, 0, int(np.prod(self.shape)))
+        storage = pa.ListArray.from_arrays(
+            _offsets(sizes),
+            pa.array(stacked.reshape(-1), type=self.item_type),
+            mask=pa.array(mask) if mask.any() else None,
+        )
+        return storage
+
+    def _pack_encoded(self, arrays: List[np.ndarray], mask: np.ndarray) -> pa.Array:
+        blobs: List[Optional[bytes]] = [None] * len(mask)
+        for idx, blob in zip(np.flatnonzero(~mask), _map_rows(self.encode, arrays)):
+            blobs[idx] = blob
+
+        ndims = np.zeros(len(mask), dtype=np.int64)
+        ndims[~mask] = [arr.ndim for arr in arrays]
+        shape_flat = np.fromiter(
+            (dim for arr in arrays for dim in arr.shape),
+            dtype=np.int64,
+            count=int(ndims.sum()),
+        )
+
+        data = pa.array(blobs, type=pa.binary())
+        shape = pa.ListArray.from_arrays(
+            _offsets(ndims), pa.array(shape_flat, type=pa.int64())
+        )
+        storage = pa.StructArray.from_arrays(
+            [data, shape],
+            fields=list(self.storage_type),
+            mask=pa.array(mask) if mask.any() else None,
+        )
+        return storage
+
+    def encode(self, value: np.ndarray) -> bytes:
+        """
+        Encode an array as a compressed binary blob, according to the type codec.
+        """
+        assert self.codec is not None, "type has no codec"
+        value = np.asarray(value)
+        if self.shape is not None:
+            self._check_shape(value.shape)
+        dtype = np.dtype(self.item_type.to_pandas_dtype())
+        data = np.ascontiguousarray(value, dtype=dtype).reshape(-1)
+        if self.delta:
+            data = np.diff(data, prepend=data.dtype.type(0))
+        buf = data.view(np.uint8)
+        if self.shuffle and dtype.itemsize > 1:
+            # Group the bytes by significance, e.g. all the high bytes together.
+            buf = np.ascontiguousarray(buf.reshape(-1, dtype.itemsize).T)
+        return pa.Codec(self.codec).compress(buf, asbytes=True)
+
+    def decode(
+        self, data: Union[bytes, memoryview], shape: Sequence[int]
+    ) -> np.ndarray:
+        """
+        Decode a compressed binary blob created by `encode()` back to an array. The
+        returned array may be read-only.
+        """
+        assert self.codec is not None, "type has no codec"
+        dtype = np.dtype(self.item_type.to_pandas_dtype())
+        size = int(np.prod(shape)) * dtype.itemsize
+        buf = pa.Codec(self.codec).decompress(data, decompressed_size=size)
+        raw = np.frombuffer(buf, dtype=np.uint8)
+        if self.shuffle and dtype.itemsize > 1:
+            raw = np.ascontiguousarray(raw.reshape(dtype.itemsize, -1).T)
+        array = raw.view(dtype)
+        if self.delta:
+            array = np.cumsum(array, dtype=dtype)
+        return array.reshape(shape)
+
+    def _check_shape(self, shape: Tuple[int, ...]):
+        if shape != self.shape:
+            raise ValueError(
+                f"Array shape {shape} doesn't match fixed shape {self.shape}"
+            )
+
     def unpack(self, value: Union[pa.Scalar, Dict[str, Any]]) -> Optional[np.ndarray]:
         """
         Convert a pyarrow struct scalar or dict with ``"data"`` and ``"shape"`` fields
-        back to a numpy array.
+        (or list scalar or flat data for a fixed shape) back to a numpy array.
         """
         if value is None or pa.compute.is_null(value).as_py():
             return None
-        data = value["data"]
-        shape = value["shape"]
-        if isinstance(value, pa.Scalar):
-            data = data.values.to_numpy()
-            shape = shape.as_py()
+        if self.codec is not None:
+            data, shape = value["data"], value["shape"]
+            if isinstance(value, pa.Scalar):
+                data, shape = data.as_buffer(), shape.as_py()
+            return self.decode(data, shape)
+        if self.shape is not None:
+            data = value
+            shape = self.shape
+            if isinstance(value, pa.Scalar):
+                data = value.values.to_numpy()
+        else:
+            data = value["data"]
+            shape = value["shape"]
+            if isinstance(value, pa.Scalar):
+                data = data.values.to_numpy()
+                shape = shape.as_py()
         data = np.asarray(data)
         return data.reshape(shape)
 
     def __str__(self) -> str:
-        return f"ndarray<item: {self.item_type}>"
+        params = [f"item: {self.item_type}"]
+        if self.auto:
+            params.append("shape: auto")
+        elif self.shape is not None:
+            params.append(f"shape: {self.shape}")
+        if self.codec is not None:
+            params.append(f"codec: {self.codec}")
+            if not self.shuffle:
+                params.append("shuffle: false")
+            if self.delta:
+                params.append("delta: true")
+        return f"ndarray<{', '.join(params)}>"
 
 
 # Note that even though the registration uses float32, it still works for any
@@ -97,9 +393,104 @@ class PaNDArrayArray(PaExtensionArray):
     (``array.to_pylist()``) and numpy conversion (``array.to_numpy()``).
     """
 
-    def to_numpy(self, **kwargs):
-        item_dtype = self.type.item_type.to_pandas_dtype()
-        return _array_of_arrays(self.to_pylist(), item_dtype=item_dtype)
+    def to_numpy(self, stack: bool = False, writable: bool = False, **kwargs):
+        """
+        Convert to a 1d object array of numpy arrays. The arrays are reshaped views
+        into the flattened values buffer, sliced using the list offsets, without
+        per-row python conversion.
+
+        Args:
+            stack: return a single stacked N-D array if all the arrays have the same
+                shape and there are no nulls.
+            writable: copy the values buffer once so the returned arrays are
+                writable. Otherwise the arrays are read-only views into Arrow memory.
+        """
+        typ: PaNDArrayType = self.type
+        if typ.codec is not None:
+            return self._decode(stack=stack, writable=writable)
+
+        storage = self.storage
+        if typ.shape is None:
+            data = storage.field("data")
+            shape_list = storage.field("shape")
+        else:
+            data = storage
+            shape_list = None
+
+        values = data.values.to_numpy(zero_copy_only=False)
+        if writable:
+            values = values.copy()
+        offsets = data.offsets.to_numpy()
+        valid = None
+        if storage.null_count > 0:
+            valid = storage.is_valid().to_numpy(zero_copy_only=False)
+
+        shapes = None
+        if shape_list is not None:
+            shape_offsets = shape_list.offsets.to_numpy()
+            shape_values = shape_list.values.to_numpy(zero_copy_only=False)
+            shape = _uniform_shape(shape_offsets, shape_values, valid)
+            if shape is None:
+                shapes = [
+                    tuple(shape_values[start:end])
+                    for start, end in zip(shape_offsets[:-1], shape_offsets[1:])
+                ]
+        else:
+            shape = typ.shape
+
+        length = len(self)
+        out = np.empty(length, dtype=object)
+        if length == 0:
+            return out
+
+        if shape is not None and valid is None:
+            # All arrays have the same shape and are laid out contiguously.
+            stacked = values[offsets[0] : offsets[-1]].reshape((length,) + shape)
+            if stack:
+                return stacked
+            out[:] = list(stacked)
+            return out
+
+        for ii in range(length):
+            if valid is not None and not valid[ii]:
+                continue
+            out[ii] = values[offsets[ii] : offsets[ii + 1]].reshape(
+                shape if shapes is None else shapes[ii]
+            )
+        return out
+
+    def _decode(self, stack: bool = False, writable: bool = False):
+        """
+        Decode the compressed arrays of a codec type, in parallel over rows.
+        """
+        typ: PaNDArrayType = self.type
+        storage = self.storage
+        offsets, data = binary_buffers(storage.field("data"))
+        shape_list = storage.field("shape")
+        shape_offsets = shape_list.offsets.to_numpy()
+        shape_values = shape_list.values.to_numpy(zero_copy_only=False)
+
+        length = len(self)
+        valid = storage.is_valid().to_numpy(zero_copy_only=False)
+        rows = np.flatnonzero(valid)
+
+        def decode(idx: int) -> np.ndarray:
+            shape = shape_values[shape_offsets[idx] : shape_offsets[idx + 1]]
+            array = typ.decode(data[offsets[idx] : offsets[idx + 1]], tuple(shape))
+            if writable and not array.flags.writeable:
+                array = array.copy()
+            return array
+
+        arrays = _map_rows(decode, list(rows))
+        if stack and len(rows) == length and length > 0:
+            shapes = {arr.shape for arr in arrays}
+            if len(shapes) == 1:
+                return np.stack(arrays)
+
+        out = np.empty(length, dtype=object)
+        for idx, array in zip(rows, arrays):
+            out[idx] = array
+        return out
 
     @classmethod
     def from_sequence(
@@ -176,9 +567,35 @@ class PdNDArrayArray(PandasArray):
         """
         Convert myself into a PyArrow array
         """
+        if isinstance(type, PaNDArrayType):
+            return type.pack_array(self._ndarray)
+        if type is not None and (pa.types.is_list(type) or pa.types.is_struct(type)):
+            # pyarrow passes the storage type when converting to an extension type.
+            typ = _storage_type_to_ndarray(type, self._ndarray)
+            return typ.pack_array(self._ndarray)
         return PaNDArrayArray.from_sequence(self._ndarray, item_dtype=self.item_dtype)
 
 
+def _storage_type_to_ndarray(
+    storage_type: pa.DataType, values: np.ndarray
+) -> PaNDArrayType:
+    """
+    Recover the ndarray type for a storage type. For fixed shape storage, the shape is
+    taken from the first array. The item type and codec of encoded storage can't be
+    recovered, so these raise an error.
+    """
+    if pa.types.is_struct(storage_type):
+        if pa.types.is_binary(storage_type[0].type):
+            raise ValueError(
+                "Can't convert ndarrays to a codec encoded ndarray type, since pyarrow "
+                "passes only the storage type. Convert them with the type's "
+                "pack_array() instead, e.g. typ.pack_array(df[column])"
+            )
+        return PaNDArrayType(storage_type[0].type.value_type)
+    shape = next((np.shape(v) for v in values if v is not None), None)
+    return PaNDArrayType(storage_type.value_type, shape=shape)
+
+
 def _array_of_arrays(
     values: Iterable[np.ndarray], item_dtype: Any = None
 ) -> np.ndarray:
@@ -200,6 +617,57 @@ def _array_of_arrays(
     return array
 
 
+def _uniform_shape(
+    offsets: np.ndarray, values: np.ndarray, valid: Optional[np.ndarray] = None
+) -> Optional[Tuple[int, ...]]:
+    """
+    Find the common shape of all valid rows of a list of shapes, or `None` if the
+    shapes differ.
+    """
+    ndims = np.diff(offsets)
+    if valid is not None:
+        ndims = ndims[valid]
+    if len(ndims) == 0 or np.any(ndims != ndims[0]):
+        return None
+    ndim = int(ndims[0])
+    starts = offsets[:-1] if valid is None else offsets[:-1][valid]
+    shapes = values[starts[:, None] + np.arange(ndim)]
+    if np.any(shapes != shapes[:1]):
+        return None
+    return tuple(int(dim) for dim in shapes[0])
+
+
+_T = TypeVar("_T")
+_R = TypeVar("_R")
+
+# Minimum number of rows to encode or decode in a thread pool.
+_MIN_THREADED_ROWS = 16
+
+
+def _map_rows(func: Callable[[_T], _R], items: List[_T]) -> List[_R]:
+    """
+    Apply `func` to each item, in a thread pool for larger batches. The compression
+    codecs release the GIL, so this scales with the number of cores.
+    """
+    num_threads = min(len(items) // _MIN_THREADED_ROWS, cpu_count())
+    if num_threads <= 1:
+        return [func(item) for item in items]
+    # NOTE: A short-lived pool rather than a global one, which would not survive a fork.
+    with ThreadPoolExecutor(max_workers=num_threads) as pool:
+        return list(pool.map(func, items))
+
+
+def _offsets(sizes: np.ndarray) -> pa.Array:
+    """
+    Construct list offsets from an array of list sizes.
+    """
+    offsets = np.zeros(len(sizes) + 1, dtype=np.int64)
+    np.cumsum(sizes, out=offsets[1:])
+    if offsets[-1] > np.iinfo(np.int32).max:
+        raise ValueError("Total array size overflows list offsets")
+    return pa.array(offsets.astype(np.int32), type=pa.int32())
+
+
 def _infer_dtype(values: Iterable[np.ndarray]) -> np.dtype:
     """
     Infer the value dtype from a list of arrays.
@@ -0,0 +1,124 @@
+"""
+Packing and unpacking of list and struct types containing extension types, e.g.
+``list<ndarray>`` or ``struct<meta: json, ...>``.
+
+Pyarrow can't convert python values to (or from) extension types nested inside other
+types, so the nested values are packed recursively, one child array at a time.
+"""
+
+import itertools
+from typing import Any, Iterable, List, Optional
+
+import numpy as np
+import pyarrow as pa
+
+from .base import PaExtensionType
+
+__all__ = ["has_extension", "pack_nested", "unpack_nested"]
+
+
+def has_extension(type: pa.DataType) -> bool:
+    """
+    Check if a data type is or contains an extension type.
+    """
+    if isinstance(type, pa.ExtensionType):
+        return True
+    if pa.types.is_list(type) or pa.types.is_large_list(type):
+        return has_extension(type.value_type)
+    if pa.types.is_struct(type):
+        return any(has_extension(field.type) for field in type)
+    return False
+
+
+def pack_nested(values: Iterable[Any], type: pa.DataType) -> pa.Array:
+    """
+    Pack a sequence of python values into an array of `type`, which may be a list or
+    struct type containing extension types.
+
+    The returned array type can differ from `type` for adaptive extension types (e.g.
+    ``json<auto>``).
+    """
+    if isinstance(type, PaExtensionType):
+        return type.pack_array(values)
+    if not has_extension(type):
+        return pa.array(values, type=type)
+
+    values = list(values)
+    mask = _null_mask(values)
+
+    if pa.types.is_list(type) or pa.types.is_large_list(type):
+        offsets_type = np.int64 if pa.types.is_large_list(type) else np.int32
+        offsets = np.zeros(len(values) + 1, dtype=offsets_type)
+        np.cumsum([0 if v is None else len(v) for v in values], out=offsets[1:])
+        items = list(itertools.chain.from_iterable(v for v in values if v is not None))
+        child = pack_nested(items, type.value_type)
+        array_cls = pa.LargeListArray if pa.types.is_large_list(type) else pa.ListArray
+        return array_cls.from_arrays(offsets, child, mask=mask)
+
+    if pa.types.is_struct(type):
+        children = [
+            pack_nested(
+                [None if v is None else v.get(field.name) for v in values], field.type
+            )
+            for field in type
+        ]
+        fields = [field.with_type(child.type) for field, child in zip(type, children)]
+        return pa.StructArray.from_arrays(children, fields=fields, mask=mask)
+
+    raise TypeError(f"Nested extension type {type} not supported")
+
+
+def unpack_nested(array: pa.Array) -> np.ndarray:
+    """
+    Unpack an array, possibly containing nested extension types, to a 1D numpy object
+    array of python values.
+    """
+    if isinstance(array, pa.ChunkedArray):
+        chunks = [unpack_nested(chunk) for chunk in array.iterchunks()]
+        if not chunks:
+            return np.empty(0, dtype=object)
+        return np.concatenate(chunks) if len(chunks) > 1 else chunks[0]
+
+    typ = array.type
+    if isinstance(typ, PaExtensionType):
+        # NOTE: The extension arrays implement vectorized ``to_numpy()`` conversions.
+        return _object_array(array.to_numpy(), len(array))
+    if not has_extension(typ):
+        return _object_array(array.to_pylist(), len(array))
+
+    valid = array.is_valid().to_numpy(zero_copy_only=False)
+
+    if pa.types.is_list(typ) or pa.types.is_large_list(typ):
+        offsets = array.offsets.to_numpy()
+        child = unpack_nested(array.values.slice(offsets[0], offsets[-1] - offsets[0]))
+        offsets = offsets - offsets[0]
+        lists = (
+            list(child[start:stop]) if is_valid else None
+            for start, stop, is_valid in zip(offsets[:-1], offsets[1:], valid)
+        )
+        return _object_array(lists, len(array))
+
+    if pa.types.is_struct(typ):
+        names = [field.name for field in typ]
+        children = [unpack_nested(child) for child in array.flatten()]
+        dicts = (
+            dict(zip(names, items)) if is_valid else None
+            for items, is_valid in zip(zip(*children), valid)
+        )
+        return _object_array(dicts, len(array))
+
+    return _object_array(array.to_pylist(), len(array))
+
+
+def _null_mask(values: List[Any]) -> Optional[pa.Array]:
+    mask = [v is None for v in values]
+    return pa.array(mask, type=pa.bool_()) if any(mask) else None
+
+
+def _object_array(values: Iterable[Any], length: int) -> np.ndarray:
+    """
+    Construct a 1D object array without numpy trying to broadcast nested sequences.
+    """
+    if isinstance(values, np.ndarray) and values.dtype == object and values.ndim == 1:
+        return values
+    return np.fromiter(values, dtype=object, count=length)
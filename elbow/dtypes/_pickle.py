@@ -1,12 +1,21 @@
+import json
 import pickle
-from typing import Any, Iterable, Optional, Union
+import struct
+from typing import Any, Dict, Iterable, List, Optional, Union
 
 import numpy as np
 import pyarrow as pa
 from pandas.api.extensions import register_extension_dtype
 
 from ._pandas_array import PandasArray
-from .base import PaExtensionArray, PaExtensionScalar, PaExtensionType, PdExtensionDtype
+from ._serializers import Serializer, get_serializer
+from .base import (
+    PaExtensionArray,
+    PaExtensionScalar,
+    PaExtensionType,
+    PdExtensionDtype,
+    binary_buffers,
+)
 
 __all__ = [
     "PaPickleType",
@@ -19,17 +28,65 @@ __all__ = [
 class PaPickleType(PaExtensionType):
     """
     PyArrow binary extension type for holding arbitrary pickled objects.
+
+    Args:
+        serializer: name of a registered serializer (see ``list_serializers()``).
+            Built-in serializers are ``"pickle"`` (default), ``"marshal"`` (plain
+            containers and scalars), ``"npy"`` (numpy arrays) and ``"cloudpickle"`` (if
+            installed).
+        compression: optional pyarrow codec name (e.g. ``"zstd"`` or ``"lz4"``) to
+            compress each pickled value.
+        out_of_band: pickle with protocol 5 out-of-band buffers, so that large
+            buffers (e.g. numpy array data) aren't copied into the pickle stream. The
+            buffers are framed with the pickle stream in the same binary value, and
+            unpickled without copying (as read-only views into Arrow memory).
+            Requires python >= 3.8.
+
+    Options are recorded in the extension type metadata so that readers can decode the
+    values.
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        serializer: str = "pickle",
+        compression: Optional[str] = None,
+        out_of_band: bool = False,
+    ):
+        self.serializer = serializer
+        self._serializer = get_serializer(serializer)
+        if out_of_band and pickle.HIGHEST_PROTOCOL < 5:
+            raise ValueError("Out-of-band pickling requires pickle protocol 5")
+        if out_of_band and self._serializer.dumps_out_of_band is None:
+            raise ValueError(f"Serializer {serializer} doesn't support out-of-band")
+        if compression is not None:
+            compression = compression.lower()
+            if not pa.Codec.is_available(compression):
+                raise ValueError(f"Compression codec {compression} is not available")
+        self.compression = compression
+        self.out_of_band = out_of_band
         super().__init__(pa.binary(), "pickle")
 
     def __arrow_ext_serialize__(self):
-        return b""
+        # Default options serialize to empty for compatibility with older files.
+        params = self._params()
+        if not params:
+            return b""
+        return json.dumps(params).encode()
 
     @classmethod
     def __arrow_ext_deserialize__(cls, storage_type, serialized):
-        return PaPickleType()
+        params = json.loads(serialized) if serialized else {}
+        return PaPickleType(**params)
+
+    def _params(self) -> Dict[str, Any]:
+        params: Dict[str, Any] = {}
+        if self.serializer != "pickle":
+            params["serializer"] = self.serializer
+        if self.compression is not None:
+            params["compression"] = self.compression
+        if self.out_of_band:
+            params["out_of_band"] = True
+        return params
 
     def __arrow_ext_scalar_class__(self):
         return PaExtensionScalar
@@ -42,19 +99,23 @@ class PaPickleType(PaExtensionType):
 
     def pack(self, value: Any) -> Optional[bytes]:
         """
-        Pack an object by serializing with pickle
+        Pack an object by serializing with the configured serializer (pickle by
+        default)
         """
         if value is None:
             return value
-        # TODO: could imagine dropping in different pickle implementations here, perhaps
-        # using a parameter on the type to select which one. This way, the data that
-        # needs it can use more portable pickling.
-        return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if self.out_of_band:
+            data = _dumps_out_of_band(value, self._serializer)
+        else:
+            data = self._serializer.dumps(value)
+        if self.compression is not None:
+            data = _compress(data, self.compression)
+        return data
 
     def unpack(self, value: Union[pa.Scalar, Optional[bytes]]) -> Optional[Any]:
         """
         Unpack a binary pyarrow scalar back to a python object by deserializing with
-        pickle.
+        the configured serializer.
         """
         # NOTE: pyarrow False boolean scalars are Truthy
         # https://github.com/apache/arrow/issues/34987
@@ -62,10 +123,68 @@ class PaPickleType(PaExtensionType):
             return None
         if isinstance(value, pa.Scalar):
             value = value.as_py()
-        return pickle.loads(value)
+        return self.loads(value)
+
+    def loads(self, data: Union[bytes, memoryview]) -> Any:
+        """
+        Deserialize a single packed value.
+        """
+        if self.compression is not None:
+            data = _decompress(data, self.compression)
+        if self.out_of_band:
+            return _loads_out_of_band(data)
+        return self._serializer.loads(data)
 
     def __str__(self) -> str:
-        return "pickle"
+        params = self._params()
+        if not params:
+            return "pickle"
+        if list(params) == ["serializer"]:
+            return f"pickle<{self.serializer}>"
+        params_str = ", ".join(f"{k}: {str(v).lower()}" for k, v in params.items())
+        return f"pickle<{params_str}>"
+
+
+# Out-of-band frame layout:
+#   magic | num buffers (uint32) | buffer sizes (uint64 each) | buffers | pickle stream
+_OOB_MAGIC = b"EPK5"
+
+
+def _dumps_out_of_band(value: Any, serializer: Serializer) -> bytes:
+    assert serializer.dumps_out_of_band is not None
+    buffers: List[pickle.PickleBuffer] = []
+    stream = serializer.dumps_out_of_band(value, buffers.append)
+    raw = [buf.raw() for buf in buffers]
+    header = struct.pack(f"<I{len(raw)}Q", len(raw), *(mv.nbytes for mv in raw))
+    # Only one copy of each buffer, into the frame.
+    return b"".join([_OOB_MAGIC, header, *raw, stream])
+
+
+def _loads_out_of_band(data: Union[bytes, memoryview]) -> Any:
+    data = memoryview(data)
+    if data[:4] != _OOB_MAGIC:
+        raise ValueError("Invalid out-of-band pickle frame")
+    (count,) = struct.unpack_from("<I", data, 4)
+    sizes = struct.unpack_from(f"<{count}Q", data, 8)
+    offset = 8 + 8 * count
+    buffers = []
+    for size in sizes:
+        buffers.append(data[offset : offset + size])
+        offset += size
+    return pickle.loads(data[offset:], buffers=buffers)
+
+
+def _compress(data: bytes, codec: str) -> bytes:
+    # Prefix with the uncompressed size, needed for decompression.
+    compressed = pa.Codec(codec).compress(data, asbytes=True)
+    return struct.pack("<Q", len(data)) + compressed
+
+
+def _decompress(data: Union[bytes, memoryview], codec: str) -> bytes:
+    (size,) = struct.unpack_from("<Q", data)
+    return pa.Codec(codec).decompress(
+        memoryview(data)[8:], decompressed_size=size, asbytes=True
+    )
 
 
 pa.register_extension_type(PaPickleType())
@@ -77,6 +196,23 @@ class PaPickleArray(PaExtensionArray):
     (``array.to_pylist()``) and numpy conversion (``array.to_numpy()``).
     """
 
+    def to_numpy(self, **kwargs):
+        """
+        Convert to a numpy object array, unpickling directly from slices of the binary
+        data buffer.
+        """
+        typ = self.type
+        offsets, data = binary_buffers(self.storage)
+        valid = None
+        if self.null_count > 0:
+            valid = self.is_valid().to_numpy(zero_copy_only=False)
+
+        out = np.empty(len(self), dtype=object)
+        for ii in range(len(self)):
+            if valid is None or valid[ii]:
+                out[ii] = typ.loads(data[offsets[ii] : offsets[ii + 1]])
+        return out
+
     @classmethod
     def from_sequence(cls, values: Iterable[Any]) -> "PaPickleArray":
         """
@@ -132,4 +268,6 @@ class PdPickleArray(PandasArray):
         return PdPickleArray(scalars, copy=copy)
 
     def __arrow_array__(self, type: Optional[pa.DataType] = None) -> PaPickleArray:
+        if isinstance(type, PaPickleType):
+            return type.pack_array(self._ndarray)
         return PaPickleArray.from_sequence(self._ndarray)
@@ -0,0 +1,140 @@
+import ast
+import io
+import marshal
+import pickle
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Union
+
+import numpy as np
+
+try:
+    import cloudpickle
+except ImportError:
+    cloudpickle = None
+
+__all__ = [
+    "Serializer",
+    "register_serializer",
+    "unregister_serializer",
+    "get_serializer",
+    "list_serializers",
+]
+
+BytesLike = Union[bytes, memoryview]
+
+
+class Serializer(NamedTuple):
+    """
+    A named pair of functions for serializing python objects to bytes, used by
+    ``PaPickleType``.
+
+    Args:
+        name: unique serializer name, recorded in the extension type metadata
+        dumps: function serializing an object to bytes
+        loads: function deserializing an object from bytes or a memoryview
+        dumps_out_of_band: optional function ``dumps_out_of_band(obj, buffer_callback)``
+            pickling with protocol 5 out-of-band buffers. The stream is loaded with
+            ``pickle.loads()``.
+    """
+
+    name: str
+    dumps: Callable[[Any], bytes]
+    loads: Callable[[BytesLike], Any]
+    dumps_out_of_band: Optional[Callable[[Any, Callable], bytes]] = None
+
+
+_SERIALIZERS: Dict[str, Serializer] = {}
+
+
+def register_serializer(serializer: Serializer, overwrite: bool = False) -> None:
+    """
+    Register a serializer so it can be selected by name, e.g. with
+    ``PaPickleType(serializer=name)`` or the alias ``"pickle<name>"``.
+    """
+    if serializer.name in _SERIALIZERS and not overwrite:
+        raise ValueError(f"Serializer {serializer.name} already registered")
+    _SERIALIZERS[serializer.name] = serializer
+
+
+def unregister_serializer(name: str) -> None:
+    """
+    Remove a registered serializer. Types using the serializer can no longer be
+    created or read.
+    """
+    if name not in _SERIALIZERS:
+        raise ValueError(f"Serializer {name} not registered")
+    del _SERIALIZERS[name]
+
+
+def get_serializer(name: str) -> Serializer:
+    """
+    Get a registered serializer by name.
+    """
+    if name not in _SERIALIZERS:
+        raise ValueError(
+            f"Unknown serializer {name}; expected one of {list_serializers()}"
+        )
+    return _SERIALIZERS[name]
+
+
+def list_serializers() -> List[str]:
+    """
+    List the names of the registered serializers.
+    """
+    return list(_SERIALIZERS)
+
+
+def _pickle_dumps(obj: Any) -> bytes:
+    return pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _pickle_dumps_out_of_band(obj: Any, buffer_callback: Callable) -> bytes:
+    return pickle.dumps(obj, protocol=5, buffer_callback=buffer_callback)
+
+
+def _npy_dumps(obj: Any) -> bytes:
+    buf = io.BytesIO()
+    np.save(buf, np.asarray(obj), allow_pickle=False)
+    return buf.getvalue()
+
+
+def _npy_loads(data: BytesLike) -> np.ndarray:
+    """
+    Load an array in ``.npy`` format as a view of `data`, without copying.
+    """
+    data = memoryview(data)
+    if bytes(data[:6]) != b"\x93NUMPY":
+        raise ValueError("Invalid npy data")
+    len_size = 2 if data[6] == 1 else 4
+    header_len = int.from_bytes(data[8 : 8 + len_size], "little")
+    start = 8 + len_size
+    header = ast.literal_eval(bytes(data[start : start + header_len]).decode("latin1"))
+
+    dtype = np.lib.format.descr_to_dtype(header["descr"])
+    if dtype.hasobject:
+        raise ValueError("Object arrays are not supported")
+    shape = header["shape"]
+    array = np.frombuffer(
+        data, dtype=dtype, count=int(np.prod(shape)), offset=start + header_len
+    )
+    if header["fortran_order"]:
+        return array.reshape(shape[::-1]).T
+    return array.reshape(shape)
+
+
+register_serializer(
+    Serializer("pickle", _pickle_dumps, pickle.loads, _pickle_dumps_out_of_band)
+)
+register_serializer(Serializer("marshal", marshal.dumps, marshal.loads))
+register_serializer(Serializer("npy", _npy_dumps, _npy_loads))
+
+if cloudpickle is not None:
+    register_serializer(
+        Serializer(
+            "cloudpickle",
+            cloudpickle.dumps,
+            pickle.loads,
+            lambda obj, buffer_callback: cloudpickle.dumps(
+                obj, protocol=5, buffer_callback=buffer_callback
+            ),
+        )
+    )
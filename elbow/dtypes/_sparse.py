@@ -0,0 +1,367 @@
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+import pyarrow as pa
+from pandas.api.extensions import register_extension_dtype
+
+from ._ndarray import _array_of_arrays, _infer_dtype, _offsets, _uniform_shape
+from ._pandas_array import PandasArray
+from .base import PaExtensionArray, PaExtensionScalar, PaExtensionType, PdExtensionDtype
+
+__all__ = [
+    "COOArray",
+    "PaSparseNDArrayType",
+    "PaSparseNDArrayArray",
+    "PdSparseNDArrayDtype",
+    "PdSparseNDArrayArray",
+]
+
+
+class COOArray(NamedTuple):
+    """
+    A sparse array in coordinate (COO) format, similar to ``scipy.sparse.coo_array``.
+
+    Attributes:
+        coords: integer array of nonzero coordinates, shape ``(ndim, nnz)``
+        data: array of nonzero values, shape ``(nnz,)``
+        shape: dense array shape
+    """
+
+    coords: np.ndarray
+    data: np.ndarray
+    shape: Tuple[int, ...]
+
+    def todense(self) -> np.ndarray:
+        """
+        Convert to a dense numpy array.
+        """
+        dense = np.zeros(self.shape, dtype=self.data.dtype)
+        # Duplicate coordinates are summed, as in scipy.
+        np.add.at(dense, tuple(self.coords), self.data)
+        return dense
+
+
+class PaSparseNDArrayType(PaExtensionType):
+    """
+    PyArrow sparse ndarray extension type backed by a struct with fields:
+
+        - indices: flat (C order) indices of the nonzero entries
+        - values: nonzero values
+        - shape: dense array shape
+
+    Arrays are unpacked to dense numpy arrays. Use
+    ``PaSparseNDArrayArray.to_coo()`` to get the sparse COO representation.
+    """
+
+    def __init__(self, item_type: Optional[pa.DataType] = None):
+        if item_type is None:
+            item_type = pa.float32()
+        self.item_type = item_type
+
+        fields = {
+            "indices": pa.list_(pa.int64()),
+            "values": pa.list_(item_type),
+            "shape": pa.list_(pa.int64()),
+        }
+        super().__init__(pa.struct(fields), "sparse_ndarray")
+
+    def __arrow_ext_serialize__(self):
+        return str(self.item_type).encode()
+
+    @classmethod
+    def __arrow_ext_deserialize__(cls, storage_type, serialized):
+        item_type = pa.lib.ensure_type(serialized.decode())
+        return cls(item_type)
+
+    def __arrow_ext_scalar_class__(self):
+        return PaExtensionScalar
+
+    def __arrow_ext_class__(self):
+        return PaSparseNDArrayArray
+
+    def to_pandas_dtype(self):
+        return PdSparseNDArrayDtype()
+
+    def pack(self, value: Any) -> Optional[Dict[str, Any]]:
+        """
+        Convert a dense array, ``COOArray``, or scipy sparse array to a dict with
+        ``"indices"``, ``"values"`` and ``"shape"`` fields, for pyarrow consumption.
+        Values at duplicate coordinates are summed.
+        """
+        if value is None:
+            return value
+        indices, values, shape = self._sparsify(value)
+        return {"indices": indices, "values": values, "shape": shape}
+
+    def _sparsify(self, value: Any) -> Tuple[np.ndarray, np.ndarray, Tuple[int, ...]]:
+        dtype = self.item_type.to_pandas_dtype()
+        if hasattr(value, "tocoo"):
+            # scipy sparse arrays and matrices
+            value = value.tocoo()
+            coords = getattr(value, "coords", None)
+            if coords is None:
+                coords = (value.row, value.col)
+            value = COOArray(np.asarray(coords), np.asarray(value.data), value.shape)
+
+        if isinstance(value, COOArray):
+            shape = tuple(value.shape)
+            if len(shape) > 0:
+                indices = np.ravel_multi_index(tuple(value.coords), shape)
+            else:
+                indices = np.zeros(len(value.data), dtype=np.int64)
+            values = np.asarray(value.data)
+            # Sort by flat index, for consistency with dense input.
+            order = np.argsort(indices, kind="stable")
+            indices, values = indices[order], values[order]
+            if len(indices) > 1 and np.any(indices[1:] == indices[:-1]):
+                # Sum duplicate coordinates, as in scipy.
+                indices, inverse = np.unique(indices, return_inverse=True)
+                summed = np.zeros(len(indices), dtype=np.result_type(values, dtype))
+                np.add.at(summed, inverse, values)
+                values = summed
+        else:
+            value = np.asarray(value)
+            shape = value.shape
+            flat = value.reshape(-1)
+            indices = np.flatnonzero(flat)
+            values = flat[indices]
+        return indices.astype(np.int64), values.astype(dtype, copy=False), shape
+
+    def pack_array(self, values: Iterable[Any]) -> pa.ExtensionArray:
+        """
+        Pack a sequence of arrays into an array of this type, concatenating the
+        indices, values and shapes into contiguous buffers.
+        """
+        dtype = self.item_type.to_pandas_dtype()
+        if np.dtype(dtype) == object:
+            return super().pack_array(values)
+
+        values = list(values)
+        mask = np.array([v is None for v in values], dtype=bool)
+        sparse = [self._sparsify(v) for v in values if v is not None]
+
+        nnz = np.zeros(len(mask), dtype=np.int64)
+        nnz[~mask] = [len(indices) for indices, _, _ in sparse]
+        ndims = np.zeros(len(mask), dtype=np.int64)
+        ndims[~mask] = [len(shape) for _, _, shape in sparse]
+
+        if sparse:
+            indices = np.concatenate([indices for indices, _, _ in sparse])
+            data = np.concatenate([data for _, data, _ in sparse])
+            shape_flat = np.fromiter(
+                (dim for _, _, shape in sparse for dim in shape),
+                dtype=np.int64,
+                count=int(ndims.sum()),
+            )
+        else:
+            indices = np.empty(0, dtype=np.int64)
+            data = np.empty(0, dtype=dtype)
+            shape_flat = np.empty(0, dtype=np.int64)
+
+        arrays = [
+            pa.ListArray.from_arrays(_offsets(nnz), pa.array(indices, type=pa.int64())),
+            pa.ListArray.from_arrays(
+                _offsets(nnz), pa.array(data.astype(dtype), type=self.item_type)
+            ),
+            pa.ListArray.from_arrays(
+                _offsets(ndims), pa.array(shape_flat, type=pa.int64())
+            ),
+        ]
+        storage = pa.StructArray.from_arrays(
+            arrays,
+            fields=list(self.storage_type),
+            mask=pa.array(mask) if mask.any() else None,
+        )
+        return pa.ExtensionArray.from_storage(self, storage)
+
+    def unpack(self, value: Union[pa.Scalar, Dict[str, Any]]) -> Optional[np.ndarray]:
+        """
+        Convert a pyarrow struct scalar or dict with ``"indices"``, ``"values"`` and
+        ``"shape"`` fields back to a dense numpy array.
+        """
+        if value is None or pa.compute.is_null(value).as_py():
+            return None
+        indices, values, shape = value["indices"], value["values"], value["shape"]
+        if isinstance(value, pa.Scalar):
+            indices = indices.values.to_numpy()
+            values = values.values.to_numpy()
+            shape = shape.as_py()
+        dense = np.zeros(int(np.prod(shape)), dtype=self.item_type.to_pandas_dtype())
+        dense[np.asarray(indices, dtype=np.int64)] = values
+        return dense.reshape(shape)
+
+    def __str__(self) -> str:
+        return f"sparse_ndarray<item: {self.item_type}>"
+
+
+pa.register_extension_type(PaSparseNDArrayType())
+
+
+class PaSparseNDArrayArray(PaExtensionArray):
+    """
+    PyArrow sparse ndarray array that unpacks to dense arrays in python conversion
+    (``array.to_pylist()``) and numpy conversion (``array.to_numpy()``).
+    """
+
+    def _buffers(self) -> Tuple[np.ndarray, ...]:
+        """
+        Get the indices, values, and shapes buffers and offsets.
+        """
+        storage = self.storage
+        indices = storage.field("indices")
+        values = storage.field("values")
+        shapes = storage.field("shape")
+        return (
+            indices.offsets.to_numpy(),
+            indices.values.to_numpy(zero_copy_only=False),
+            values.values.to_numpy(zero_copy_only=False),
+            shapes.offsets.to_numpy(),
+            shapes.values.to_numpy(zero_copy_only=False),
+        )
+
+    def to_numpy(self, stack: bool = False, **kwargs):
+        """
+        Convert to a 1d object array of dense numpy arrays.
+
+        Args:
+            stack: return a single stacked N-D array if all the arrays have the same
+                shape and there are no nulls.
+        """
+        offsets, indices, values, shape_offsets, shape_values = self._buffers()
+        item_dtype = self.type.item_type.to_pandas_dtype()
+        valid = None
+        if self.storage.null_count > 0:
+            valid = self.storage.is_valid().to_numpy(zero_copy_only=False)
+
+        length = len(self)
+        out = np.empty(length, dtype=object)
+        if length == 0:
+            return out
+
+        shape = _uniform_shape(shape_offsets, shape_values, valid)
+        if shape is not None and valid is None:
+            # Scatter all rows at once into a stacked dense array.
+            size = int(np.prod(shape))
+            start = offsets[0]
+            rows = np.repeat(np.arange(length), np.diff(offsets))
+            dense = np.zeros((length, size), dtype=item_dtype)
+            dense[rows, indices[start : offsets[-1]]] = values[start : offsets[-1]]
+            dense = dense.reshape((length,) + shape)
+            if stack:
+                return dense
+            out[:] = list(dense)
+            return out
+
+        for ii in range(length):
+            if valid is not None and not valid[ii]:
+                continue
+            row_shape = tuple(shape_values[shape_offsets[ii] : shape_offsets[ii + 1]])
+            dense = np.zeros(int(np.prod(row_shape)), dtype=item_dtype)
+            start, end = offsets[ii], offsets[ii + 1]
+            dense[indices[start:end]] = values[start:end]
+            out[ii] = dense.reshape(row_shape)
+        return out
+
+    def to_coo(self) -> List[Optional[COOArray]]:
+        """
+        Convert to a list of sparse ``COOArray``s, with coordinates and values as views
+        into Arrow memory where possible.
+        """
+        offsets, indices, values, shape_offsets, shape_values = self._buffers()
+        valid = self.storage.is_valid().to_numpy(zero_copy_only=False)
+
+        coos: List[Optional[COOArray]] = []
+        for ii in range(len(self)):
+            if not valid[ii]:
+                coos.append(None)
+                continue
+            shape = tuple(
+                int(dim)
+                for dim in shape_values[shape_offsets[ii] : shape_offsets[ii + 1]]
+            )
+            start, end = offsets[ii], offsets[ii + 1]
+            coords = np.stack(np.unravel_index(indices[start:end], shape))
+            coos.append(COOArray(coords, values[start:end], shape))
+        return coos
+
+    @classmethod
+    def from_sequence(
+        cls,
+        values: Iterable[np.ndarray],
+        *,
+        item_dtype: Any = None,
+    ) -> "PaSparseNDArrayArray":
+        """
+        Construct an array from a python iterable of dense arrays.
+        """
+        if item_dtype is None:
+            item_dtype = _infer_dtype(values)
+        typ = PaSparseNDArrayType(pa.from_numpy_dtype(item_dtype))
+        return cls._from_sequence(values, typ)
+
+
+@register_extension_dtype
+class PdSparseNDArrayDtype(PdExtensionDtype):
+    """
+    Pandas extension dtype for (dense) ndarrays supporting conversion to a PyArrow
+    sparse extension type (``PaSparseNDArrayType``).
+    """
+
+    name = "sparse_ndarray"
+
+    @classmethod
+    def construct_array_type(cls):
+        """
+        Return the array type associated with this dtype.
+        """
+        return PdSparseNDArrayArray
+
+
+class PdSparseNDArrayArray(PandasArray):
+    """
+    Pandas extension array for ndarrays supporting conversion to a PyArrow sparse
+    extension type (``PaSparseNDArrayType``).
+    """
+
+    _typ = "extension"
+    _dtype = PdSparseNDArrayDtype()
+    _internal_fill_value = None
+    _str_na_value = None
+
+    def __init__(
+        self,
+        values: Iterable[np.ndarray],
+        *,
+        copy: bool = False,
+        item_dtype: Any = None,
+    ):
+        if not isinstance(values, np.ndarray):
+            values = _array_of_arrays(values, item_dtype=item_dtype)
+        if values.ndim != 1:
+            raise ValueError("Only one-dimensional arrays supported")
+        if copy:
+            values = values.copy()
+        super(PandasArray, self).__init__(values, PdSparseNDArrayDtype())
+        self.item_dtype = item_dtype
+
+    @classmethod
+    def _from_sequence(
+        cls, scalars, *, dtype: Any = None, copy: bool = False
+    ) -> "PdSparseNDArrayArray":
+        return PdSparseNDArrayArray(scalars, copy=copy)
+
+    def __arrow_array__(
+        self, type: Optional[pa.DataType] = None
+    ) -> PaSparseNDArrayArray:
+        """
+        Convert myself into a PyArrow array
+        """
+        if isinstance(type, PaSparseNDArrayType):
+            return type.pack_array(self._ndarray)
+        if type is not None and pa.types.is_struct(type):
+            # pyarrow passes the storage type when converting to an extension type.
+            typ = PaSparseNDArrayType(type.field("values").type.value_type)
+            return typ.pack_array(self._ndarray)
+        return PaSparseNDArrayArray.from_sequence(
+            self._ndarray, item_dtype=self.item_dtype
+        )
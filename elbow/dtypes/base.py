@@ -19,6 +19,8 @@ class PaExtensionType(pa.ExtensionType):
 
         - ``pack()``
         - ``unpack()``
+
+    and a default implementation for ``pack_array()``.
     """
 
     def pack(self, value: Any) -> Any:
@@ -27,6 +29,14 @@ class PaExtensionType(pa.ExtensionType):
         """
         raise NotImplementedError
 
+    def pack_array(self, values: Iterable[Any]) -> pa.ExtensionArray:
+        """
+        Pack a sequence of objects into an array of this type. Sub-classes can override
+        this with a vectorized implementation.
+        """
+        storage = pa.array([self.pack(v) for v in values], type=self.storage_type)
+        return pa.ExtensionArray.from_storage(self, storage)
+
     def unpack(self, value: Any) -> Any:
         """
         Unpack a pyarrow scalar back to a python object.
@@ -36,6 +46,19 @@ class PaExtensionType(pa.ExtensionType):
     def __key(self) -> Tuple[Hashable, ...]:
         return (self.__class__.__name__, self.__arrow_ext_serialize__())
 
+    def __eq__(self, other: Any) -> bool:
+        # Unlike the pyarrow default, also compare the serialized parameters.
+        if isinstance(other, PaExtensionType):
+            return (
+                type(self) is type(other)
+                and self.storage_type == other.storage_type
+                and self.__key() == other.__key()
+            )
+        return super().__eq__(other)
+
+    def __ne__(self, other: Any) -> bool:
+        return not self == other
+
     def __hash__(self) -> int:
         return hash(self.__key())
 
@@ -88,10 +111,19 @@ class PaExtensionArray(pa.ExtensionArray):
         Construct an array from a python sequence, first packing each of the ``values``
         according to the extension type ``typ``.
         """
-        storage = [typ.pack(val) for val in values]
-        storage = pa.array(storage, type=typ.storage_type)
-        array = cls.from_storage(typ, storage)
-        return array
+        return typ.pack_array(values)
+
+
+def binary_buffers(array: pa.Array) -> Tuple[np.ndarray, memoryview]:
+    """
+    Get the offsets (accounting for slicing) and data buffer of a string or binary
+    array, for converting values without going through pyarrow scalars.
+    """
+    offsets_buf, data_buf = array.buffers()[1:3]
+    offsets = np.frombuffer(offsets_buf, dtype=np.int32)
+    offsets = offsets[array.offset : array.offset + len(array) + 1]
+    data = memoryview(data_buf) if data_buf is not None else memoryview(b"")
+    return offsets, data
 
 
 class PdExtensionDtype(ExtensionDtype):
@@ -121,8 +153,15 @@ class PdExtensionDtype(ExtensionDtype):
         raise NotImplementedError
 
     def __from_arrow__(self, array: Union[pa.Array, pa.ChunkedArray]) -> ExtensionArray:
+        # NOTE: The extension arrays implement vectorized ``to_numpy()`` conversions.
         if isinstance(array, pa.ChunkedArray):
-            values = np.concatenate([chunk.to_numpy() for chunk in array.iterchunks()])
+            chunks = [chunk.to_numpy() for chunk in array.iterchunks()]
+            if len(chunks) == 1:
+                values = chunks[0]
+            elif chunks:
+                values = np.concatenate(chunks)
+            else:
+                values = np.empty(0, dtype=object)
         else:
             values = array.to_numpy()
         array_typ = self.construct_array_type()
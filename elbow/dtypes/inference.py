@@ -1,13 +1,20 @@
 import re
-from typing import Any, Dict, Optional, Union
+from functools import lru_cache
+from typing import Any, Dict, List, NoReturn, Optional, Tuple, Union
 
 import numpy as np
 import pyarrow as pa
 from typing_extensions import get_args, get_origin
 
-from . import PaJSONType, PaNDArrayType, PaPickleType
+from . import (
+    PaJSONType,
+    PaNDArrayType,
+    PaPickleType,
+    PaSparseNDArrayType,
+    has_extension,
+)
 
-__all__ = ["DataType", "Fields", "get_dtype", "infer_dtype"]
+__all__ = ["DataType", "Fields", "get_dtype", "infer_dtype", "promote_dtype"]
 
 DataType = Union[type, str, pa.DataType, np.dtype]
 Fields = Dict[str, DataType]
@@ -29,8 +36,18 @@ def get_dtype(alias: DataType) -> pa.DataType:
     The following extension types are also supported:
 
     - ``"json"`` -> ``PaJSONType()``
+    - ``"json<auto>"`` -> ``PaJSONType(auto=True)``
+    - ``"json<NAME: TYPE, ...>"`` -> ``PaJSONType(fields={NAME: TYPE, ...})``
     - ``"pickle"`` -> ``PaPickleType()``
+    - ``"pickle<SERIALIZER>"`` -> ``PaPickleType(serializer=SERIALIZER)``
+    - ``"pickle<serializer: SERIALIZER, compression: CODEC, out_of_band: true>"`` ->
+      ``PaPickleType(serializer=SERIALIZER, compression=CODEC, out_of_band=True)``
     - ``"ndarray<(item:)? TYPE>"`` -> ``PaNDArrayType(TYPE)``
+    - ``"ndarray<(item:)? TYPE, shape: (D, ...)>"`` -> ``PaNDArrayType(TYPE, (D, ...))``
+    - ``"ndarray<(item:)? TYPE, shape: auto>"`` -> ``PaNDArrayType(TYPE, "auto")``
+    - ``"ndarray<(item:)? TYPE, codec: CODEC, shuffle: false, delta: true>"`` ->
+      ``PaNDArrayType(TYPE, codec=CODEC, shuffle=False, delta=True)``
+    - ``"sparse_ndarray<(item:)? TYPE>"`` -> ``PaSparseNDArrayType(TYPE)``
 
     The following python type hints are supported:
 
@@ -40,11 +57,29 @@ def get_dtype(alias: DataType) -> pa.DataType:
 
     .. _here: https://github.com/apache/arrow/blob/go/v10.0.0/python/pyarrow/types.pxi#L3159
 
-    NOTE: nested types containing extension types are not supported
+    Extension types can be nested inside list and struct types, e.g.
+    ``"list<ndarray<float32>>"`` or ``"struct<meta: json, ...>"``.
+
+    String aliases are parsed in a single pass. Results are cached for hashable
+    aliases, so repeated lookups are effectively free.
     """
+    try:
+        hash(alias)
+    except TypeError:
+        return _get_dtype(alias)
+    return _get_dtype_cached(alias)
+
+
+@lru_cache(maxsize=1024)
+def _get_dtype_cached(alias: DataType) -> pa.DataType:
+    return _get_dtype(alias)
+
+
+def _get_dtype(alias: DataType) -> pa.DataType:
     if isinstance(alias, str):
         alias = alias.strip()
 
+    # Fast path for primitive type names.
     dtype = _get_primitive_dtype(alias)
     if dtype is not None:
         return dtype
@@ -53,13 +88,8 @@ def get_dtype(alias: DataType) -> pa.DataType:
     if dtype is not None:
         return dtype
 
-    dtype = _get_extension_dtype(alias)
-    if dtype is not None:
-        return dtype
-
-    dtype = _get_nested_dtype(alias)
-    if dtype is not None:
-        return dtype
+    if isinstance(alias, str):
+        return _AliasParser(alias).parse()
 
     raise ValueError(f"Unsupported dtype alias '{alias}'")
 
@@ -101,103 +131,346 @@ def _get_generic_dtype(alias: Any) -> Optional[pa.DataType]:
     return None
 
 
-def _get_extension_dtype(alias: DataType) -> Optional[pa.DataType]:
-    if not isinstance(alias, str):
-        return None
+# Alias tokens: punctuation, or names with an optional bracketed suffix, e.g.
+# "datetime64[ns]" or "timestamp[ms, tz=UTC]".
+_TOKEN_PATTERN = re.compile(r"\s*(?:([<>(),:=])|([^\s<>(),:=\[\]]+(?:\[[^\]]*\])?))")
 
-    alias = alias.lower()
 
-    if alias == "json":
-        return PaJSONType()
+def _tokenize(alias: str) -> Tuple[List[str], List[int]]:
+    """
+    Split an alias into tokens. Returns the tokens and their start offsets.
+    """
+    tokens = []
+    starts = []
+    pos = 0
+    end = len(alias.rstrip())
+    while pos < end:
+        match = _TOKEN_PATTERN.match(alias, pos)
+        if match is None or match.end() == pos:
+            raise ValueError(f"Invalid dtype alias '{alias}'")
+        group = 1 if match.group(1) else 2
+        tokens.append(match.group(group))
+        starts.append(match.start(group))
+        pos = match.end()
+    return tokens, starts
+
+
+class _AliasParser:
+    """
+    Recursive descent parser for the dtype alias grammar::
 
-    if alias == "pickle":
-        return PaPickleType()
+        type   := NAME [ "<" params ">" ]
+        field  := NAME+ ":" type
 
-    if alias.startswith("ndarray"):
-        return _ndarray_from_string(alias)
-    return None
+    where the params depend on the type name (see `get_dtype()`). Each token is
+    visited once, so parsing is linear in the alias length.
+    """
 
+    def __init__(self, alias: str):
+        self.alias = alias
+        self.tokens, self.starts = _tokenize(alias)
+        self.pos = 0
 
-def _get_nested_dtype(alias: DataType) -> Optional[pa.DataType]:
-    if not isinstance(alias, str):
-        return None
+    def parse(self) -> pa.DataType:
+        dtype = self._type()
+        if self.pos != len(self.tokens):
+            self._error()
+        return dtype
 
-    dtype = _struct_from_string(alias)
-    if dtype is not None:
+    def _error(self) -> NoReturn:
+        raise ValueError(f"Unsupported dtype alias '{self.alias}'")
+
+    def _peek(self, offset: int = 0) -> Optional[str]:
+        pos = self.pos + offset
+        return self.tokens[pos] if pos < len(self.tokens) else None
+
+    def _next(self) -> str:
+        token = self._peek()
+        if token is None:
+            self._error()
+        self.pos += 1
+        return token
+
+    def _expect(self, token: str) -> None:
+        if self._next() != token:
+            self._error()
+
+    def _accept(self, token: str) -> bool:
+        if self._peek() == token:
+            self.pos += 1
+            return True
+        return False
+
+    def _name(self) -> str:
+        token = self._next()
+        if token in "<>(),:=":
+            self._error()
+        return token
+
+    def _field_name(self) -> str:
+        """
+        Read a struct field name, which can contain whitespace, up to the ":".
+        """
+        first = self.pos
+        self._name()
+        while self._peek() != ":":
+            self._name()
+        last = self.pos - 1
+        return self.alias[
+            self.starts[first] : self.starts[last] + len(self.tokens[last])
+        ]
+
+    def _type(self) -> pa.DataType:
+        name = self._name()
+        if not self._accept("<"):
+            return self._leaf(name)
+
+        kind = name.lower()
+        if kind in ("list", "array"):
+            dtype = pa.list_(self._item())
+        elif kind == "struct":
+            dtype = pa.struct(self._fields())
+        elif kind == "json":
+            dtype = self._json()
+        elif kind == "pickle":
+            dtype = self._pickle()
+        elif kind == "ndarray":
+            dtype = self._ndarray()
+        elif kind == "sparse_ndarray":
+            dtype = PaSparseNDArrayType(self._item())
+        else:
+            self._error()
+        self._expect(">")
         return dtype
 
-    dtype = _list_from_string(alias)
-    if dtype is not None:
+    def _leaf(self, name: str) -> pa.DataType:
+        kind = name.lower()
+        if kind == "json":
+            return PaJSONType()
+        if kind == "pickle":
+            return PaPickleType()
+        dtype = _get_primitive_dtype(name)
+        if dtype is None:
+            self._error()
         return dtype
-    return None
 
+    def _item(self) -> pa.DataType:
+        # Optional "item:" prefix, e.g. "list<item: double>"
+        if self._peek() == "item" and self._peek(1) == ":":
+            self.pos += 2
+        return self._type()
+
+    def _fields(self) -> List[Tuple[str, pa.DataType]]:
+        fields = []
+        while True:
+            name = self._field_name()
+            self._expect(":")
+            fields.append((name, self._type()))
+            if not self._accept(","):
+                return fields
+
+    def _json(self) -> pa.DataType:
+        token = self._peek()
+        if token is not None and token.lower() == "auto" and self._peek(1) == ">":
+            self.pos += 1
+            return PaJSONType(auto=True)
+        return PaJSONType(fields=pa.struct(self._fields()))
+
+    def _pickle(self) -> pa.DataType:
+        params: Dict[str, Any] = {}
+        while True:
+            key = self._name()
+            if self._accept(":"):
+                val = self._name()
+            else:
+                # Bare serializer name, e.g. "pickle<npy>"
+                key, val = "serializer", key
+            params[key] = {"true": True, "false": False}.get(val, val)
+            if not self._accept(","):
+                break
+        try:
+            return PaPickleType(**params)
+        except TypeError as exc:
+            raise ValueError(f"Invalid pickle alias '{self.alias}'") from exc
+
+    def _ndarray(self) -> pa.DataType:
+        dtype = self._item()
+        params: Dict[str, Any] = {}
+        while self._accept(","):
+            key = self._name()
+            self._expect(":")
+            if key == "shape":
+                params[key] = self._shape()
+            elif key == "codec":
+                params[key] = self._name()
+            elif key in {"shuffle", "delta"}:
+                params[key] = self._name().lower() == "true"
+            else:
+                self._error()
+        return PaNDArrayType(dtype, **params)
+
+    def _shape(self) -> Union[Tuple[int, ...], str]:
+        token = self._peek()
+        if token is not None and token.lower() == "auto":
+            self.pos += 1
+            return "auto"
+        self._expect("(")
+        dims = []
+        while not self._accept(")"):
+            dim = self._name()
+            if not dim.isdigit():
+                self._error()
+            dims.append(int(dim))
+            if not self._accept(","):
+                self._expect(")")
+                break
+        return tuple(dims)
+
+
+# Cache of inferred data types, keyed on python type, or numpy dtype and ndim. Python
+# ints outside the int64 range aren't cached.
+_INFERRED_DTYPES: Dict[Any, pa.DataType] = {
+    type(None): pa.null(),
+    bool: pa.bool_(),
+    int: pa.int64(),
+    float: pa.float64(),
+    str: pa.string(),
+    bytes: pa.binary(),
+}
+
+
+def infer_dtype(scalar: Any, sparse_threshold: Optional[float] = None) -> pa.DataType:
+    """
+    Attempt to infer the data type of an arbitrary scalar value.
+
+    Results are cached for basic python types, and numpy arrays and scalars (by dtype
+    and ndim).
 
-def _struct_from_string(alias: str) -> Optional[pa.DataType]:
-    match = re.match(r"^struct\s*<(.+)>$", alias)
-    if match is None:
-        return None
+    Args:
+        scalar: value to infer the type of
+        sparse_threshold: optional density threshold. Multi-dimensional numpy arrays
+            with a fraction of nonzero entries at most this are inferred as
+            ``PaSparseNDArrayType``.
+    """
+    if (
+        sparse_threshold is not None
+        and isinstance(scalar, np.ndarray)
+        and scalar.ndim > 1
+        and scalar.dtype != object
+        and np.count_nonzero(scalar) <= sparse_threshold * scalar.size
+    ):
+        return PaSparseNDArrayType(get_dtype(scalar.dtype))
+
+    key = _inference_key(scalar)
+    if key is not None:
+        dtype = _INFERRED_DTYPES.get(key)
+        if dtype is not None:
+            return dtype
+    elif type(scalar) is int and _INT64_MAX < scalar <= _UINT64_MAX:
+        return pa.uint64()
 
-    fields = []
-    items = match.group(1)
-    try:
-        while items:
-            end = _find_split(items)
-            if end == -1:
-                item, items = items, ""
-            else:
-                item, items = items[:end], items[(end + 1) :]
+    if isinstance(scalar, np.ndarray) and scalar.ndim > 1:
+        dtype = PaNDArrayType(get_dtype(scalar.dtype))
+    else:
+        dtype = _infer_nested_dtype(scalar, sparse_threshold)
+        if dtype is None:
+            dtype = pa.scalar(scalar).type
 
-            # Split just on the first ":" in case you have a field like
-            # "data: list<item: double>"
-            split = item.find(":")
-            if split < 0:
-                raise ValueError
-            name, item_alias = item[:split], item[(split + 1) :]
-            fields.append((name.strip(), get_dtype(item_alias)))
-    except ValueError as exc:
-        raise ValueError(f"Invalid struct alias {alias}") from exc
-    return pa.struct(fields)
+    if key is not None:
+        _INFERRED_DTYPES[key] = dtype
+    return dtype
 
 
-def _find_split(items: str):
+def promote_dtype(a: pa.DataType, b: pa.DataType) -> pa.DataType:
     """
-    Find next comma split, ignoring regions nested in ``"< >"`` (which can contain
-    commas that well mess up parsing in the case of nested structs).
+    Find a common data type that arrays of type `a` and `b` can both be cast to,
+    following the promotion rules:
+
+        - null -> any type
+        - integer -> wider integer, or double
+        - float -> wider float
+        - ``list<A>``, ``list<B>`` -> ``list<promote(A, B)>``
+        - struct -> union of the fields, with shared fields promoted
+
+    Raises a ``ValueError`` if there's no common type.
     """
-    nest_count = 0
-    for ii, c in enumerate(items):
-        if c == "<":
-            nest_count += 1
-        elif c == ">":
-            nest_count -= 1
-        elif c == "," and nest_count == 0:
-            return ii
-    return -1
-
-
-def _list_from_string(alias: str) -> Optional[pa.DataType]:
-    match = re.match(r"^(?:list|array)\s*<(?:\s*item\s*:)?(.+)>$", alias)
-    if match is None:
-        return None
-    alias = match.group(1)
-    dtype = get_dtype(alias)
-    return pa.list_(dtype)
+    if a == b:
+        return a
+    if pa.types.is_null(a):
+        return b
+    if pa.types.is_null(b):
+        return a
+
+    if pa.types.is_integer(a) and pa.types.is_integer(b):
+        if pa.types.is_signed_integer(a) != pa.types.is_signed_integer(b):
+            return pa.int64()
+        return a if a.bit_width >= b.bit_width else b
+
+    if _is_int_or_float(a) and _is_int_or_float(b):
+        if pa.types.is_floating(a) and pa.types.is_floating(b):
+            return a if a.bit_width >= b.bit_width else b
+        return pa.float64()
+
+    if (pa.types.is_list(a) and pa.types.is_list(b)) or (
+        pa.types.is_large_list(a) and pa.types.is_large_list(b)
+    ):
+        item_type = promote_dtype(a.value_type, b.value_type)
+        if pa.types.is_large_list(a):
+            return pa.large_list(item_type)
+        return pa.list_(item_type)
+
+    if pa.types.is_struct(a) and pa.types.is_struct(b):
+        fields = {field.name: field.type for field in a}
+        for field in b:
+            if field.name in fields:
+                fields[field.name] = promote_dtype(fields[field.name], field.type)
+            else:
+                fields[field.name] = field.type
+        return pa.struct(fields)
 
+    raise ValueError(f"Can't promote incompatible types {a} and {b}")
 
-def _ndarray_from_string(alias: str) -> Optional[pa.DataType]:
-    match = re.match(r"^ndarray\s*<(?:\s*item\s*:)?(.+)>$", alias)
-    if match is None:
-        return None
-    alias = match.group(1)
-    dtype = get_dtype(alias)
-    return PaNDArrayType(dtype)
+
+def _is_int_or_float(typ: pa.DataType) -> bool:
+    return pa.types.is_integer(typ) or pa.types.is_floating(typ)
 
 
-def infer_dtype(scalar: Any) -> pa.DataType:
+def _infer_nested_dtype(
+    scalar: Any, sparse_threshold: Optional[float] = None
+) -> Optional[pa.DataType]:
     """
-    Attempt to infer the data type of an arbitrary scalar value.
+    Infer the type of a list or dict containing values of extension type (e.g. a list
+    of ndarrays), which pyarrow can't infer. Returns `None` otherwise.
     """
-    if isinstance(scalar, np.ndarray) and scalar.ndim > 1:
-        return PaNDArrayType(get_dtype(scalar.dtype))
+    if isinstance(scalar, (list, tuple)):
+        item = next((v for v in scalar if v is not None), None)
+        if item is not None:
+            item_type = infer_dtype(item, sparse_threshold)
+            if has_extension(item_type):
+                return pa.list_(item_type)
+    elif isinstance(scalar, dict) and all(isinstance(k, str) for k in scalar):
+        fields = {k: infer_dtype(v, sparse_threshold) for k, v in scalar.items()}
+        if any(has_extension(typ) for typ in fields.values()):
+            return pa.struct(fields)
+    return None
+
 
-    return pa.scalar(scalar).type
+_INT64_MIN = -(2**63)
+_INT64_MAX = 2**63 - 1
+_UINT64_MAX = 2**64 - 1
+
+
+def _inference_key(scalar: Any) -> Optional[Any]:
+    """
+    Key for caching the inferred type of `scalar`, or `None` if the type may depend on
+    the value.
+    """
+    typ = type(scalar)
+    if typ is int and not _INT64_MIN <= scalar <= _INT64_MAX:
+        # Large ints are inferred as uint64, or fail.
+        return None
+    if typ in _INFERRED_DTYPES:
+        return typ
+    if isinstance(scalar, (np.ndarray, np.generic)) and scalar.dtype != object:
+        return (scalar.dtype, scalar.ndim)
+    return None
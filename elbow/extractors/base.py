@@ -12,7 +12,8 @@ from elbow.typing import StrOrPath
 class Extractor(Protocol):
     """
     An abstract extractor interface. To satisfy the interface, an extractor should take
-    an input path and return an optional RecordLike, or iterable thereof.
+    an input path and return an optional RecordLike, or iterable thereof. Extractors
+    used with an `ArchiveSource` receive `ArchiveMember` file objects instead of paths.
     """
 
     def __call__(
@@ -3,9 +3,11 @@ File metadata extractors.
 """
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Union
 
+from elbow.sources.archive import ArchiveMember
 from elbow.typing import StrOrPath
+from elbow.utils import stat_mtime
 
 
 @dataclass
@@ -21,13 +23,18 @@ class FileMetadata:
     mod_time: Optional[float]
 
 
-def extract_file_meta(path: StrOrPath) -> FileMetadata:
+def extract_file_meta(path: Union[StrOrPath, ArchiveMember]) -> FileMetadata:
     """
-    File metadata extractor.
+    File metadata extractor. For `StatPath` inputs (see `Crawler(with_stat=True)`),
+    the cached stat result is used. For `ArchiveMember` inputs, the member's virtual
+    path and recorded modified time are used.
     """
-    path = Path(path)
+    if isinstance(path, ArchiveMember):
+        return FileMetadata(file_path=path.name, link_target=None, mod_time=path.mtime)
+    if not isinstance(path, Path):
+        path = Path(path)
     target = str(path.resolve()) if path.is_symlink() else None
-    mtime = path.stat().st_mtime if path.exists() else None
+    mtime = stat_mtime(path)
     return FileMetadata(
         file_path=str(path.absolute()), link_target=target, mod_time=mtime
     )
@@ -1,10 +1,13 @@
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Union
 
 import pandas as pd
 from pyarrow import ArrowInvalid
 
+from elbow.dataset import DatasetManifest
+from elbow.sources.archive import ArchiveMember
 from elbow.typing import StrOrPath
+from elbow.utils import stat_mtime
 
 __all__ = ["FileModifiedIndex"]
 
@@ -42,13 +45,18 @@ class FileModifiedIndex:
         mtime_column: str = "mod_time",
     ):
         """
-        Initialize index from a parquet file or directory of parquet files.
+        Initialize index from a parquet file or directory of parquet files. If the
+        directory has an up to date manifest (see `elbow.dataset.DatasetManifest`),
+        the part files are read directly without schema discovery.
         """
         # TODO: maybe try to infer the path/mtime columns more flexibly
+        columns = [path_column, mtime_column]
+        manifest = DatasetManifest.load(path) if Path(path).is_dir() else None
         try:
-            df = pd.read_parquet(
-                path, columns=[path_column, mtime_column], engine="pyarrow"
-            )
+            if manifest is not None and manifest.is_complete(path):
+                df = manifest.dataset(path).to_table(columns=columns).to_pandas()
+            else:
+                df = pd.read_parquet(path, columns=columns, engine="pyarrow")
         except ArrowInvalid:
             raise ValueError(
                 "Parquet table is missing file index columns "
@@ -56,20 +64,31 @@ class FileModifiedIndex:
             )
         return cls.from_df(df, path_column=path_column, mtime_column=mtime_column)
 
-    def filter(self, path: StrOrPath) -> bool:
+    def filter(self, path: Union[StrOrPath, ArchiveMember]) -> bool:
         """
-        Test whether a path is new or has been modified since it was indexed.
+        Test whether a path is new or has been modified since it was indexed. Archive
+        members are looked up by their virtual path and recorded modified time.
         """
+        if isinstance(path, ArchiveMember):
+            return path.name not in self._index or path.mtime > self._index[path.name]
+
         # NOTE: paths are assumed to be absolute but not resolved. See also
         # the file meta extractor.
-        path = Path(path).absolute()
-        if not path.exists():
+        # NOTE: `StatPath`s from the crawler are used as is, so that the cached stat
+        # is reused rather than hitting the filesystem again.
+        if not isinstance(path, Path):
+            path = Path(path)
+        path = path.absolute()
+        mtime = stat_mtime(path)
+        if mtime is None:
             return False
-        mtime = path.stat().st_mtime
         path = str(path)
         if path not in self._index:
             return True
         old_mtime = self._index[path]
         return mtime > old_mtime
 
+    def __contains__(self, path: str) -> bool:
+        return path in self._index
+
     __call__ = filter
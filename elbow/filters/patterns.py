@@ -1,9 +1,10 @@
-import fnmatch
+import os
 import re
-from pathlib import Path
+from pathlib import Path, PurePath
 from typing import List, Union
 
 from elbow.typing import Filter, StrOrPath
+from elbow.utils import GlobMatcher
 
 __all__ = ["glob_filter", "regex_filter"]
 
@@ -18,15 +19,20 @@ def glob_filter(pattern: Union[str, List[str]], exclude: bool = False) -> Filter
         pattern = [pattern]
     include = not exclude
 
+    # Patterns are compiled once, split by what they match against.
+    name_matcher = GlobMatcher(pat for pat in pattern if "/" not in pat)
+    path_matcher = GlobMatcher(pat for pat in pattern if "/" in pat)
+
     def _filter(path: StrOrPath):
-        path = Path(path)
-        path_posix = path.as_posix()
-        path_name = path.name
-
-        for pat in pattern:
-            query = path_posix if "/" in pat else path_name
-            if fnmatch.fnmatch(query, pat):
-                return include
+        if isinstance(path, PurePath):
+            name = path.name
+        else:
+            # Avoid constructing a Path just for the name.
+            name = os.path.basename(path.rstrip(os.sep))
+        if name_matcher and name_matcher.match(name):
+            return include
+        if path_matcher and path_matcher.match(Path(path).as_posix()):
+            return include
         return not include
 
     return _filter
@@ -1,11 +1,32 @@
 from dataclasses import fields
-from typing import Any, Dict, Iterable, List, Optional, Set, Union
+from itertools import islice
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+    get_type_hints,
+)
 
 import numpy as np
 import pandas as pd
 import pyarrow as pa
 
-from elbow.dtypes import DataType, PaExtensionType, get_dtype, infer_dtype
+from elbow.dtypes import (
+    DataType,
+    PaExtensionType,
+    get_dtype,
+    has_extension,
+    infer_dtype,
+    pack_nested,
+    promote_dtype,
+    unpack_nested,
+)
 from elbow.typing import Dataclass
 
 __all__ = [
@@ -16,8 +37,10 @@ __all__ = [
     "is_recordlike",
     "concat",
     "arrow_record",
+    "arrow_batches",
     "arrow_table",
     "arrow_array",
+    "table_to_df",
 ]
 
 RecordLike = Union[Dict[str, Any], Dataclass, "Record"]
@@ -72,14 +95,17 @@ class Record(dict):
         """
         return self._types.get(key)
 
-    def arrow_type(self, key: str) -> pa.DataType:
+    def arrow_type(
+        self, key: str, sparse_threshold: Optional[float] = None
+    ) -> pa.DataType:
         """
-        Get the arrow data type for field `key`.
+        Get the arrow data type for field `key`. See `infer_dtype()` for
+        `sparse_threshold`.
         """
         if key in self._types:
             typ = get_dtype(self._types[key])
         else:
-            typ = infer_dtype(self[key])
+            typ = infer_dtype(self[key], sparse_threshold=sparse_threshold)
         return typ
 
     def arrow_schema(self) -> pa.Schema:
@@ -130,11 +156,8 @@ class Record(dict):
         """
         Create a Record from a dataclass instance.
         """
-        obj_fields = fields(obj)
-        data = {f.name: getattr(obj, f.name) for f in obj_fields}
-        types: Dict[str, DataType] = {
-            f.name: f.type for f in obj_fields if f.type not in {None, Any}
-        }
+        names, types = _dataclass_spec(type(obj))
+        data = {name: getattr(obj, name) for name in names}
         return cls(data, types=types)
 
     __add__ = merge
@@ -152,6 +175,15 @@ class RecordBatch:
 
         table = batch.to_arrow()
 
+    Record values are appended directly to per-column buffers, which are converted to
+    PyArrow arrays every `chunk_size` rows. So the batch holds at most one chunk of
+    python objects at a time.
+
+    Columns without a declared type (in the `schema` or the record types) are inferred
+    one chunk at a time, from all the pending values. The column type is promoted as
+    needed across chunks (e.g. int -> double, null -> any type, list<int> ->
+    list<double>), and earlier chunks are cast to the final type.
+
     Args:
         batch: batch of initial records.
         schema: PyArrow Schema or mapping of column names to types. If absent, the
@@ -159,6 +191,10 @@ class RecordBatch:
         strict: by default, the schema is updated incrementally to contain the union of
             columns present in all records. Setting `strict` to `True` disables this.
             All records must then share the same columns.
+        chunk_size: number of rows to buffer before converting to PyArrow.
+        sparse_threshold: optional density threshold. Inferred multi-dimensional
+            array columns whose first value has a fraction of nonzero entries at most
+            this are stored as ``sparse_ndarray``. See `infer_dtype()`.
     """
 
     def __init__(
@@ -166,9 +202,13 @@ class RecordBatch:
         batch: Optional[Iterable[RecordLike]] = None,
         schema: Optional[Union[Dict[str, DataType], pa.Schema]] = None,
         strict: bool = False,
+        chunk_size: int = 4096,
+        sparse_threshold: Optional[float] = None,
     ):
         self.schema = schema
         self.strict = strict
+        self.chunk_size = chunk_size
+        self.sparse_threshold = sparse_threshold
 
         self.reset()
         if batch is not None:
@@ -178,10 +218,19 @@ class RecordBatch:
         """
         Reset the batch.
         """
-        self._batch: List[Record] = []
         self._columns: List[str] = []
         self._fields: Dict[str, pa.DataType] = {}
         self._null_fields: Set[str] = set()
+        # Columns whose types are inferred from the values
+        self._inferred: Set[str] = set()
+        # Pending python values and converted arrow chunks per column
+        self._values: Dict[str, List[Any]] = {}
+        self._chunks: Dict[str, List[pa.Array]] = {}
+        self._chunk_lengths: List[int] = []
+        self._chunk_bytes = 0
+        self._pending = 0
+        # Dataclass type whose fields match the batch columns exactly
+        self._fast_type: Optional[type] = None
 
         if self.schema is not None:
             schema = self.schema
@@ -195,10 +244,21 @@ class RecordBatch:
         """
         Append a record to the batch.
         """
+        # Fast path for a stream of dataclass instances, once the column types are
+        # settled. Values are appended straight from the instance attributes.
+        if type(record) is self._fast_type and not self._null_fields:
+            for name, values in self._values.items():
+                values.append(getattr(record, name))
+            self._pending += 1
+            if self._pending >= self.chunk_size:
+                self._flush_chunk()
+            return
+
+        orig_type = type(record)
         record = as_record(record)
 
         if not self._fields:
-            self._init_schema(record.arrow_schema())
+            self._add_fields_from_record(record, list(record))
 
         new_columns = self._new_columns(record)
         if new_columns:
@@ -211,7 +271,17 @@ class RecordBatch:
         if self._contains_null():
             self._update_null_from_record(record)
 
-        self._batch.append(record)
+        for name, values in self._values.items():
+            values.append(record.get(name))
+        self._pending += 1
+
+        if self._pending >= self.chunk_size:
+            self._flush_chunk()
+
+        if _is_dataclass_type(orig_type):
+            names, _ = _dataclass_spec(orig_type)
+            if set(names) == set(self._columns):
+                self._fast_type = orig_type
 
     def extend(self, records: Iterable[RecordLike]):
         """
@@ -224,11 +294,22 @@ class RecordBatch:
         """
         Initialize the internal batch schema.
         """
-        self._columns = list(schema.names)
-        self._fields = {field.name: field.type for field in schema}
-        self._null_fields = {
-            name for name, typ in self._fields.items() if pa.types.is_null(typ)
-        }
+        for field in schema:
+            self._add_column(field.name, field.type)
+
+    def _add_column(self, name: str, typ: pa.DataType, inferred: bool = False):
+        """
+        Add a new column, back-filled with nulls.
+        """
+        self._columns.append(name)
+        self._fields[name] = typ
+        self._fast_type = None
+        if inferred:
+            self._inferred.add(name)
+        if pa.types.is_null(typ):
+            self._null_fields.add(name)
+        self._values[name] = [None] * self._pending
+        self._chunks[name] = [pa.nulls(length) for length in self._chunk_lengths]
 
     def _new_columns(self, record: Record) -> List[str]:
         return [k for k in record if k not in self._fields]
@@ -240,20 +321,74 @@ class RecordBatch:
         # TODO: Might want to try preserving the relative ordering at some point.
         # but pandas doesn't even do this so it can wait.
         for name in new_columns:
-            self._columns.append(name)
-            self._fields[name] = typ = record.arrow_type(name)
-            if pa.types.is_null(typ):
-                self._null_fields.add(name)
+            inferred = record.type(name) is None
+            typ = record.arrow_type(name, sparse_threshold=self.sparse_threshold)
+            self._add_column(name, typ, inferred=inferred)
 
     def _update_null_from_record(self, record: Record):
         null_fields = self._null_fields.copy()
         for name in null_fields:
             if name in record:
-                typ = record.arrow_type(name)
+                typ = record.arrow_type(name, sparse_threshold=self.sparse_threshold)
                 if not pa.types.is_null(typ):
                     self._fields[name] = typ
                     self._null_fields.remove(name)
 
+    def _flush_chunk(self):
+        """
+        Convert the pending values to a chunk of PyArrow arrays.
+        """
+        if self._pending == 0:
+            return
+        # Convert all the columns before committing any, so that the batch stays
+        # consistent if a conversion fails.
+        converted = []
+        for name in self._columns:
+            values = self._values[name]
+            typ = self._fields[name]
+            if name in self._inferred and not isinstance(typ, PaExtensionType):
+                # Infer the chunk type from all the values at once, and promote the
+                # column type to fit. Earlier chunks are cast in `to_arrow()`.
+                try:
+                    array = self._infer_chunk(values, typ)
+                    typ = promote_dtype(typ, array.type)
+                except (ValueError, pa.ArrowTypeError) as exc:
+                    raise ValueError(f"Incompatible values for column {name}") from exc
+            else:
+                array = arrow_array(values, type=typ)
+                # Adaptive extension types (e.g. "json<auto>") resolve to a concrete
+                # type on the first chunk, which is then fixed for the rest of the
+                # batch.
+                typ = array.type
+            converted.append((name, typ, array))
+
+        for name, typ, array in converted:
+            self._fields[name] = typ
+            self._chunks[name].append(array)
+            self._values[name] = []
+            self._chunk_bytes += array.get_total_buffer_size()
+        self._chunk_lengths.append(self._pending)
+        self._pending = 0
+
+    def _infer_chunk(self, values: List[Any], typ: pa.DataType) -> pa.Array:
+        """
+        Convert a chunk of values for an inferred column. Values containing nested
+        extension types (e.g. a struct with an ndarray field) are inferred one by one,
+        since pyarrow can't infer them.
+        """
+        if not has_extension(typ):
+            try:
+                return _infer_array(values, typ)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                # E.g. an extension value in a field that was null so far.
+                pass
+
+        for value in values:
+            if value is not None:
+                value_type = infer_dtype(value, sparse_threshold=self.sparse_threshold)
+                typ = promote_dtype(typ, value_type)
+        return pack_nested(values, typ)
+
     def arrow_schema(self) -> pa.Schema:
         """
         Return a PyArrow schema for the batch.
@@ -265,24 +400,59 @@ class RecordBatch:
         """
         Convert the batch to a PyArrow Table.
         """
+        self._flush_chunk()
         schema = self.arrow_schema()
-        table = arrow_table(self._batch, schema)
+
+        columns = []
+        for field in schema:
+            # Chunks converted before the column type was settled (e.g. all null, or
+            # before promotion) are cast to the final type.
+            chunks = [
+                _cast_array(chunk, field.type) for chunk in self._chunks[field.name]
+            ]
+            self._chunks[field.name] = chunks
+            columns.append(pa.chunked_array(chunks, type=field.type))
+        table = pa.table(columns, schema=schema)
         return table
 
-    def to_df(self) -> pd.DataFrame:
+    def to_df(
+        self, dtype_backend: Optional[str] = None, release: bool = False
+    ) -> pd.DataFrame:
         """
         Convert the batch to a pandas DataFrame.
+
+        Args:
+            dtype_backend: backend for non-extension columns. ``None`` for default numpy
+                dtypes, or ``"pyarrow"`` for ``pd.ArrowDtype`` columns.
+            release: clear the batch and release Arrow buffers as columns are
+                converted, so that peak memory is about the size of the final
+                DataFrame.
         """
-        return self.to_arrow().to_pandas()
+        table = self.to_arrow()
+        if release:
+            self.clear()
+        return table_to_df(table, dtype_backend=dtype_backend, self_destruct=release)
 
     def clear(self):
         """
         Empty the batch.
         """
-        self._batch.clear()
+        for name in self._columns:
+            self._values[name] = []
+            self._chunks[name] = []
+        self._chunk_lengths = []
+        self._chunk_bytes = 0
+        self._pending = 0
+
+    def nbytes(self) -> int:
+        """
+        Total buffer size of the converted PyArrow chunks. Pending python values aren't
+        counted.
+        """
+        return self._chunk_bytes
 
     def __len__(self) -> int:
-        return len(self._batch)
+        return sum(self._chunk_lengths) + self._pending
 
 
 def concat(
@@ -337,49 +507,244 @@ def is_recordlike(obj: Any) -> bool:
 def arrow_record(data: RecordLike, schema: pa.Schema) -> pa.RecordBatch:
     """
     Construct a PyArrow RecordBatch for `data`.
+
+    To convert many records, `arrow_batches()` is much faster.
     """
     data = as_record(data)
-
-    row = {}
-    for field in schema:
-        name, typ = field.name, field.type
-        value = data.get(name)
-        if isinstance(typ, PaExtensionType):
-            value = typ.pack(value)
-        row[name] = value
-    batch = pa.RecordBatch.from_pylist([row], schema=schema)
+    batch = _arrow_batch([data], schema)
     return batch
 
 
+def arrow_batches(
+    data: Iterable[RecordLike], schema: pa.Schema, batch_size: int = 1024
+) -> Iterator[pa.RecordBatch]:
+    """
+    Convert a stream of records to PyArrow RecordBatches of up to `batch_size` rows.
+    Converting records in batches amortizes the fixed per-call conversion overhead.
+
+    Example::
+
+        for batch in arrow_batches(stream, schema):
+            writer.write_batch(batch)
+    """
+    data = iter(data)
+    while True:
+        recs = [as_record(rec) for rec in islice(data, batch_size)]
+        if not recs:
+            break
+        yield _arrow_batch(recs, schema)
+
+
 def arrow_table(data: Iterable[RecordLike], schema: pa.Schema):
     """
     Simplified wrapper around `pa.table()` for converting a list of records to a PyArrow
     Table, with support for extension types.
     """
     recs = [as_record(row) for row in data]
-
-    table = {}
-    for field in schema:
-        name, typ = field.name, field.type
-        arr = [rec.get(name) for rec in recs]
-        arr = arrow_array(arr, type=typ)
-        table[name] = arr
-    table = pa.table(table, schema=schema)
+    batch = _arrow_batch(recs, schema)
+    table = pa.Table.from_batches([batch])
     return table
 
 
+def _arrow_batch(recs: List[Record], schema: pa.Schema) -> pa.RecordBatch:
+    """
+    Convert a list of records to a PyArrow RecordBatch, one column at a time.
+    """
+    arrays = [
+        arrow_array([rec.get(field.name) for rec in recs], type=field.type)
+        for field in schema
+    ]
+    # Adaptive extension types may resolve to a concrete type.
+    schema = pa.schema(
+        [field.with_type(array.type) for field, array in zip(schema, arrays)],
+        metadata=schema.metadata,
+    )
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
 def arrow_array(
     data: Union[Iterable, np.ndarray, pd.Series],
     type: pa.DataType,
 ) -> pa.Array:
     """
-    Wrapper around `pa.array()` with support for extension types.
+    Wrapper around `pa.array()` with support for extension types, including extension
+    types nested in list and struct types.
     """
-    if isinstance(type, PaExtensionType):
-        data = [type.pack(v) for v in data]
+    if has_extension(type):
+        return pack_nested(data, type)
+
+    # Fast path for numeric columns, in particular of numpy scalars which pyarrow
+    # otherwise converts one by one.
+    if isinstance(data, list) and _is_numeric(type):
+        try:
+            array = np.asarray(data)
+        except (TypeError, ValueError):
+            array = None
+        if array is not None and array.ndim == 1 and array.dtype.kind in "biuf":
+            return pa.array(array, type=type)
     return pa.array(data, type=type)
 
 
+def table_to_df(
+    table: pa.Table,
+    dtype_backend: Optional[str] = None,
+    self_destruct: bool = False,
+) -> pd.DataFrame:
+    """
+    Convert a PyArrow Table to a pandas DataFrame.
+
+    Args:
+        table: input table
+        dtype_backend: backend for non-extension columns. ``None`` for default numpy
+            dtypes, or ``"pyarrow"`` for ``pd.ArrowDtype`` columns. Extension columns
+            always convert to their pandas extension dtype.
+        self_destruct: release the table's buffers as columns are converted. The
+            table must not be used afterward.
+    """
+    if dtype_backend not in (None, "pyarrow"):
+        raise ValueError(f"Invalid dtype_backend {dtype_backend}")
+
+    types_mapper = None
+    if dtype_backend == "pyarrow":
+        if not hasattr(pd, "ArrowDtype"):
+            raise ValueError('dtype_backend "pyarrow" requires pandas >= 1.5')
+        types_mapper = _arrow_dtype_mapper
+
+    # Pyarrow converts extension types nested in list and struct columns to their
+    # storage, so these columns are unpacked separately.
+    column_names = table.column_names
+    nested = {
+        field.name: unpack_nested(table[field.name])
+        for field in table.schema
+        if not isinstance(field.type, PaExtensionType) and has_extension(field.type)
+    }
+    if nested:
+        table = table.drop_columns(list(nested))
+
+    if self_destruct:
+        # Each column gets its own block so it can be freed as soon as it's converted.
+        df = table.to_pandas(
+            types_mapper=types_mapper, self_destruct=True, split_blocks=True
+        )
+    else:
+        df = table.to_pandas(types_mapper=types_mapper)
+
+    if nested:
+        df = df.assign(**nested)[column_names]
+    return df
+
+
+def _arrow_dtype_mapper(type: pa.DataType) -> Optional["pd.ArrowDtype"]:
+    if isinstance(type, PaExtensionType):
+        return None
+    return pd.ArrowDtype(type)
+
+
+def _infer_array(values: List[Any], type: pa.DataType) -> pa.Array:
+    """
+    Convert a list of values to an array with a single `pa.array()` call, inferring the
+    type from all the values. `type` is the current (provisional) column type, used
+    only to pick a fast path.
+    """
+    # Fast path for numeric columns, as in `arrow_array()`. Mixed ints and floats are
+    # promoted to float by numpy.
+    if _is_numeric(type):
+        try:
+            array = np.asarray(values)
+        except (TypeError, ValueError):
+            array = None
+        if array is not None and array.ndim == 1 and array.dtype.kind in "biuf":
+            return pa.array(array)
+    return pa.array(values)
+
+
+def _cast_array(array: pa.Array, type: pa.DataType) -> pa.Array:
+    """
+    Cast an array to a promoted `type` (see `promote_dtype()`). Unlike `pa.Array.cast`,
+    this supports adding fields to structs.
+    """
+    if array.type == type:
+        return array
+    if pa.types.is_null(array.type):
+        return _null_array(len(array), type)
+
+    if pa.types.is_struct(type) and pa.types.is_struct(array.type):
+        names = [field.name for field in array.type]
+        children = array.flatten()
+        arrays = [
+            _cast_array(children[names.index(field.name)], field.type)
+            if field.name in names
+            else _null_array(len(array), field.type)
+            for field in type
+        ]
+        mask = array.is_null() if array.null_count else None
+        return pa.StructArray.from_arrays(arrays, fields=list(type), mask=mask)
+
+    if (pa.types.is_list(type) and pa.types.is_list(array.type)) or (
+        pa.types.is_large_list(type) and pa.types.is_large_list(array.type)
+    ):
+        values = _cast_array(array.values, type.value_type)
+        mask = array.is_null() if array.null_count else None
+        return (
+            pa.LargeListArray if pa.types.is_large_list(type) else pa.ListArray
+        ).from_arrays(array.offsets, values, mask=mask)
+
+    return array.cast(type)
+
+
+def _is_numeric(type: pa.DataType) -> bool:
+    return (
+        pa.types.is_integer(type)
+        or pa.types.is_floating(type)
+        or pa.types.is_boolean(type)
+    )
+
+
+def _null_array(length: int, type: pa.DataType) -> pa.Array:
+    """
+    Construct an all null array of the given type.
+    """
+    return arrow_array([None] * length, type=type)
+
+
 def _is_dataclass_instance(obj: Any):
     """Returns True if obj is an instance of a dataclass."""
-    return hasattr(type(obj), "__dataclass_fields__")
+    return _is_dataclass_type(type(obj))
+
+
+def _is_dataclass_type(cls: type) -> bool:
+    return hasattr(cls, "__dataclass_fields__")
+
+
+# Cache of dataclass field names and types, keyed on type.
+_DATACLASS_SPECS: Dict[type, Tuple[Tuple[str, ...], Dict[str, DataType]]] = {}
+
+
+def _dataclass_spec(cls: type) -> Tuple[Tuple[str, ...], Dict[str, DataType]]:
+    """
+    Get the field names and type annotations for a dataclass type. String annotations
+    (e.g. with ``from __future__ import annotations``) are resolved if possible.
+    Results are cached per type.
+    """
+    spec = _DATACLASS_SPECS.get(cls)
+    if spec is None:
+        spec = _DATACLASS_SPECS[cls] = _compile_dataclass_spec(cls)
+    return spec
+
+
+def _compile_dataclass_spec(
+    cls: type,
+) -> Tuple[Tuple[str, ...], Dict[str, DataType]]:
+    try:
+        hints = get_type_hints(cls)
+    except Exception:
+        hints = {}
+
+    names = []
+    types: Dict[str, DataType] = {}
+    for field in fields(cls):
+        names.append(field.name)
+        typ = hints.get(field.name, field.type)
+        if typ not in {None, Any}:
+            types[field.name] = typ
+    return tuple(names), types
@@ -1 +1,2 @@
 from .parquet import *  # noqa
+from .sqlite import *  # noqa
@@ -5,7 +5,8 @@ from typing import BinaryIO, Optional, Union
 import pyarrow as pa
 from pyarrow import parquet as pq
 
-from elbow.record import RecordBatch, RecordLike
+from elbow.dtypes import promote_dtype
+from elbow.record import RecordBatch, RecordLike, _cast_array
 from elbow.typing import StrOrPath
 from elbow.utils import parse_size
 
@@ -33,6 +34,8 @@ class BufferedParquetWriter:
         buffer_size: size of the internal table buffer, consisting of one or more
             batches. Either an int number of bytes, or a string representing a buffer
             size, e.g. "64 MiB".
+        sparse_threshold: optional density threshold for storing inferred array
+            columns as ``sparse_ndarray``. See `RecordBatch`.
         **kwargs: pass-through kwargs to `pyarrow.parquet.ParquetWriter()`.
     """
 
@@ -43,6 +46,7 @@ class BufferedParquetWriter:
         buffer_size: Union[str, int] = "64 MiB",
         batch_size: int = 256,
         blocking: bool = False,
+        sparse_threshold: Optional[float] = None,
         **kwargs,
     ):
         self.where = where
@@ -50,6 +54,7 @@ class BufferedParquetWriter:
         self.buffer_size = buffer_size
         self.batch_size = batch_size
         self.blocking = blocking
+        self.sparse_threshold = sparse_threshold
 
         if isinstance(buffer_size, str):
             self._buffer_size_bytes = parse_size(buffer_size)
@@ -58,13 +63,18 @@ class BufferedParquetWriter:
 
         self._writer: Optional[pq.ParquetWriter] = None
         self._writer_kwargs = kwargs
-        self._batch = RecordBatch(schema=schema, strict=(schema is not None))
-        self._table: Optional[pa.Table] = None
+        # Records are buffered in a single batch, so that column types are promoted
+        # across the whole buffer (e.g. int -> double).
+        self._batch = RecordBatch(
+            schema=schema,
+            strict=(schema is not None),
+            chunk_size=batch_size,
+            sparse_threshold=sparse_threshold,
+        )
         self._schema: Optional[pa.Schema] = schema
         self._pool = ThreadPoolExecutor(max_workers=1)
         self._future: Optional[Future] = None
         self._total_bytes = 0
-        self._buffer_bytes = 0
 
     def write(self, record: RecordLike):
         """
@@ -72,65 +82,51 @@ class BufferedParquetWriter:
         """
         self._batch.append(record)
 
-        # Extend buffer table with current batch
-        if len(self._batch) >= self.batch_size:
-            self._push_batch()
-
-        if self._buffer_bytes > self._buffer_size_bytes:
+        if self._batch.nbytes() > self._buffer_size_bytes:
             self._flush(blocking=self.blocking)
 
-    def _push_batch(self):
-        """
-        Push a batch onto the buffer table.
-        """
-        if len(self._batch) > 0:
-            batch_table = self._batch.to_arrow()
-
-            # Fix schema from initial batch.
-            if self._schema is None:
-                self._schema = batch_table.schema
-
-            if self._table is None:
-                self._table = batch_table
-            else:
-                self._table = pa.concat_tables([self._table, batch_table])
-
-            self._buffer_bytes += batch_table.get_total_buffer_size()
-
-            # For all subsequent batches, use a strict schema
-            self._batch = RecordBatch(schema=self._schema, strict=True)
-
     def _flush(self, blocking: bool = True):
         """
-        Flush the table buffer.
+        Flush the buffered records.
         """
-        self._push_batch()
-
         if self._future is not None and self._future.running():
             logger.info("Waiting for previous batch to finish writing")
             self._future.result()
 
-        if self._table is not None:
-            if self._writer is None:
-                # TODO: Might consider writing to a temp file initially, in particular
-                # to avoid race conditions when generating parquets incrementally with
-                # multiple workers.
-                self._writer = pq.ParquetWriter(
-                    where=self.where,
-                    schema=self._schema,
-                    **self._writer_kwargs,
-                )
+        if len(self._batch) == 0:
+            return
 
-            row_group_size = 2 * self._buffer_size_bytes
-            if blocking:
-                self._writer.write_table(self._table, row_group_size)
-            else:
-                self._future = self._pool.submit(
-                    self._writer.write_table, self._table, row_group_size
-                )
-            self._total_bytes += self._table.get_total_buffer_size()
-            self._table = None
-            self._buffer_bytes = 0
+        table = self._batch.to_arrow()
+        # Column types are kept for the next buffer.
+        self._batch.clear()
+
+        if self._writer is None:
+            # Fix schema from initial buffer. Adaptive extension types in a given
+            # schema (e.g. "json<auto>") resolve to concrete types here.
+            if self._schema is not None and self._schema.metadata:
+                table = table.replace_schema_metadata(self._schema.metadata)
+            self._schema = table.schema
+        else:
+            table = _conform_table(table, self._schema)
+
+        if self._writer is None:
+            # TODO: Might consider writing to a temp file initially, in particular
+            # to avoid race conditions when generating parquets incrementally with
+            # multiple workers.
+            self._writer = pq.ParquetWriter(
+                where=self.where,
+                schema=self._schema,
+                **self._writer_kwargs,
+            )
+
+        row_group_size = 2 * self._buffer_size_bytes
+        if blocking:
+            self._writer.write_table(table, row_group_size)
+        else:
+            self._future = self._pool.submit(
+                self._writer.write_table, table, row_group_size
+            )
+        self._total_bytes += table.get_total_buffer_size()
 
     def close(self):
         """
@@ -144,7 +140,7 @@ class BufferedParquetWriter:
         """
         Total bytes written plus current buffer size.
         """
-        return self._total_bytes + self._buffer_bytes
+        return self._total_bytes + self._batch.nbytes()
 
     def __enter__(self) -> "BufferedParquetWriter":
         return self
@@ -153,3 +149,38 @@ class BufferedParquetWriter:
         self.close()
 
     __call__ = write
+
+
+def _conform_table(table: pa.Table, schema: pa.Schema) -> pa.Table:
+    """
+    Cast a buffered table to the schema already written to the file. Column types can
+    be narrower than the written types (e.g. int values in a double column), but not
+    wider.
+    """
+    new_columns = [name for name in table.column_names if name not in schema.names]
+    if new_columns:
+        raise ValueError(f"Records contain new columns {new_columns} not in schema")
+
+    columns = []
+    for field in schema:
+        if field.name not in table.column_names:
+            columns.append(pa.nulls(table.num_rows, field.type))
+            continue
+        column = table[field.name]
+        if column.type != field.type:
+            try:
+                promoted = promote_dtype(field.type, column.type)
+            except ValueError:
+                promoted = None
+            if promoted != field.type:
+                raise ValueError(
+                    f"Column {field.name} type {column.type} doesn't fit the written "
+                    f"type {field.type}; increase the buffer size so the type is "
+                    "settled before the first write"
+                )
+            column = pa.chunked_array(
+                [_cast_array(chunk, field.type) for chunk in column.chunks],
+                type=field.type,
+            )
+        columns.append(column)
+    return pa.table(columns, schema=schema)
@@ -0,0 +1,258 @@
+import io
+import json
+import logging
+import pickle
+import sqlite3
+from typing import Any, List, Optional, Sequence
+
+import numpy as np
+import pyarrow as pa
+
+from elbow.dtypes import PaJSONType, PaNDArrayType, PaPickleType, PaSparseNDArrayType
+from elbow.record import RecordBatch, RecordLike
+from elbow.typing import StrOrPath
+
+__all__ = ["SQLiteSink"]
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteSink:
+    """
+    Write a stream of records to a SQLite database table with bulk inserts.
+
+    Example::
+
+        with SQLiteSink("table.db", index=["file_path"]) as sink:
+            for record in stream:
+                sink.write(record)
+
+    The table is created from the Arrow schema of the first batch of records. Columns
+    appearing in later batches are added to the table on the fly. Extension types are
+    stored as follows:
+
+        - ``json`` -> ``TEXT`` (the JSON string)
+        - ``pickle`` -> ``BLOB`` (the object pickled with the default protocol,
+          regardless of the type's serializer and compression)
+        - ``ndarray`` -> ``BLOB`` (the array in NumPy ``.npy`` format)
+        - ``sparse_ndarray`` -> ``BLOB`` (the dense array in ``.npy`` format)
+
+    Other nested types (lists, structs) are stored as JSON ``TEXT``.
+
+    Args:
+        where: path to the SQLite database file.
+        table: name of the output table. Must not exist already.
+        schema: optional pyarrow schema. If absent, the schema will be inferred from the
+            first batch of records.
+        index: optional list of columns to index. Indices are created on close, after
+            all records have been inserted.
+        batch_size: number of records to insert per transaction.
+        timeout: seconds to wait on a locked database.
+    """
+
+    def __init__(
+        self,
+        where: StrOrPath,
+        table: str = "elbow",
+        schema: Optional[pa.Schema] = None,
+        index: Optional[Sequence[str]] = None,
+        batch_size: int = 10000,
+        timeout: float = 60.0,
+    ):
+        self.where = where
+        self.table = table
+        self.schema = schema
+        self.index = list(index) if index is not None else []
+        self.batch_size = batch_size
+
+        self._conn = sqlite3.connect(str(where), timeout=timeout)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        if _table_exists(self._conn, table):
+            self._conn.close()
+            raise FileExistsError(f"Table {table} already exists in {where}")
+
+        self._batch = RecordBatch(schema=schema, strict=(schema is not None))
+        self._columns: List[str] = []
+        self._total_rows = 0
+
+    def write(self, record: RecordLike):
+        """
+        Write a record.
+        """
+        self._batch.append(record)
+        if len(self._batch) >= self.batch_size:
+            self._flush()
+
+    def write_table(self, table: pa.Table):
+        """
+        Write a pyarrow Table (e.g. a batch of records converted upstream).
+        """
+        if table.num_rows == 0:
+            return
+        self._add_columns(table.schema)
+
+        columns = [_sqlite_column(col) for col in table.columns]
+        rows = list(zip(*columns))
+        names = ", ".join(_quote(name) for name in table.column_names)
+        params = ", ".join("?" for _ in table.column_names)
+        query = f"INSERT INTO {_quote(self.table)} ({names}) VALUES ({params})"
+
+        # One transaction per table, committed on exit.
+        with self._conn:
+            self._conn.executemany(query, rows)
+        self._total_rows += table.num_rows
+
+    def _flush(self):
+        """
+        Insert the current batch.
+        """
+        if len(self._batch) > 0:
+            self.write_table(self._batch.to_arrow())
+            self._batch.clear()
+
+    def _add_columns(self, schema: pa.Schema):
+        """
+        Create the table, or add any new columns to it.
+        """
+        new_fields = [field for field in schema if field.name not in self._columns]
+        if not new_fields:
+            return
+
+        with self._conn:
+            if not self._columns:
+                defs = ", ".join(
+                    f"{_quote(field.name)} {_sqlite_type(field.type)}"
+                    for field in new_fields
+                )
+                self._conn.execute(f"CREATE TABLE {_quote(self.table)} ({defs})")
+            else:
+                for field in new_fields:
+                    self._conn.execute(
+                        f"ALTER TABLE {_quote(self.table)} ADD COLUMN "
+                        f"{_quote(field.name)} {_sqlite_type(field.type)}"
+                    )
+        self._columns.extend(field.name for field in new_fields)
+
+    def _create_index(self):
+        """
+        Create deferred indices on the table.
+        """
+        with self._conn:
+            for name in self.index:
+                if name not in self._columns:
+                    logger.warning("Can't index missing column %s", name)
+                    continue
+                self._conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS {_quote(f'{self.table}_{name}_idx')} "
+                    f"ON {_quote(self.table)} ({_quote(name)})"
+                )
+
+    def close(self):
+        """
+        Flush the buffer, create indices, and close the connection.
+        """
+        self._flush()
+        self._create_index()
+        self._conn.close()
+
+    def total_rows(self) -> int:
+        """
+        Total rows inserted plus current buffer size.
+        """
+        return self._total_rows + len(self._batch)
+
+    def __enter__(self) -> "SQLiteSink":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    __call__ = write
+
+
+def _table_exists(conn: sqlite3.Connection, table: str) -> bool:
+    cursor = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table,)
+    )
+    return cursor.fetchone() is not None
+
+
+def _quote(name: str) -> str:
+    """
+    Quote an SQL identifier.
+    """
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _sqlite_type(typ: pa.DataType) -> str:
+    """
+    Map a pyarrow data type to a SQLite column type.
+    """
+    if isinstance(typ, PaJSONType):
+        return "TEXT"
+    if isinstance(typ, (PaPickleType, PaNDArrayType, PaSparseNDArrayType)):
+        return "BLOB"
+    if pa.types.is_boolean(typ) or pa.types.is_integer(typ):
+        return "INTEGER"
+    if pa.types.is_floating(typ):
+        return "REAL"
+    if pa.types.is_binary(typ) or pa.types.is_large_binary(typ):
+        return "BLOB"
+    if pa.types.is_null(typ):
+        return ""
+    return "TEXT"
+
+
+def _sqlite_column(array: pa.ChunkedArray) -> List[Any]:
+    """
+    Convert a pyarrow column to a list of values that can be bound by sqlite3.
+    """
+    typ = array.type
+    if isinstance(typ, PaJSONType) and typ.fields is not None:
+        # Shredded JSON is re-encoded as a single string.
+        return [_to_json(value) for value in array.to_pylist()]
+    if isinstance(typ, PaPickleType) and typ != PaPickleType():
+        # Compressed, out-of-band, or other serializer values can't be decoded
+        # without the type options. So they're re-pickled as plain pickle bytes.
+        return [
+            None if value is None else pickle.dumps(value)
+            for chunk in array.chunks
+            for value in chunk.to_numpy()
+        ]
+    if isinstance(typ, (PaJSONType, PaPickleType)):
+        # Extension storage is already a string or bytes.
+        return pa.chunked_array(
+            [chunk.storage for chunk in array.chunks], type=typ.storage_type
+        ).to_pylist()
+    if isinstance(typ, (PaNDArrayType, PaSparseNDArrayType)):
+        return [_npy_bytes(value) for value in array.to_pylist()]
+
+    values = array.to_pylist()
+    if pa.types.is_temporal(typ) or pa.types.is_decimal(typ) or pa.types.is_nested(typ):
+        values = [_to_text(value) for value in values]
+    return values
+
+
+def _npy_bytes(value: Optional[np.ndarray]) -> Optional[bytes]:
+    if value is None:
+        return None
+    buf = io.BytesIO()
+    np.save(buf, value, allow_pickle=False)
+    return buf.getvalue()
+
+
+def _to_json(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    return json.dumps(value)
+
+
+def _to_text(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, default=str)
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
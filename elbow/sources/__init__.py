@@ -0,0 +1,2 @@
+from .archive import *  # noqa
+from .filesystem import *  # noqa
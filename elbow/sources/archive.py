@@ -0,0 +1,217 @@
+"""
+Stream the members of tar and zip archives without unpacking them to disk.
+"""
+
+import io
+import os
+import tarfile
+import time
+import zipfile
+from dataclasses import dataclass, replace
+from glob import iglob
+from pathlib import Path
+from typing import IO, Callable, Iterable, Iterator, List, Optional, Union
+
+from elbow.typing import Filter, StrOrPath
+from elbow.utils import GlobMatcher
+
+__all__ = ["ArchiveMember", "ArchiveSource"]
+
+
+class ArchiveMember(io.BufferedIOBase):
+    """
+    A read-only file object for a single archive member, generated by `ArchiveSource`.
+
+    Extractors receive the member in place of a filesystem path and can read from it
+    directly, e.g. ``json.load(member)`` or ``np.load(member)``.
+
+    Attributes:
+        name: virtual path of the member, ``os.path.join(archive, member)``. Also
+            returned by ``str(member)``.
+        archive: absolute path of the archive containing the member
+        member: name of the member within the archive
+        size: uncompressed size in bytes
+        mtime: modified time recorded in the archive
+
+    The file handle is only valid until the next member is generated, since each
+    archive is read sequentially in a single pass. Members of tar archives aren't
+    seekable.
+    """
+
+    def __init__(
+        self,
+        archive: str,
+        member: str,
+        size: int,
+        mtime: float,
+        fileobj: IO[bytes],
+        stream: bool = False,
+    ):
+        super().__init__()
+        self.archive = archive
+        self.member = member
+        self.name = os.path.join(archive, member)
+        self.size = size
+        self.mtime = mtime
+        self._fileobj = fileobj
+        self._stream = stream
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        self._check_closed()
+        return self._fileobj.read(-1 if size is None else size)
+
+    def read1(self, size: int = -1) -> bytes:
+        return self.read(size)
+
+    def seekable(self) -> bool:
+        return not (self.closed or self._stream) and self._fileobj.seekable()
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        self._check_closed()
+        return self._fileobj.seek(offset, whence)
+
+    def tell(self) -> int:
+        self._check_closed()
+        return self._fileobj.tell()
+
+    def close(self) -> None:
+        if not self.closed:
+            self._fileobj.close()
+        super().close()
+
+    def _check_closed(self) -> None:
+        if self.closed:
+            raise ValueError(f"I/O operation on closed archive member {self.name}")
+
+    def __str__(self) -> str:
+        return self.name
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.name!r})"
+
+
+@dataclass
+class ArchiveSource:
+    """
+    Generate a stream of file members from a set of tar or zip archives. Each archive is
+    opened once and read sequentially, and members are generated as `ArchiveMember`
+    file objects.
+
+    Pass an archive source to the builders in place of a file pattern, with an
+    extractor that reads from file objects. In parallel builds, archives (not members)
+    are partitioned between workers, so that each archive is read by exactly one
+    worker.
+
+    Example::
+
+        def extract(member):
+            data = json.load(member)
+            return {"file_path": member.name, "mod_time": member.mtime, **data}
+
+        source = ArchiveSource("bundles/*.tar.gz", include="*.json")
+        build_parquet(source, extract, "bundles.pqds", workers=8)
+
+    Args:
+        archives: shell-style pattern as in `glob.glob()`, or iterable of archive
+            paths. Tar archives may be compressed (gzip, bz2, xz). The format is
+            detected by file extension, or else by content.
+        include: include members whose base name matches any of these patterns
+        exclude: exclude members whose base name matches any of these patterns
+    """
+
+    archives: Union[str, Iterable[StrOrPath]]
+    include: Optional[Union[str, List[str]]] = None
+    exclude: Optional[Union[str, List[str]]] = None
+
+    def filter_archives(self, func: Filter) -> "ArchiveSource":
+        """
+        Return a new source reading only the archives selected by `func`, e.g. a
+        `hash_partitioner()`.
+        """
+        return replace(self, archives=filter(func, self._archive_paths()))
+
+    def members(self) -> Iterator[ArchiveMember]:
+        """
+        Read the archives and generate their members.
+        """
+        include = GlobMatcher(_tolist(self.include))
+        exclude = GlobMatcher(_tolist(self.exclude))
+
+        def select(member: str) -> bool:
+            name = os.path.basename(member)
+            if include and not include.match(name):
+                return False
+            return not (exclude and exclude.match(name))
+
+        for archive in self._archive_paths():
+            path = str(Path(archive).absolute())
+            if _is_zip(path):
+                members = _zip_members(path, select)
+            else:
+                members = _tar_members(path, select)
+
+            for member in members:
+                # Close the member handle before moving on to the next one.
+                with member:
+                    yield member
+
+    def _archive_paths(self) -> Iterable[StrOrPath]:
+        if isinstance(self.archives, str):
+            return iglob(self.archives, recursive=True)
+        return self.archives
+
+    def __iter__(self):
+        return self.members()
+
+
+_TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+
+
+def _is_zip(path: str) -> bool:
+    """
+    Check if an archive is a zip file, by extension or else by content. Tar is checked
+    first, since an uncompressed tar ending with a zip member also looks like a zip.
+    """
+    name = path.lower()
+    if name.endswith(_TAR_SUFFIXES):
+        return False
+    if name.endswith(".zip"):
+        return True
+    return not tarfile.is_tarfile(path) and zipfile.is_zipfile(path)
+
+
+def _tar_members(path: str, select: Callable[[str], bool]) -> Iterator[ArchiveMember]:
+    # Stream mode reads the archive strictly front to back, without seeking.
+    with tarfile.open(path, mode="r|*") as tar:
+        for info in tar:
+            if not (info.isfile() and select(info.name)):
+                continue
+            fileobj = tar.extractfile(info)
+            assert fileobj is not None
+            yield ArchiveMember(
+                path, info.name, info.size, float(info.mtime), fileobj, stream=True
+            )
+
+
+def _zip_members(path: str, select: Callable[[str], bool]) -> Iterator[ArchiveMember]:
+    with zipfile.ZipFile(path) as zf:
+        # Read members in the order they're stored in the file.
+        infos = sorted(zf.infolist(), key=lambda info: info.header_offset)
+        for info in infos:
+            if info.is_dir() or not select(info.filename):
+                continue
+            mtime = time.mktime(info.date_time + (0, 0, -1))
+            yield ArchiveMember(
+                path, info.filename, info.file_size, mtime, zf.open(info)
+            )
+
+
+def _tolist(val: Optional[Union[str, List[str]]]) -> List[str]:
+    if val is None:
+        return []
+    if isinstance(val, str):
+        return [val]
+    return val
@@ -1,12 +1,118 @@
-import fnmatch
+import errno
+import json
+import logging
 import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from dataclasses import dataclass
+from itertools import islice
 from pathlib import Path
-from typing import Generator, List, Optional, Union
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Generator,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
 
 from elbow.typing import StrOrPath
+from elbow.utils import GlobMatcher, atomicopen
 
-__all__ = ["Crawler"]
+__all__ = ["Crawler", "StatPath"]
+
+SNAPSHOT_VERSION = 1
+
+# Coarsest directory modified time resolution to expect, e.g. on NFS or FAT.
+_MTIME_GRANULARITY_NS = 2 * 10**9
+
+# Maximum number of directory scans in flight per crawl thread.
+_SCANS_PER_THREAD = 4
+
+logger = logging.getLogger(__name__)
+
+if TYPE_CHECKING:
+    _PathBase = Path
+else:
+    # Path can't be sub-classed directly before python 3.12.
+    _PathBase = type(Path())
+
+
+class StatPath(_PathBase):
+    """
+    A `Path` carrying the cached stat result of the directory entry it was created from
+    (see `Crawler(with_stat=True)`). `stat()`, `exists()` and `is_symlink()` use the
+    cached results rather than touching the filesystem again.
+
+    The cached results are a snapshot from when the directory was scanned. Paths
+    derived from a `StatPath` (e.g. ``path.parent``) don't carry a stat, except for
+    ``path.absolute()``.
+    """
+
+    _cached = False
+    _stat: Optional[os.stat_result] = None
+    _symlink = False
+
+    @classmethod
+    def from_entry(cls, entry: "os.DirEntry[str]") -> "StatPath":
+        """
+        Create a path from an `os.scandir()` entry, caching its stat result.
+        """
+        path = cls(entry.path)
+        try:
+            stat: Optional[os.stat_result] = entry.stat()
+        except OSError:
+            # E.g. a broken symbolic link
+            stat = None
+        try:
+            symlink = entry.is_symlink()
+        except OSError:
+            symlink = False
+        path._set_cache(stat, symlink)
+        return path
+
+    def _set_cache(self, stat: Optional[os.stat_result], symlink: bool) -> None:
+        self._cached = True
+        self._stat = stat
+        self._symlink = symlink
+
+    def stat(self, *, follow_symlinks: bool = True) -> os.stat_result:
+        if self._cached and (follow_symlinks or not self._symlink):
+            if self._stat is None:
+                raise FileNotFoundError(
+                    errno.ENOENT, os.strerror(errno.ENOENT), str(self)
+                )
+            return self._stat
+        # NOTE: `Path.stat()` only takes `follow_symlinks` from python 3.10, and
+        # `Path.lstat()` calls back into `stat()` from then on.
+        if follow_symlinks:
+            return super().stat()
+        return os.lstat(self)
+
+    def exists(self, *, follow_symlinks: bool = True) -> bool:
+        if self._cached and (follow_symlinks or not self._symlink):
+            return self._stat is not None
+        if follow_symlinks:
+            return super().exists()
+        return super().is_symlink() or super().exists()
+
+    def is_symlink(self) -> bool:
+        if self._cached:
+            return self._symlink
+        return super().is_symlink()
+
+    def absolute(self) -> "StatPath":
+        path = super().absolute()
+        if path is not self and self._cached:
+            path._set_cache(self._stat, self._symlink)
+        return path
 
 
 @dataclass
@@ -22,6 +128,24 @@ class Crawler:
         files_only: only return file paths
         dirs_only: only return directory paths
         follow_links: whether to follow symbolic links
+        threads: number of threads for scanning directories concurrently, which can
+            speed up crawling network filesystems (e.g. NFS, Lustre) a lot. If `None`
+            or 1, crawl serially with `os.walk()`.
+        ordered: generate paths in a deterministic order, sorted by name within each
+            directory, and depth first. Otherwise, in parallel mode paths are
+            generated as soon as they're found.
+        with_stat: generate `StatPath` objects carrying the stat result from the
+            directory scan. Downstream filters and extractors (e.g.
+            `FileModifiedIndex`, `extract_file_meta()`) then don't need to stat each
+            file again.
+        cache: optional path to a local crawl snapshot file, containing the listing
+            and modified time of each directory. On the next crawl, only directories
+            whose modified time changed are listed again, so that an incremental
+            crawl costs time proportional to the change. The snapshot is updated when
+            a crawl completes. Directories modified within two seconds of being
+            scanned aren't cached, since they could change again without a new
+            modified time. Paths from cached listings don't carry a stat (see
+            `with_stat`).
     """
 
     root: StrOrPath
@@ -31,87 +155,328 @@ class Crawler:
     files_only: bool = False
     dirs_only: bool = False
     follow_links: bool = False
+    threads: Optional[int] = None
+    ordered: bool = False
+    with_stat: bool = False
+    cache: Optional[StrOrPath] = None
 
     def __post_init__(self):
         if self.files_only and self.dirs_only:
             raise ValueError("Can't specify both files_only and dirs_only")
+        if self.threads is not None and self.threads < 1:
+            raise ValueError(f"Invalid threads {self.threads}; expected >= 1")
 
     def crawl(self) -> Generator[Path, None, None]:
         """
         Crawl the directory.
         """
-        include = _tolist(self.include)
-        exclude = _tolist(self.exclude)
-        skip = _tolist(self.skip)
+        if (
+            (self.threads is not None and self.threads > 1)
+            or self.with_stat
+            or self.cache is not None
+        ):
+            yield from self._crawl_scandir()
+            return
 
+        patterns = self._patterns()
         for subdir, dirnames, fnames in os.walk(
             self.root, followlinks=self.follow_links
         ):
-            names = []
-            if not self.files_only:
-                names.extend(dirnames)
-            if not self.dirs_only:
-                names.extend(fnames)
+            if self.ordered:
+                dirnames.sort()
+                fnames.sort()
+
+            yield from self._listing(subdir, dirnames, fnames, patterns)
+
+            if patterns.skip:
+                _remove_skip(dirnames, patterns.skip)
+
+    def _patterns(self) -> "_Patterns":
+        """
+        Compile the include, exclude, and skip patterns.
+        """
+        return _Patterns(
+            include=GlobMatcher(_tolist(self.include)),
+            exclude=GlobMatcher(_tolist(self.exclude)),
+            skip=GlobMatcher(_tolist(self.skip)),
+        )
+
+    def _listing(
+        self,
+        subdir: StrOrPath,
+        dirnames: List[str],
+        fnames: List[str],
+        patterns: "_Patterns",
+        entries: Optional[Dict[str, "os.DirEntry[str]"]] = None,
+    ) -> List[Path]:
+        """
+        Select the paths to generate from a single directory listing. If the directory
+        `entries` are given, generate `StatPath` objects.
+        """
+        names = []
+        if not self.files_only:
+            names.extend(dirnames)
+        if not self.dirs_only:
+            names.extend(fnames)
+
+        if patterns.include:
+            names = patterns.include.filter(names)
+        if patterns.exclude:
+            names = patterns.exclude.filter(names, exclude=True)
+
+        if self.with_stat:
+            if entries is not None:
+                return [StatPath.from_entry(entries[name]) for name in names]
+            return [StatPath(subdir, name) for name in names]
+        subpath = Path(subdir)
+        return [subpath / name for name in names]
+
+    def _crawl_scandir(self) -> Iterator[Path]:
+        """
+        Crawl the directory, scanning directories concurrently in a thread pool.
+
+        Each scan task lists one directory, applies the filters, and returns the
+        sub-directories to scan next. The pool scans ahead while the results are
+        consumed, but only a bounded number of scans are in flight at once, so a slow
+        consumer doesn't cause the whole tree to be buffered in memory.
+        """
+        patterns = self._patterns()
+        threads = self.threads or 1
+        pool = ThreadPoolExecutor(max_workers=threads)
+        max_scans = _SCANS_PER_THREAD * threads
+
+        root_dir = os.fspath(self.root)
+        snapshot: Dict[str, Dict[str, Any]] = {}
+        new_snapshot: Dict[str, Dict[str, Any]] = {}
+        if self.cache is not None:
+            snapshot = _load_snapshot(self.cache, root_dir, self.follow_links)
 
-            names = _filter_include(names, include)
-            names = _filter_exclude(names, exclude)
+        def scan(subdir: str) -> Tuple[List[Path], List[str]]:
+            mtime_ns = listing = None
+            if self.cache is not None:
+                # The modified time is read before listing, so that changes during
+                # the listing are picked up on the next crawl.
+                scan_ns = time.time_ns()
+                mtime_ns = _mtime_ns(subdir)
+                listing = _cached_listing(subdir, mtime_ns, snapshot)
 
-            subpath = Path(subdir)
-            for name in names:
-                yield subpath / name
+            entries = None
+            if listing is not None:
+                dirnames, fnames, walk_dirs = listing
+            else:
+                dirnames, fnames, walk_dirs, entries = _scandir(
+                    subdir, self.follow_links
+                )
+            # Directories modified within the mtime granularity of the scan could
+            # change again without a new mtime, so they aren't cached (as in git's
+            # "racy" index entries).
+            if mtime_ns is not None and scan_ns - mtime_ns >= _MTIME_GRANULARITY_NS:
+                new_snapshot[subdir] = {
+                    "mtime_ns": mtime_ns,
+                    "dirs": list(dirnames),
+                    "files": list(fnames),
+                    "walk": list(walk_dirs),
+                }
+            if self.ordered:
+                dirnames.sort()
+                fnames.sort()
+                walk_dirs.sort()
+            paths = self._listing(subdir, dirnames, fnames, patterns, entries=entries)
+            if patterns.skip:
+                _remove_skip(walk_dirs, patterns.skip)
+            children = [os.path.join(subdir, name) for name in walk_dirs]
+            return paths, children
 
-            if skip:
-                _remove_skip(subdir, dirnames, skip)
+        futures: Dict[str, Future] = {}
+        try:
+            if self.ordered:
+                yield from _iter_ordered(pool, scan, root_dir, futures, max_scans)
+            else:
+                yield from _iter_unordered(pool, scan, root_dir, futures, max_scans)
+        finally:
+            # Cancel any queued scans if the crawl is stopped early.
+            for future in futures.values():
+                future.cancel()
+            pool.shutdown(wait=True)
+
+        # Only complete crawls are saved.
+        if self.cache is not None:
+            _save_snapshot(self.cache, root_dir, self.follow_links, new_snapshot)
 
     def __iter__(self):
         return self.crawl()
 
 
-def _tolist(val: Optional[Union[str, List[str]]]) -> List[str]:
-    if val is None:
-        return []
-    if isinstance(val, str):
-        return [val]
-    return val
+class _Patterns(NamedTuple):
+    include: GlobMatcher
+    exclude: GlobMatcher
+    skip: GlobMatcher
+
+
+_ScanFunc = Callable[[str], Tuple[List[Path], List[str]]]
 
 
-def _remove_skip(root: StrOrPath, names: List[str], skip: List[str]) -> None:
+def _iter_ordered(
+    pool: ThreadPoolExecutor,
+    scan: _ScanFunc,
+    root: str,
+    futures: Dict[str, Future],
+    max_scans: int,
+) -> Iterator[Path]:
     """
-    Remove names matching patterns in skip in place.
+    Generate the results of scanning a directory tree, depth first. The next
+    `max_scans` directories in crawl order are scanned ahead.
+    """
+    order: Deque[str] = deque([root])
+    while order:
+        for subdir in islice(order, max_scans):
+            if subdir not in futures:
+                futures[subdir] = pool.submit(scan, subdir)
+        subdir = order.popleft()
+        paths, children = futures.pop(subdir).result()
+        order.extendleft(reversed(children))
+        yield from paths
+
+
+def _iter_unordered(
+    pool: ThreadPoolExecutor,
+    scan: _ScanFunc,
+    root: str,
+    futures: Dict[str, Future],
+    max_scans: int,
+) -> Iterator[Path]:
+    """
+    Generate the results of scanning a directory tree, as they complete. At most
+    `max_scans` directories are scanned at once.
+    """
+    # A stack, so that the crawl is roughly depth first and the frontier stays small.
+    todo: List[str] = [root]
+    while todo or futures:
+        while todo and len(futures) < max_scans:
+            subdir = todo.pop()
+            futures[subdir] = pool.submit(scan, subdir)
+        done, _ = wait(futures.values(), return_when=FIRST_COMPLETED)
+        for subdir in [subdir for subdir, task in futures.items() if task in done]:
+            paths, children = futures.pop(subdir).result()
+            todo.extend(reversed(children))
+            yield from paths
+
+
+def _mtime_ns(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _cached_listing(
+    path: str, mtime_ns: Optional[int], snapshot: Dict[str, Dict[str, Any]]
+) -> Optional[Tuple[List[str], List[str], List[str]]]:
+    """
+    Look up the listing of a directory in the crawl snapshot, checking that the
+    directory modified time hasn't changed. Returns `None` if the directory has to be
+    listed again.
     """
-    root = Path(root)
-    num_names = len(names)
-    for ii in range(num_names - 1, -1, -1):
-        name = names[ii]
-        for pat in skip:
-            if fnmatch.fnmatch(name, pat):
-                names.pop(ii)
-                break
+    cached = snapshot.get(path)
+    if mtime_ns is None or cached is None or cached["mtime_ns"] != mtime_ns:
+        return None
+    # Copies, since the lists are modified in place when crawling.
+    return list(cached["dirs"]), list(cached["files"]), list(cached["walk"])
 
 
-def _filter_include(names: List[str], include: List[str]):
+def _load_snapshot(
+    path: StrOrPath, root: str, follow_links: bool
+) -> Dict[str, Dict[str, Any]]:
     """
-    Keep names that match any pattern.
+    Load the directory listings from a crawl snapshot file. Returns an empty snapshot
+    if the file doesn't exist or doesn't match the crawl.
     """
-    if not include:
-        return names
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError):
+        logger.warning("Ignoring invalid crawl snapshot %s", path, exc_info=True)
+        return {}
+    if not isinstance(state, dict) or not isinstance(state.get("dirs"), dict):
+        logger.warning("Ignoring invalid crawl snapshot %s", path)
+        return {}
+    if (
+        state.get("version") != SNAPSHOT_VERSION
+        or state.get("root") != root
+        or state.get("follow_links") != follow_links
+    ):
+        logger.warning("Ignoring crawl snapshot %s for a different crawl", path)
+        return {}
+    return state["dirs"]
 
-    filtered = []
-    for pat in include:
-        filtered.extend(fnmatch.filter(names, pat))
-    return filtered
 
+def _save_snapshot(
+    path: StrOrPath,
+    root: str,
+    follow_links: bool,
+    dirs: Dict[str, Dict[str, Any]],
+) -> None:
+    """
+    Atomically save the directory listings to a crawl snapshot file.
+    """
+    state = {
+        "version": SNAPSHOT_VERSION,
+        "root": root,
+        "follow_links": follow_links,
+        "dirs": dirs,
+    }
+    with atomicopen(path, "w") as f:
+        json.dump(state, f)
 
-def _filter_exclude(names: List[str], exclude: List[str]):
+
+def _scandir(
+    path: str, follow_links: bool
+) -> Tuple[List[str], List[str], List[str], Dict[str, "os.DirEntry[str]"]]:
     """
-    Drop names that match any pattern.
+    List a directory with `os.scandir()`, returning the directory names, file names,
+    the names of directories to descend into, and the entries by name. Like
+    `os.walk()`, errors are ignored, and symbolic links to directories are listed as
+    directories but only descended into if `follow_links` is set.
     """
-    if not exclude:
-        return names
+    dirnames: List[str] = []
+    fnames: List[str] = []
+    walk_dirs: List[str] = []
+    entries: Dict[str, "os.DirEntry[str]"] = {}
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                entries[entry.name] = entry
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if not is_dir:
+                    fnames.append(entry.name)
+                    continue
+                dirnames.append(entry.name)
+                try:
+                    walk = follow_links or not entry.is_symlink()
+                except OSError:
+                    walk = False
+                if walk:
+                    walk_dirs.append(entry.name)
+    except OSError:
+        pass
+    return dirnames, fnames, walk_dirs, entries
 
-    matches = set()
-    for pat in exclude:
-        matches.update(fnmatch.filter(names, pat))
 
-    filtered = [name for name in names if name not in matches]
-    return filtered
+def _tolist(val: Optional[Union[str, List[str]]]) -> List[str]:
+    if val is None:
+        return []
+    if isinstance(val, str):
+        return [val]
+    return val
+
+
+def _remove_skip(names: List[str], skip: GlobMatcher) -> None:
+    """
+    Remove names matching patterns in skip in place.
+    """
+    names[:] = skip.filter(names, exclude=True)
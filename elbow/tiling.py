@@ -0,0 +1,200 @@
+"""
+Tiled storage for large ndarrays, with partial reads.
+
+Large arrays (e.g. whole-slide images, long time series) are split into fixed-size
+tiles, stored one tile per row in a (companion) table. Each row carries the tile grid
+metadata, so that a reader can fetch and assemble only the tiles intersecting a
+requested slice.
+
+Example::
+
+    def extract(path):
+        image = load_image(path)
+        yield from tile_records(image, (256, 256), file_path=str(path))
+
+    build_parquet("images/*.tif", extract, "tiles.pqds")
+
+    crop = read_tiles(
+        "tiles.pqds",
+        (slice(1024, 1280), slice(2048, 2304)),
+        filter=pc.field("file_path") == "images/slide_01.tif",
+    )
+"""
+
+import itertools
+from typing import Any, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from pyarrow import compute as pc
+from pyarrow import dataset as ds
+
+from elbow.dtypes import PaNDArrayType, get_dtype
+from elbow.record import Record
+from elbow.typing import StrOrPath
+
+__all__ = ["tile_grid", "tile_array", "tile_records", "read_tiles"]
+
+Index = Union[int, slice]
+
+
+def tile_grid(shape: Sequence[int], tile_shape: Sequence[int]) -> Tuple[int, ...]:
+    """
+    Number of tiles along each dimension for an array of `shape`. Edge tiles may be
+    smaller than `tile_shape`.
+    """
+    if len(shape) != len(tile_shape):
+        raise ValueError(f"Tile shape {tile_shape} doesn't match array shape {shape}")
+    return tuple(-(-dim // tdim) for dim, tdim in zip(shape, tile_shape))
+
+
+def tile_array(
+    array: np.ndarray, tile_shape: Sequence[int]
+) -> Iterator[Tuple[int, Tuple[int, ...], np.ndarray]]:
+    """
+    Split an array into tiles. Yields tuples of flat (C order) tile ID, tile grid
+    index, and tile data (a view into `array`).
+    """
+    grid = tile_grid(array.shape, tile_shape)
+    for tile_id, index in enumerate(itertools.product(*map(range, grid))):
+        slices = tuple(
+            slice(ii * tdim, (ii + 1) * tdim) for ii, tdim in zip(index, tile_shape)
+        )
+        yield tile_id, index, array[slices]
+
+
+def tile_records(
+    array: np.ndarray,
+    tile_shape: Sequence[int],
+    tile_column: str = "tile",
+    **fields: Any,
+) -> Iterator[Record]:
+    """
+    Generate one record per tile of `array`, with columns:
+
+        - ``**fields``: extra key columns identifying the array (e.g. ``file_path``)
+        - tile_id: flat (C order) tile ID
+        - tile_index: tile grid index
+        - array_shape: full array shape
+        - tile_shape: tile shape
+        - ``tile_column``: tile data, as an ``ndarray`` extension type
+
+    Can be used directly in an extract function to store arrays tiled.
+    """
+    array = np.asarray(array)
+    tile_shape = tuple(int(dim) for dim in tile_shape)
+    tile_type = PaNDArrayType(get_dtype(array.dtype))
+    for tile_id, index, tile in tile_array(array, tile_shape):
+        data = {
+            **fields,
+            "tile_id": tile_id,
+            "tile_index": list(index),
+            "array_shape": list(array.shape),
+            "tile_shape": list(tile_shape),
+            tile_column: tile,
+        }
+        yield Record(data, types={tile_column: tile_type})
+
+
+def read_tiles(
+    source: Union[StrOrPath, List[StrOrPath], ds.Dataset],
+    index: Union[Index, Tuple[Index, ...]] = (),
+    filter: Optional[ds.Expression] = None,
+    tile_column: str = "tile",
+) -> np.ndarray:
+    """
+    Read a slice of a tiled array, fetching only the intersecting tiles.
+
+    Args:
+        source: parquet dataset path(s) or pyarrow dataset containing tile records
+            written with `tile_records()`
+        index: an int or slice, or tuple of ints and slices, selecting the region to
+            read. Slices must have step 1. Missing trailing dimensions are read in
+            full.
+        filter: optional dataset filter expression selecting a single array, e.g.
+            ``pc.field("file_path") == path``
+        tile_column: name of the tile data column
+
+    Returns:
+        The requested region as a numpy array
+    """
+    dset = source if isinstance(source, ds.Dataset) else ds.dataset(source)
+
+    # Look up the grid metadata from the first tile.
+    expr = pc.field("tile_id") == 0
+    if filter is not None:
+        expr = filter & expr
+    meta = dset.to_table(columns=["array_shape", "tile_shape"], filter=expr)
+    if meta.num_rows != 1:
+        raise ValueError(
+            f"Expected tiles for exactly one array; found {meta.num_rows} arrays"
+        )
+    shape = tuple(meta["array_shape"][0].as_py())
+    tile_shape = tuple(meta["tile_shape"][0].as_py())
+    grid = tile_grid(shape, tile_shape)
+
+    bounds, squeeze = _normalize_index(index, shape)
+
+    # Tiles intersecting the requested region, and their flat IDs.
+    ranges = [
+        range(start // tdim, -(-stop // tdim)) if stop > start else range(0)
+        for (start, stop), tdim in zip(bounds, tile_shape)
+    ]
+    tile_indices = list(itertools.product(*ranges))
+    tile_ids = [int(np.ravel_multi_index(idx, grid)) for idx in tile_indices]
+
+    expr = pc.field("tile_id").isin(tile_ids)
+    if filter is not None:
+        expr = filter & expr
+    table = dset.to_table(columns=["tile_id", tile_column], filter=expr)
+
+    dtype = table.schema.field(tile_column).type.item_type.to_pandas_dtype()
+    out = np.zeros(tuple(stop - start for start, stop in bounds), dtype=dtype)
+    tiles = itertools.chain.from_iterable(
+        chunk.to_numpy() for chunk in table[tile_column].iterchunks()
+    )
+    for tile_id, tile in zip(table["tile_id"].to_pylist(), tiles):
+        tile_index = np.unravel_index(tile_id, grid)
+        src, dst = [], []
+        for ii, (start, stop) in enumerate(bounds):
+            offset = tile_index[ii] * tile_shape[ii]
+            lo = max(start, offset)
+            hi = min(stop, offset + tile.shape[ii])
+            src.append(slice(lo - offset, hi - offset))
+            dst.append(slice(lo - start, hi - start))
+        out[tuple(dst)] = tile[tuple(src)]
+
+    if squeeze:
+        out = out.squeeze(axis=tuple(squeeze))
+    return out
+
+
+def _normalize_index(
+    index: Union[Index, Tuple[Index, ...]], shape: Tuple[int, ...]
+) -> Tuple[List[Tuple[int, int]], List[int]]:
+    """
+    Convert an index to per-dimension (start, stop) bounds, and a list of integer
+    indexed dimensions to squeeze.
+    """
+    if not isinstance(index, tuple):
+        index = (index,)
+    if len(index) > len(shape):
+        raise IndexError(f"Too many indices for array of shape {shape}")
+    index = index + (slice(None),) * (len(shape) - len(index))
+
+    bounds = []
+    squeeze = []
+    for dim, (idx, size) in enumerate(zip(index, shape)):
+        if isinstance(idx, slice):
+            start, stop, step = idx.indices(size)
+            if step != 1:
+                raise ValueError("Only slices with step 1 are supported")
+            bounds.append((start, max(start, stop)))
+        else:
+            idx = int(idx)
+            if idx < 0:
+                idx += size
+            if not 0 <= idx < size:
+                raise IndexError(f"Index {idx} out of bounds for size {size}")
+            bounds.append((idx, idx + 1))
+            squeeze.append(dim)
+    return bounds, squeeze
@@ -1,9 +1,12 @@
+import errno
+import fnmatch
 import os
+import posixpath
 import re
 import tempfile
 from contextlib import contextmanager
 from pathlib import Path
-from typing import Tuple, Union
+from typing import Iterable, List, Optional, Tuple, Union
 
 StrOrPath = Union[str, Path]
 
@@ -88,10 +91,110 @@ def detect_size_units(size: Union[int, float]) -> Tuple[float, str]:
 
 def cpu_count() -> int:
     """
-    Get the number of available CPUs.
+    Get the number of available CPUs, respecting the CPU affinity of the process where
+    supported.
     """
     if "SLURM_CPUS_ON_NODE" in os.environ:
         count = int(os.environ["SLURM_CPUS_ON_NODE"])
+    elif hasattr(os, "sched_getaffinity"):
+        count = len(os.sched_getaffinity(0)) or 1
     else:
         count = os.cpu_count() or 1
     return count
+
+
+# Stat errors meaning the file doesn't exist, as in `pathlib.Path.exists()`.
+_MISSING_ERRNOS = (errno.ENOENT, errno.ENOTDIR, errno.EBADF, errno.ELOOP)
+
+
+def stat_mtime(path: Path) -> Optional[float]:
+    """
+    Get the modified time of a path, or `None` if it doesn't exist. Like
+    `pathlib.Path.exists()`, broken links, symbolic link loops, and paths through
+    non-directories count as missing. Other errors are raised.
+    """
+    try:
+        return path.stat().st_mtime
+    except OSError as exc:
+        if exc.errno not in _MISSING_ERRNOS:
+            raise
+        return None
+
+
+class GlobMatcher:
+    """
+    A set of glob patterns compiled once for fast matching, following the semantics of
+    `fnmatch.fnmatch()`.
+
+    Patterns without wildcards are matched by set lookup, and ``"*.ext"`` style suffix
+    patterns with a single `str.endswith()` call. The remaining patterns are combined
+    into a single regex.
+
+    Example::
+
+        matcher = GlobMatcher(["*.txt", "*.json", "data_??.csv"])
+        matcher.match("a.txt")
+        names = matcher.filter(os.listdir(path))
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        # Case normalization as in `fnmatch.fnmatch()`, e.g. on Windows.
+        self._normcase = os.path.normcase is not posixpath.normcase
+        patterns = [self._norm(pat) for pat in patterns]
+        self.patterns = patterns
+
+        names = set()
+        suffixes = []
+        others = []
+        for pat in patterns:
+            if not _has_magic(pat):
+                names.add(pat)
+            elif pat.startswith("*") and not _has_magic(pat[1:]):
+                suffixes.append(pat[1:])
+            else:
+                others.append(pat)
+
+        self._names = frozenset(names)
+        self._suffixes = tuple(suffixes)
+        self._regex = None
+        if others:
+            self._regex = re.compile(
+                "|".join(f"(?:{fnmatch.translate(pat)})" for pat in others)
+            )
+
+    def match(self, name: str) -> bool:
+        """
+        Check if `name` matches any of the patterns.
+        """
+        name = self._norm(name)
+        return (
+            name in self._names
+            or (bool(self._suffixes) and name.endswith(self._suffixes))
+            or (self._regex is not None and self._regex.match(name) is not None)
+        )
+
+    def filter(self, names: Iterable[str], exclude: bool = False) -> List[str]:
+        """
+        Filter a list of names, keeping those that match any of the patterns (or don't
+        match any if `exclude` is set). The order of `names` is preserved.
+        """
+        match = self.match
+        if exclude:
+            return [name for name in names if not match(name)]
+        return [name for name in names if match(name)]
+
+    def _norm(self, name: str) -> str:
+        return os.path.normcase(name) if self._normcase else name
+
+    def __bool__(self) -> bool:
+        return bool(self.patterns)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.patterns!r})"
+
+
+_MAGIC_CHARS = re.compile(r"[*?\[]")
+
+
+def _has_magic(pattern: str) -> bool:
+    return _MAGIC_CHARS.search(pattern) is not None
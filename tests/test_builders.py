@@ -1,12 +1,21 @@
+import pickle
+import sqlite3
 import time
+from glob import glob
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 import pytest
 from pyarrow import parquet as pq
 from pytest_benchmark.fixture import BenchmarkFixture
 
-from elbow.builders import build_parquet, build_table
+from elbow import builders
+from elbow.builders import build_parquet, build_sqlite, build_table
+from elbow.dataset import DatasetManifest, read_latest
+from elbow.dtypes import PaSparseNDArrayType, PdSparseNDArrayDtype
+from elbow.record import Record
 from elbow.sources.filesystem import Crawler
 from tests.utils_for_tests import extract_jsonl, random_jsonl_batch
 
@@ -45,6 +54,22 @@ def test_build_table_parallel(jsonl_dataset: str):
     assert df.columns.tolist() == expected_columns
 
 
+def test_build_table_arrow_backend(jsonl_dataset: str):
+    df = build_table(
+        source=jsonl_dataset, extract=extract_jsonl, dtype_backend="pyarrow"
+    )
+    assert df.shape == (NUM_BATCHES * BATCH_SIZE, 7)
+    assert isinstance(df["a"].dtype, pd.ArrowDtype)
+
+
+def test_build_table_all_workers(jsonl_dataset: str, monkeypatch):
+    # workers=-1 uses all the cpus available to the process.
+    monkeypatch.setattr(builders, "cpu_count", lambda: 2)
+    assert builders._check_workers(-1, None) == (2, None)
+    df = build_table(source=jsonl_dataset, extract=extract_jsonl, workers=-1)
+    assert df.shape == (NUM_BATCHES * BATCH_SIZE, 7)
+
+
 def test_build_parquet(jsonl_dataset: str, mod_tmp_path: Path):
     pq_path = mod_tmp_path / "dset.pqds"
 
@@ -75,6 +100,19 @@ def test_build_parquet(jsonl_dataset: str, mod_tmp_path: Path):
     df2 = dset2.read().to_pandas()
     assert df2.shape == ((NUM_BATCHES + 2) * BATCH_SIZE, 7)
 
+    manifest = DatasetManifest.load(pq_path)
+    assert manifest.is_complete(pq_path)
+    assert manifest.num_rows() == df2.shape[0]
+    assert sorted(manifest.files(pq_path)) == sorted(dset2.files)
+
+    stats = manifest.parts[0]["row_groups"][0]["stats"]
+    assert list(stats) == ["file_path", "mod_time"]
+
+    # Latest view drops the old rows for the re-written batch
+    latest = read_latest(pq_path)
+    assert latest.shape == ((NUM_BATCHES + 1) * BATCH_SIZE, 7)
+    assert latest.num_rows == df2["file_path"].nunique() * BATCH_SIZE
+
 
 def test_build_parquet_parallel(jsonl_dataset: str, mod_tmp_path: Path):
     pq_path = mod_tmp_path / "dset_parallel.pqds"
@@ -134,5 +172,101 @@ def test_build_parquet_with_crawl(mod_tmp_path: Path):
     assert df.shape == ((NUM_BATCHES + 1) * BATCH_SIZE, 7)
 
 
+@pytest.mark.parametrize("workers", [1, 2])
+def test_build_sqlite(jsonl_dataset: str, mod_tmp_path: Path, workers: int):
+    db_path = mod_tmp_path / f"dset_{workers}.db"
+
+    build_sqlite(
+        source=jsonl_dataset, extract=extract_jsonl, output=db_path, workers=workers
+    )
+    conn = sqlite3.connect(db_path)
+    (count,) = conn.execute("SELECT COUNT(*) FROM elbow").fetchone()
+    assert count == len(glob(jsonl_dataset)) * BATCH_SIZE
+
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(elbow)")]
+    assert columns == ["file_path", "link_target", "mod_time", "a", "b", "c", "d"]
+
+    indices = [row[1] for row in conn.execute("PRAGMA index_list(elbow)")]
+    assert indices == ["elbow_file_path_idx"]
+    conn.close()
+
+    with pytest.raises(FileExistsError):
+        build_sqlite(source=jsonl_dataset, extract=extract_jsonl, output=db_path)
+
+
+def test_build_sparse_threshold(tmp_path: Path):
+    def extract(path):
+        mask = np.zeros((8, 8), dtype=np.uint8)
+        mask[0, 0] = 1
+        return {"file_path": str(path), "mask": mask}
+
+    paths = [tmp_path / f"{ii}.txt" for ii in range(3)]
+    for path in paths:
+        path.touch()
+
+    df = build_table(paths, extract, sparse_threshold=0.1)
+    assert isinstance(df["mask"].dtype, PdSparseNDArrayDtype)
+    assert df["mask"][0][0, 0] == 1
+
+    build_parquet(paths, extract, tmp_path / "dset.pqds", sparse_threshold=0.1)
+    table = pq.read_table(tmp_path / "dset.pqds")
+    assert table.schema.field("mask").type == PaSparseNDArrayType(pa.uint8())
+
+
+def test_build_parquet_late_float(tmp_path: Path):
+    def extract(path):
+        for ii in range(300):
+            yield {"file_path": str(path), "x": 0.5 if ii == 299 else ii}
+
+    path = tmp_path / "data.txt"
+    path.touch()
+
+    pq_path = tmp_path / "dset.pqds"
+    build_parquet([path], extract, pq_path)
+    table = pq.read_table(pq_path)
+    assert table.num_rows == 300
+    assert table.schema.field("x").type == pa.float64()
+    assert table["x"][-1].as_py() == 0.5
+
+
+@pytest.mark.parametrize(
+    "dtype", ["pickle<compression: zstd>", "pickle<marshal>", "pickle<npy>"]
+)
+def test_build_sqlite_pickle_options(tmp_path: Path, dtype: str):
+    def extract(path):
+        value = np.arange(4) if "npy" in dtype else {"a": [1, 2]}
+        return Record({"file_path": str(path), "obj": value}, types={"obj": dtype})
+
+    path = tmp_path / "data.txt"
+    path.touch()
+
+    db_path = tmp_path / "dset.db"
+    build_sqlite([path], extract, db_path)
+    conn = sqlite3.connect(db_path)
+    (blob,) = conn.execute("SELECT obj FROM elbow").fetchone()
+    conn.close()
+    # Values are stored as plain pickles, whatever the type options.
+    value = pickle.loads(blob)
+    if "npy" in dtype:
+        assert np.array_equal(value, np.arange(4))
+    else:
+        assert value == {"a": [1, 2]}
+
+
+def test_build_sqlite_worker_failure(jsonl_dataset: str, mod_tmp_path: Path):
+    db_path = mod_tmp_path / "dset_fail.db"
+    Path(f"{db_path}-wal").write_bytes(b"stale")
+
+    # Lambdas can't be pickled, so the workers never start.
+    with pytest.raises(Exception, match="pickle"):
+        build_sqlite(
+            source=jsonl_dataset,
+            extract=lambda path: extract_jsonl(path),
+            output=db_path,
+            workers=2,
+        )
+    assert not Path(f"{db_path}-wal").exists()
+
+
 if __name__ == "__main__":
     pytest.main([__file__])
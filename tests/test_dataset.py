@@ -0,0 +1,132 @@
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pytest
+from pyarrow import parquet as pq
+
+from elbow.dataset import MANIFEST_NAME, DatasetManifest, read_latest, update_manifest
+from elbow.record import RecordBatch
+from tests.utils_for_tests import random_record
+
+
+def _write_part(path: Path, seed: int, num_records: int = 100) -> Path:
+    rng = np.random.default_rng(seed)
+    batch = RecordBatch(random_record(rng) for _ in range(num_records))
+    pq.write_table(batch.to_arrow(), path, row_group_size=50)
+    return path
+
+
+def test_manifest(tmp_path: Path):
+    assert DatasetManifest.load(tmp_path) is None
+
+    part0 = _write_part(tmp_path / "part-0.parquet", seed=0)
+    part1 = _write_part(tmp_path / "part-1.parquet", seed=1)
+    update_manifest(tmp_path, part0, stats_columns=["a", "c"])
+    assert (tmp_path / MANIFEST_NAME).exists()
+
+    manifest = DatasetManifest.load(tmp_path)
+    assert len(manifest) == 1
+    assert not manifest.is_complete(tmp_path)
+
+    update_manifest(tmp_path, part1, stats_columns=["a", "c"])
+    # updating the same part again replaces the entry
+    update_manifest(tmp_path, part1, stats_columns=["a", "c"])
+    manifest = DatasetManifest.load(tmp_path)
+    assert len(manifest) == 2
+    assert manifest.is_complete(tmp_path)
+    assert manifest.num_rows() == 200
+    assert len(manifest.schemas) == 1
+
+    part = manifest.parts[0]
+    assert part["name"] == "part-0.parquet"
+    assert part["num_bytes"] == part0.stat().st_size
+    assert len(part["row_groups"]) == 2
+
+    table = pq.read_table(part0)
+    stats = part["row_groups"][0]["stats"]
+    assert stats["a"] == [
+        min(table["a"][:50].to_pylist()),
+        max(table["a"][:50].to_pylist()),
+        0,
+    ]
+    assert stats["c"][0] == min(table["c"][:50].to_pylist())
+
+    expected_schema = pa.schema(
+        {
+            "a": pa.int64(),
+            "b": pa.float64(),
+            "c": pa.string(),
+            "d": pa.list_(pa.float64()),
+        },
+    )
+    assert manifest.schema().equals(expected_schema)
+
+    dset = manifest.dataset(tmp_path)
+    assert dset.to_table(columns=["a"]).num_rows == 200
+
+
+def test_manifest_pruning(tmp_path: Path):
+    for ii in range(3):
+        part = tmp_path / f"part-{ii}.parquet"
+        paths = [f"{ii}/{jj}" for jj in range(10)]
+        pq.write_table(pa.table({"path": paths, "x": list(range(10))}), part)
+        update_manifest(tmp_path, part, stats_columns=["path", "x"])
+    pq.write_table(
+        pa.table({"path": ["1/10", None], "x": [10, 11]}), tmp_path / "part-3.parquet"
+    )
+    update_manifest(tmp_path, tmp_path / "part-3.parquet", stats_columns=["path", "x"])
+
+    dset = DatasetManifest.load(tmp_path).dataset(tmp_path)
+    fragments = dset.get_fragments(filter=pc.field("path") == "1/5")
+    # part-3 has nulls in the path column, so can't be ruled out.
+    assert sorted(Path(frag.path).name for frag in fragments) == [
+        "part-1.parquet",
+        "part-3.parquet",
+    ]
+    assert dset.to_table(filter=pc.field("path") == "1/5").num_rows == 1
+    assert dset.to_table(filter=pc.field("path").is_null()).num_rows == 1
+    assert dset.to_table(filter=pc.field("x") >= 10).num_rows == 2
+
+
+def test_read_latest(tmp_path: Path):
+    batches = [
+        [{"path": "a", "x": 0}, {"path": "b", "x": 0}, {"path": "c", "x": 0}],
+        [{"path": "a", "x": 1}, {"path": "d", "x": 1}],
+        [{"path": "a", "x": 2}, {"path": "b", "x": 2}],
+    ]
+    supersedes = [[], ["a"], ["a", "b"]]
+    for ii, (batch, paths) in enumerate(zip(batches, supersedes)):
+        part = tmp_path / f"part-{ii}.parquet"
+        pq.write_table(RecordBatch(batch).to_arrow(), part)
+        update_manifest(
+            tmp_path,
+            part,
+            stats_columns=["path", "x"],
+            created=float(ii),
+            supersedes=("path", paths),
+        )
+
+    table = read_latest(tmp_path)
+    assert table.to_pylist() == [
+        {"path": "c", "x": 0},
+        {"path": "d", "x": 1},
+        {"path": "a", "x": 2},
+        {"path": "b", "x": 2},
+    ]
+
+    table = read_latest(tmp_path, columns=["x"], filter=pc.field("x") > 0)
+    assert table.to_pylist() == [{"x": 1}, {"x": 2}, {"x": 2}]
+
+    # Parts ruled out by the statistics aren't opened.
+    (tmp_path / "part-0.parquet").write_bytes(b"corrupt")
+    table = read_latest(tmp_path, filter=pc.field("x") == 1)
+    assert table.to_pylist() == [{"path": "d", "x": 1}]
+
+    with pytest.raises(ValueError):
+        read_latest(tmp_path / "missing")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -1,8 +1,9 @@
 # pylint: disable=redefined-outer-name
 
+import pickle
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Type
+from typing import Any, Dict, List, Optional, Type
 
 import numpy as np
 import pandas as pd
@@ -12,6 +13,7 @@ from pandas.api.extensions import ExtensionArray
 from pyarrow import parquet as pq
 
 from elbow.dtypes import (
+    COOArray,
     PaExtensionArray,
     PaExtensionType,
     PaJSONArray,
@@ -20,6 +22,8 @@ from elbow.dtypes import (
     PaNDArrayType,
     PaPickleArray,
     PaPickleType,
+    PaSparseNDArrayArray,
+    PaSparseNDArrayType,
     PdExtensionDtype,
     PdJSONArray,
     PdJSONDtype,
@@ -27,8 +31,15 @@ from elbow.dtypes import (
     PdNDArrayDtype,
     PdPickleArray,
     PdPickleDtype,
+    PdSparseNDArrayDtype,
+    get_dtype,
 )
 from elbow.dtypes._ndarray import _array_of_arrays
+from elbow.record import Record, RecordBatch
+
+needs_pickle5 = pytest.mark.skipif(
+    pickle.HIGHEST_PROTOCOL < 5, reason="requires pickle protocol 5"
+)
 
 
 @dataclass
@@ -203,6 +214,285 @@ def test_to_parquet(ext_data: ExtData, tmp_path: Path):
     assert df.equals(df3)
 
 
+def test_ndarray_pack_array():
+    values = [np.ones((2, 3)), None, np.arange(4, dtype=np.int32), np.zeros((0, 2))]
+    typ = PaNDArrayType(pa.float32())
+    arr = typ.pack_array(values)
+    expected = pa.array([typ.pack(v) for v in values], type=typ)
+
+    assert isinstance(arr, PaNDArrayArray)
+    assert arr == expected
+    assert arr.null_count == 1
+    assert arr[1].as_py() is None
+    assert arr[2].as_py().dtype == np.float32
+    assert _equals(arr[2].as_py(), values[2])
+    assert arr[3].as_py().shape == (0, 2)
+
+
+def test_ndarray_to_numpy():
+    values = [np.ones((2, 3)), None, np.arange(4).reshape(2, 2), np.zeros((0, 2))]
+    typ = PaNDArrayType(pa.float32())
+    arr = typ.pack_array(values)
+
+    out = arr.to_numpy()
+    assert out.shape == (4,) and out.dtype == object
+    assert out[1] is None
+    for a, b in zip(out, values):
+        assert a is None or (a.shape == b.shape and _equals(a, b))
+
+    # Slicing is respected
+    out = arr.slice(2).to_numpy()
+    assert len(out) == 2 and _equals(out[0], values[2])
+
+    # Uniform shapes can be stacked
+    values = [np.full((2, 3), ii) for ii in range(5)]
+    arr = typ.pack_array(values)
+    stacked = arr.slice(1, 3).to_numpy(stack=True)
+    assert stacked.shape == (3, 2, 3)
+    assert _equals(stacked, np.stack(values[1:4]))
+    assert not stacked.flags.writeable
+    assert arr.to_numpy(writable=True)[0].flags.writeable
+
+    fixed = PaNDArrayType(pa.float32(), shape=(2, 3)).pack_array(values + [None])
+    out = fixed.to_numpy(stack=True)
+    # Not stacked due to nulls
+    assert out.shape == (6,) and out[-1] is None
+    assert _equals(out[4], values[4])
+
+
+@pytest.mark.parametrize("typ", [PaJSONType(), PaPickleType()])
+def test_to_numpy(typ: PaExtensionType):
+    values = [{"a": 1}, None, [1, 2], 3, "x", None]
+    arr = typ.pack_array(values)
+
+    out = arr.to_numpy()
+    assert out.dtype == object
+    assert out.tolist() == values
+    assert arr.slice(1, 3).to_numpy().tolist() == values[1:4]
+    assert len(arr.slice(6).to_numpy()) == 0
+
+    col = pa.chunked_array([arr, arr.slice(2)])
+    ser = col.to_pandas()
+    assert isinstance(ser.dtype, PdExtensionDtype)
+    assert ser.tolist() == values + values[2:]
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {"compression": "zstd"},
+        pytest.param({"out_of_band": True}, marks=needs_pickle5),
+        pytest.param({"compression": "lz4", "out_of_band": True}, marks=needs_pickle5),
+    ],
+)
+def test_pickle_options(options: Dict[str, Any], tmp_path: Path):
+    typ = PaPickleType(**options)
+    values = [{"x": np.arange(10)}, None, np.ones((3, 3)), "abc"]
+    arr = typ.pack_array(values)
+    assert typ != PaPickleType()
+
+    out = arr.to_numpy()
+    assert out[1] is None
+    assert _equals(out[0]["x"], values[0]["x"])
+    assert _equals(out[2], values[2])
+    assert arr.to_pylist()[3] == "abc"
+
+    pq.write_table(pa.table({"x": arr}), tmp_path / "pickle.parquet")
+    tab = pq.read_table(tmp_path / "pickle.parquet")
+    assert tab.schema.field("x").type == typ
+    assert _equals(tab["x"].to_pylist()[2], values[2])
+
+
+def test_pickle_out_of_band_unsupported(monkeypatch):
+    monkeypatch.setattr(pickle, "HIGHEST_PROTOCOL", 4)
+    with pytest.raises(ValueError, match="protocol 5"):
+        PaPickleType(out_of_band=True)
+
+
+def test_sparse_ndarray(tmp_path: Path):
+    mask = np.zeros((4, 5), dtype=np.float32)
+    mask[1, 2] = 3.0
+    mask[3, 0] = 1.0
+    coo = COOArray(np.array([[0, 1], [1, 0]]), np.array([5.0, 6.0]), (2, 2))
+    values = [mask, None, np.eye(3), coo]
+
+    typ = PaSparseNDArrayType(pa.float32())
+    arr = typ.pack_array(values)
+    assert isinstance(arr, PaSparseNDArrayArray)
+    assert arr == pa.array([typ.pack(v) for v in values], type=typ)
+    assert arr.storage.field("values").to_pylist()[0] == [3.0, 1.0]
+
+    dense = arr.to_numpy()
+    assert _equals(dense[0], mask)
+    assert dense[1] is None
+    assert _equals(dense[3], coo.todense())
+    assert arr.to_pylist()[2].shape == (3, 3)
+
+    coos = arr.to_coo()
+    assert coos[1] is None
+    assert _equals(coos[3].coords, coo.coords)
+    assert _equals(coos[0].todense(), mask)
+
+    stacked = typ.pack_array([mask, 2 * mask]).to_numpy(stack=True)
+    assert stacked.shape == (2, 4, 5)
+    assert _equals(stacked[1], 2 * mask)
+
+    pq.write_table(pa.table({"x": arr}), tmp_path / "sparse.parquet")
+    df = pd.read_parquet(tmp_path / "sparse.parquet")
+    assert isinstance(df["x"].dtype, PdSparseNDArrayDtype)
+    assert _equals(df["x"][0], mask)
+
+    # Duplicate coordinates are summed
+    dup = COOArray(np.array([[0, 1, 0], [1, 0, 1]]), np.array([1.0, 2.0, 3.0]), (2, 2))
+    expected = np.array([[0.0, 4.0], [2.0, 0.0]])
+    assert _equals(dup.todense(), expected)
+    packed = typ.pack(dup)
+    assert packed["indices"].tolist() == [1, 2]
+    assert _equals(typ.pack_array([dup]).to_numpy()[0], expected)
+
+
+def test_json_shredded(tmp_path: Path):
+    values = [
+        {"a": 1, "b": "x", "c": [1, 2]},
+        None,
+        {"a": 2, "b": None, "d": True},
+        {"a": 3, "b": "y"},
+    ]
+    typ = PaJSONType(auto=True)
+    assert typ != PaJSONType()
+
+    arr = typ.pack_array(values)
+    shredded = PaJSONType(fields={"a": pa.int64(), "b": pa.string()})
+    assert arr.type == shredded
+    assert arr.storage.field("a").to_pylist() == [1, None, 2, 3]
+    assert arr.to_pylist() == values
+    assert arr.to_numpy().tolist() == values
+
+    # Values not matching the layout fall back to the remainder
+    other = [5, "s", {"a": True}, {}, {"a": 2**70}]
+    assert shredded.pack_array(other).to_pylist() == other
+
+    pq.write_table(pa.table({"x": arr}), tmp_path / "json.parquet")
+    tab = pq.read_table(tmp_path / "json.parquet")
+    assert tab.schema.field("x").type == shredded
+    df = tab.to_pandas()
+    assert isinstance(df["x"].dtype, PdJSONDtype)
+    assert df["x"].tolist() == values
+
+    tab2 = pa.Table.from_pandas(df, schema=tab.schema)
+    assert tab2.schema.field("x").type == shredded
+
+
+def test_ndarray_fixed_shape(tmp_path: Path):
+    values = [np.ones((2, 3)), None, np.arange(6).reshape(2, 3), np.zeros((2, 3))]
+    typ = PaNDArrayType(pa.float32(), shape=(2, 3))
+    assert str(typ) == "ndarray<item: float, shape: (2, 3)>"
+    assert typ != PaNDArrayType(pa.float32())
+
+    arr = typ.pack_array(values)
+    expected = pa.array([typ.pack(v) for v in values], type=typ)
+    assert arr == expected
+    assert arr.null_count == 1
+    assert arr[1].as_py() is None
+    assert _equals(arr[2].as_py(), values[2])
+
+    with pytest.raises(ValueError):
+        typ.pack_array([np.ones((3, 2))])
+
+    # Null rows in the middle must round trip through parquet.
+    pq.write_table(pa.table({"x": arr}), tmp_path / "fixed.parquet")
+    tab = pq.read_table(tmp_path / "fixed.parquet")
+    assert tab.schema.field("x").type == typ
+    assert tab["x"].combine_chunks() == arr
+
+
+def test_ndarray_auto_shape(tmp_path: Path):
+    typ = get_dtype("ndarray<float32, shape: auto>")
+    assert typ == PaNDArrayType(pa.float32(), shape="auto")
+    assert str(typ) == "ndarray<item: float, shape: auto>"
+    assert typ != PaNDArrayType(pa.float32())
+    assert pa.ipc.read_schema(pa.schema({"x": typ}).serialize()).field("x").type == typ
+
+    # Uniform shapes resolve to the fixed layout
+    values = [np.ones((2, 3)), None, np.zeros((2, 3))]
+    arr = typ.pack_array(values)
+    assert arr.type == PaNDArrayType(pa.float32(), shape=(2, 3))
+    assert _equals(arr[0].as_py(), values[0])
+
+    # Otherwise to the ragged layout
+    ragged = typ.pack_array([np.ones((2, 3)), np.ones(4)])
+    assert ragged.type == PaNDArrayType(pa.float32())
+
+    # The layout is fixed by the first batch
+    batch = RecordBatch(chunk_size=2)
+    for value in values[:2]:
+        batch.append(Record({"x": value}, types={"x": typ}))
+    with pytest.raises(ValueError, match="fixed shape"):
+        for value in [np.ones(4), np.ones(5)]:
+            batch.append(Record({"x": value}, types={"x": typ}))
+
+    with pytest.raises(ValueError):
+        PaNDArrayType(pa.float32(), shape="dynamic")
+
+
+@pytest.mark.parametrize(
+    "typ",
+    [
+        PaNDArrayType(pa.uint16(), codec="zstd", delta=True),
+        PaNDArrayType(pa.float32(), codec="lz4", shuffle=False),
+        PaNDArrayType(pa.uint8(), shape=(8, 8), codec="zstd"),
+    ],
+)
+def test_ndarray_codec(typ: PaNDArrayType, tmp_path: Path):
+    rng = np.random.default_rng(2023)
+    dtype = typ.item_type.to_pandas_dtype()
+    values: List[Optional[np.ndarray]] = [
+        rng.integers(0, 100, (8, 8)).astype(dtype) for _ in range(40)
+    ]
+    values[3] = None
+
+    arr = typ.pack_array(values)
+    assert arr.type == typ
+    assert arr.null_count == 1
+    assert _equals(arr[0].as_py(), values[0])
+    assert arr[3].as_py() is None
+    assert pa.array([typ.pack(v) for v in values[:3]], type=typ) == arr[:3]
+
+    # Threaded decoding, including a slice
+    out = arr.to_numpy()
+    assert all(_equals(a, b) for a, b in zip(out, values))
+    stacked = arr[4:].to_numpy(stack=True)
+    assert stacked.shape == (36, 8, 8)
+
+    assert get_dtype(str(typ)) == typ
+    pq.write_table(pa.table({"x": arr}), tmp_path / "codec.parquet")
+    tab = pq.read_table(tmp_path / "codec.parquet")
+    assert tab.schema.field("x").type == typ
+    assert tab["x"].combine_chunks() == arr
+
+
+def test_ndarray_codec_from_pandas():
+    typ = PaNDArrayType(pa.float32(), codec="zstd")
+    values = [np.ones((2, 2), dtype=np.float32), np.zeros(3, dtype=np.float32)]
+    df = pd.DataFrame({"x": PdNDArrayArray(values)})
+
+    # pyarrow only passes the storage type, which doesn't include the codec.
+    with pytest.raises(ValueError, match="pack_array"):
+        pa.Table.from_pandas(df, schema=pa.schema({"x": typ}))
+
+    arr = typ.pack_array(df["x"])
+    assert all(_equals(a, b) for a, b in zip(arr.to_numpy(), values))
+
+
+def test_ndarray_codec_invalid():
+    with pytest.raises(ValueError):
+        PaNDArrayType(pa.float32(), codec="zstd", delta=True)
+    with pytest.raises(ValueError):
+        PaNDArrayType(pa.int16(), delta=True)
+    with pytest.raises(ValueError):
+        PaNDArrayType(pa.int16(), codec="unknown")
+
+
 def _equals(a: Any, b: Any) -> bool:
     if isinstance(a, np.ndarray):
         return bool(np.all(a == b))
@@ -1,10 +1,20 @@
+import pickle
 from typing import Any, Dict, List, Optional
 
 import numpy as np
 import pyarrow as pa
 import pytest
 
-from elbow.dtypes import DataType, PaJSONType, PaNDArrayType, PaPickleType, get_dtype
+from elbow.dtypes import (
+    DataType,
+    PaJSONType,
+    PaNDArrayType,
+    PaPickleType,
+    PaSparseNDArrayType,
+    get_dtype,
+    infer_dtype,
+    promote_dtype,
+)
 
 
 @pytest.mark.parametrize(
@@ -20,6 +30,11 @@ from elbow.dtypes import DataType, PaJSONType, PaNDArrayType, PaPickleType, get_
             "struct < A: int, B: str >",
             pa.struct({"A": pa.int64(), "B": pa.string()}),
         ),
+        ("struct<my field: int32>", pa.struct({"my field": pa.int32()})),
+        (
+            "json< First Name : string>",
+            PaJSONType(fields={"First Name": pa.string()}),
+        ),
         (
             "struct< data: list<double>, shape: list<int64> >",
             pa.struct({"data": pa.list_(pa.float64()), "shape": pa.list_(pa.int64())}),
@@ -39,8 +54,28 @@ from elbow.dtypes import DataType, PaJSONType, PaNDArrayType, PaPickleType, get_
             ),
         ),
         ("json", PaJSONType()),
+        ("json<auto>", PaJSONType(auto=True)),
+        ("sparse_ndarray<float32>", PaSparseNDArrayType(pa.float32())),
+        (
+            "json<Name: string, n: int64>",
+            PaJSONType(fields={"Name": pa.string(), "n": pa.int64()}),
+        ),
         ("pickle", PaPickleType()),
+        (
+            "pickle<compression: zstd, serializer: npy>",
+            PaPickleType(compression="zstd", serializer="npy"),
+        ),
         ("ndarray<float32>", PaNDArrayType(pa.float32())),
+        (
+            "ndarray<float32, shape: (224, 224, 3)>",
+            PaNDArrayType(pa.float32(), shape=(224, 224, 3)),
+        ),
+        ("ndarray<item: uint8, shape: (5,)>", PaNDArrayType(pa.uint8(), shape=(5,))),
+        ("list<ndarray<float32>>", pa.list_(PaNDArrayType(pa.float32()))),
+        (
+            "struct<meta: json, n: int64>",
+            pa.struct({"meta": PaJSONType(), "n": pa.int64()}),
+        ),
         (Optional[str], pa.string()),
         (List[str], pa.list_(pa.string())),
         (Dict[str, Any], PaJSONType()),
@@ -51,12 +86,140 @@ def test_get_dtype(test_input: DataType, expected: pa.DataType):
 
 
 @pytest.mark.parametrize(
-    "unsupported_dtype", [object, "object", "map<int32, str>", "list", "struct"]
+    "unsupported_dtype",
+    [
+        object,
+        "object",
+        "map<int32, str>",
+        "list",
+        "struct",
+        "list<>",
+        "list<int32",
+        "list<int32>>",
+        "struct<a int32>",
+        "struct<a: int32,>",
+        "ndarray<float32, shape: (a, 2)>",
+        "pickle<unknown: true>",
+    ],
 )
 def test_unsupported_get_dtype(unsupported_dtype: DataType):
     with pytest.raises(ValueError):
         get_dtype(unsupported_dtype)
 
 
+@pytest.mark.skipif(pickle.HIGHEST_PROTOCOL < 5, reason="requires pickle protocol 5")
+def test_get_dtype_pickle_out_of_band():
+    typ = get_dtype("pickle<compression: zstd, out_of_band: true>")
+    assert typ == PaPickleType(compression="zstd", out_of_band=True)
+
+
+def test_get_dtype_nested():
+    depth = 200
+    alias = "list<" * depth + "struct<a: int32, b: ndarray<float32, shape: (2,)>>"
+    alias += ">" * depth
+    dtype = get_dtype(alias)
+    for _ in range(depth):
+        assert pa.types.is_list(dtype)
+        dtype = dtype.value_type
+    assert dtype == pa.struct(
+        {"a": pa.int32(), "b": PaNDArrayType(pa.float32(), shape=(2,))}
+    )
+
+
+@pytest.mark.parametrize(
+    "dtype",
+    [
+        pa.timestamp("ms"),
+        pa.list_(pa.struct({"a": pa.list_(pa.float64()), "b": pa.string()})),
+        PaJSONType(fields={"A": pa.int64()}),
+        PaNDArrayType(pa.uint8(), shape=(3, 4)),
+    ],
+)
+def test_get_dtype_roundtrip(dtype: pa.DataType):
+    assert get_dtype(str(dtype)) == dtype
+
+
+def test_get_dtype_cached():
+    assert get_dtype("list<int32>") is get_dtype("list<int32>")
+    assert get_dtype(Optional[str]) is get_dtype(Optional[str])
+
+
+@pytest.mark.parametrize(
+    "a,b,expected",
+    [
+        (pa.int64(), pa.int64(), pa.int64()),
+        (pa.null(), pa.string(), pa.string()),
+        (pa.int32(), pa.int64(), pa.int64()),
+        (pa.uint8(), pa.int8(), pa.int64()),
+        (pa.int64(), pa.float32(), pa.float64()),
+        (pa.float32(), pa.float64(), pa.float64()),
+        (pa.list_(pa.int64()), pa.list_(pa.float64()), pa.list_(pa.float64())),
+        (
+            pa.struct({"x": pa.int64()}),
+            pa.struct({"x": pa.float64(), "y": pa.string()}),
+            pa.struct({"x": pa.float64(), "y": pa.string()}),
+        ),
+    ],
+)
+def test_promote_dtype(a: pa.DataType, b: pa.DataType, expected: pa.DataType):
+    assert promote_dtype(a, b) == expected
+    assert promote_dtype(b, a) == expected
+
+
+@pytest.mark.parametrize(
+    "a,b",
+    [
+        (pa.int64(), pa.string()),
+        (pa.bool_(), pa.int64()),
+        (pa.list_(pa.int64()), pa.list_(pa.string())),
+    ],
+)
+def test_promote_dtype_incompatible(a: pa.DataType, b: pa.DataType):
+    with pytest.raises(ValueError):
+        promote_dtype(a, b)
+
+
+@pytest.mark.parametrize(
+    "test_input,expected",
+    [
+        (None, pa.null()),
+        (True, pa.bool_()),
+        (1, pa.int64()),
+        (2**63, pa.uint64()),
+        (-(2**63), pa.int64()),
+        (1.0, pa.float64()),
+        ("abc", pa.string()),
+        ([1, 2], pa.list_(pa.int64())),
+        ({"a": 1}, pa.struct({"a": pa.int64()})),
+        (np.float32(1.0), pa.float32()),
+        (np.arange(3), pa.list_(pa.int64())),
+        (np.ones((2, 3), dtype=np.float32), PaNDArrayType(pa.float32())),
+        (
+            [np.ones((2, 3), dtype=np.float32), None],
+            pa.list_(PaNDArrayType(pa.float32())),
+        ),
+        (
+            {"a": 1, "b": np.ones((2, 3))},
+            pa.struct({"a": pa.int64(), "b": PaNDArrayType(pa.float64())}),
+        ),
+    ],
+)
+def test_infer_dtype(test_input: Any, expected: pa.DataType):
+    # Second call hits the cache
+    assert infer_dtype(test_input) == expected
+    assert infer_dtype(test_input) == expected
+
+
+def test_infer_sparse_dtype():
+    mask = np.zeros((10, 10), dtype=np.uint8)
+    mask[2, 3] = 1
+    assert infer_dtype(mask) == PaNDArrayType(pa.uint8())
+    assert infer_dtype(mask, sparse_threshold=0.05) == PaSparseNDArrayType(pa.uint8())
+    # Dense arrays stay dense, and the cache isn't affected.
+    dense = np.ones((10, 10), dtype=np.uint8)
+    assert infer_dtype(dense, sparse_threshold=0.05) == PaNDArrayType(pa.uint8())
+    assert infer_dtype(mask) == PaNDArrayType(pa.uint8())
+
+
 if __name__ == "__main__":
     pytest.main(["-x", __file__])
@@ -0,0 +1,100 @@
+import ast
+from typing import Any, List
+
+import numpy as np
+import pyarrow as pa
+import pytest
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from elbow.dtypes import (
+    PaPickleType,
+    Serializer,
+    get_dtype,
+    get_serializer,
+    list_serializers,
+    register_serializer,
+    unregister_serializer,
+)
+
+NUM_VALUES = 1000
+
+
+def _values(serializer: str) -> List[Any]:
+    rng = np.random.default_rng(2023)
+    if serializer == "npy":
+        return [rng.random((16, 16)) for _ in range(NUM_VALUES)]
+    return [
+        {"a": ii, "b": [float(ii), 2.0, 3.0], "c": "abc" * 10}
+        for ii in range(NUM_VALUES)
+    ]
+
+
+def _equals(a: Any, b: Any) -> bool:
+    if isinstance(a, np.ndarray):
+        return bool(np.all(a == b))
+    return a == b
+
+
+@pytest.mark.parametrize("serializer", list_serializers())
+def test_serializer(serializer: str, benchmark: BenchmarkFixture):
+    typ = get_dtype(f"pickle<{serializer}>")
+    assert isinstance(typ, PaPickleType)
+    assert typ.serializer == serializer
+
+    values = _values(serializer)
+
+    def roundtrip():
+        return typ.pack_array(values).to_numpy()
+
+    out = benchmark(roundtrip)
+    assert len(out) == len(values)
+    assert all(_equals(a, b) for a, b in zip(out, values))
+
+
+def test_npy_serializer():
+    serializer = get_serializer("npy")
+    array = np.arange(6, dtype=np.int16).reshape(2, 3).T
+    data = serializer.dumps(array)
+    out = serializer.loads(memoryview(data))
+    assert out.dtype == array.dtype and out.shape == array.shape
+    assert _equals(out, array)
+
+    with pytest.raises(ValueError):
+        serializer.dumps(np.array([{}], dtype=object))
+
+
+@pytest.fixture
+def repr_serializer():
+    serializer = Serializer(
+        "repr",
+        lambda v: repr(v).encode(),
+        lambda b: ast.literal_eval(bytes(b).decode()),
+    )
+    yield serializer
+    if serializer.name in list_serializers():
+        unregister_serializer(serializer.name)
+
+
+def test_register_serializer(repr_serializer: Serializer):
+    with pytest.raises(ValueError):
+        register_serializer(Serializer("pickle", repr, ast.literal_eval))
+
+    register_serializer(repr_serializer)
+    typ = PaPickleType(serializer="repr")
+    arr = typ.pack_array([{"a": 1}, None])
+    assert arr.to_pylist() == [{"a": 1}, None]
+    assert pa.ipc.read_schema(pa.schema({"x": typ}).serialize()).field("x").type == typ
+
+    with pytest.raises(ValueError):
+        PaPickleType(serializer="repr", out_of_band=True)
+    with pytest.raises(ValueError):
+        PaPickleType(serializer="unknown")
+
+    unregister_serializer("repr")
+    assert "repr" not in list_serializers()
+    with pytest.raises(ValueError):
+        unregister_serializer("repr")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -30,6 +30,9 @@ def test_extract_file_meta(json_path: Path):
     assert metadata.link_target == str(json_path.absolute())
     assert metadata.mod_time > 1672549200
 
+    metadata = extract_file_meta(json_path / "child.json")
+    assert metadata.mod_time is None
+
 
 if __name__ == "__main__":
     pytest.main([__file__])
@@ -7,6 +7,7 @@ import pytest
 from elbow.extractors import extract_file_meta
 from elbow.filters import FileModifiedIndex
 from elbow.record import RecordBatch
+from elbow.sources.filesystem import Crawler
 
 
 @pytest.fixture
@@ -24,8 +25,8 @@ def file_index_parquet(tmp_path: Path, dummy_files: List[Path]) -> Path:
     path = tmp_path / "index.parquet"
 
     index = RecordBatch()
-    for path in dummy_files:
-        metadata = extract_file_meta(path)
+    for file in dummy_files:
+        metadata = extract_file_meta(file)
         index.append(metadata)
 
     index = index.to_arrow()
@@ -56,6 +57,27 @@ def test_file_modified_index(
     nonexist_file = tmp_path / "nonexist.txt"
     assert not index(nonexist_file)
 
+    # Symbolic link loops and paths through files count as missing
+    loop = tmp_path / "loop"
+    loop.symlink_to(loop)
+    assert not index(loop)
+    assert not index(dummy_files[0] / "child.txt")
+
+
+def test_file_modified_index_stat_path(
+    tmp_path: Path,
+    dummy_files: List[Path],
+    file_index_parquet: Path,
+):
+    index = FileModifiedIndex.from_parquet(file_index_parquet)
+    paths = list(Crawler(tmp_path, include=["*.txt"], with_stat=True))
+    assert not any(index(path) for path in paths)
+
+    # The crawled stat is used, so later changes aren't seen.
+    dummy_files[1].touch()
+    assert not any(index(path) for path in paths)
+    assert index(dummy_files[1])
+
 
 if __name__ == "__main__":
     pytest.main([__file__])
@@ -1,10 +1,13 @@
 from dataclasses import dataclass
-from typing import Any
+from typing import Any, Optional
 
+import numpy as np
+import pandas as pd
 import pyarrow as pa
 import pytest
 
 from elbow import record
+from elbow.dtypes import PaJSONType, PaNDArrayType, PdJSONDtype
 
 
 @dataclass
@@ -14,6 +17,12 @@ class Record:
     c: Any
 
 
+@dataclass
+class StrAnnotRecord:
+    a: "int"
+    b: "Optional[str]"
+
+
 def test_record_types():
     rec = record.Record({"a": 1, "b": 2.3}, types={"a": "int32"})
 
@@ -34,6 +43,20 @@ def test_record_to_arrow():
     assert arrow_rec.to_pylist()[0] == rec
 
 
+def test_arrow_batches():
+    recs = [{"a": ii, "b": float(ii), "extra": None} for ii in range(10)]
+    schema = pa.schema({"a": pa.int32(), "b": pa.float64(), "c": pa.string()})
+
+    batches = list(record.arrow_batches(recs, schema, batch_size=4))
+    assert [batch.num_rows for batch in batches] == [4, 4, 2]
+    assert all(batch.schema.equals(schema) for batch in batches)
+
+    table = pa.Table.from_batches(batches)
+    assert table.to_pylist() == [
+        {"a": ii, "b": float(ii), "c": None} for ii in range(10)
+    ]
+
+
 def test_record_to_dict():
     rec = record.Record({"a": 1, "b": 2.3})
     dict_rec = rec.to_dict()
@@ -69,6 +92,29 @@ def test_record_from_dataclass():
     assert rec.type("c") is None
 
 
+def test_record_from_dataclass_str_annotations():
+    rec = record.Record.from_dataclass(StrAnnotRecord(1, None))
+    assert rec.type("b") == Optional[str]
+    assert rec.arrow_schema().equals(pa.schema({"a": pa.int64(), "b": pa.string()}))
+
+
+def test_record_batch_dataclass():
+    batch = record.RecordBatch(chunk_size=4)
+    batch.extend(Record(ii, float(ii), None if ii < 3 else "abc") for ii in range(10))
+    batch.append({"a": 10, "d": True})
+    batch.append(Record(11, 11.0, "def"))
+
+    expected_schema = pa.schema(
+        {"a": pa.int64(), "b": pa.float64(), "c": pa.string(), "d": pa.bool_()}
+    )
+    assert batch.arrow_schema().equals(expected_schema)
+
+    table = batch.to_arrow()
+    assert table["a"].to_pylist() == list(range(12))
+    assert table["c"].null_count == 4
+    assert table["d"].to_pylist() == 10 * [None] + [True, None]
+
+
 def test_as_record():
     data = {"a": 1, "b": 2.3, "c": "abc"}
     rec1 = record.as_record(data)  # from dict
@@ -117,5 +163,155 @@ def test_record_batch():
     assert df["d"].isna().sum() == 2
 
 
+def test_record_batch_to_df():
+    recs = [{"a": ii, "b": "abc", "c": {"x": ii}} for ii in range(5)]
+    batch = record.RecordBatch(schema={"c": "json"}, strict=False)
+    batch.extend(recs)
+
+    df = batch.to_df(dtype_backend="pyarrow", release=True)
+    assert df.shape == (5, 3)
+    assert isinstance(df["a"].dtype, pd.ArrowDtype)
+    assert isinstance(df["c"].dtype, PdJSONDtype)
+    assert df["c"].tolist() == [{"x": ii} for ii in range(5)]
+    # Batch is emptied by release
+    assert len(batch) == 0
+
+    with pytest.raises(ValueError):
+        batch.to_df(dtype_backend="numpy_nullable")
+
+
+def test_record_batch_adaptive_type():
+    recs = [
+        record.Record({"a": ii, "b": {"x": ii, "y": [ii]}}, types={"b": "json<auto>"})
+        for ii in range(10)
+    ]
+    batch = record.RecordBatch(chunk_size=4)
+    batch.extend(recs)
+
+    # Layout is fixed by the first chunk
+    table = batch.to_arrow()
+    expected_type = PaJSONType(fields={"x": pa.int64()})
+    assert table.schema.field("b").type == expected_type
+    assert table["b"].to_pylist() == [rec["b"] for rec in recs]
+
+    table = record.arrow_table(recs, recs[0].arrow_schema())
+    assert table.schema.field("b").type == expected_type
+
+
+def test_record_batch_promotion():
+    recs = [
+        {"a": 1, "b": [1], "c": {"x": 1}, "d": None},
+        {"a": 2, "b": None, "c": None, "d": None},
+        {"a": 2.5, "b": [1.5], "c": {"x": 2, "y": "abc"}, "d": None},
+        {"a": None, "b": [], "c": {"x": 3.5}, "d": "abc"},
+        {"a": 3},
+    ]
+    batch = record.RecordBatch(chunk_size=2)
+    batch.extend(recs)
+
+    expected_schema = pa.schema(
+        {
+            "a": pa.float64(),
+            "b": pa.list_(pa.float64()),
+            "c": pa.struct({"x": pa.float64(), "y": pa.string()}),
+            "d": pa.string(),
+        }
+    )
+    table = batch.to_arrow()
+    assert table.schema.equals(expected_schema)
+    assert table["a"].to_pylist() == [1.0, 2.0, 2.5, None, 3.0]
+    assert table["c"].to_pylist()[:3] == [
+        {"x": 1.0, "y": None},
+        None,
+        {"x": 2.0, "y": "abc"},
+    ]
+
+    # Declared types are not promoted
+    batch = record.RecordBatch(schema={"a": "int64"}, chunk_size=2)
+    with pytest.raises(pa.ArrowInvalid):
+        batch.extend([{"a": 1}, {"a": 2.5}])
+
+    batch = record.RecordBatch(chunk_size=2)
+    with pytest.raises(ValueError):
+        batch.extend([{"a": 1}, {"a": 2}, {"a": "abc"}, {"a": "def"}])
+
+
+def test_record_nested_extension():
+    recs = [
+        {"arrays": [np.ones((2, 2)), np.zeros((1, 3))], "meta": {"info": {"a": [1]}}},
+        {"arrays": None, "meta": None},
+        {"arrays": [], "meta": {"info": None}},
+    ]
+    types = {"arrays": "list<ndarray<float64>>", "meta": "struct<info: json>"}
+    schema = record.Record(recs[0], types=types).arrow_schema()
+    assert schema.field("arrays").type == pa.list_(PaNDArrayType(pa.float64()))
+    assert schema.field("meta").type == pa.struct({"info": PaJSONType()})
+
+    table = record.arrow_table(recs, schema)
+    assert table.schema.equals(schema)
+    assert table["meta"].to_pylist() == [rec["meta"] for rec in recs]
+
+    df = record.table_to_df(table)
+    arrays = df["arrays"].tolist()
+    assert isinstance(arrays[0][0], np.ndarray)
+    assert np.all(arrays[0][1] == recs[0]["arrays"][1])  # type: ignore
+    assert arrays[1:] == [None, []]
+    assert df["meta"].tolist() == [rec["meta"] for rec in recs]
+
+    batch = record.RecordBatch()
+    batch.extend(recs)
+    assert batch.to_arrow().schema.field("arrays").type == schema.field("arrays").type
+
+
+@pytest.mark.parametrize("chunk_size", [1, 16])
+def test_record_batch_nested_extension_null(chunk_size: int):
+    recs = [
+        {"m": {"arr": None, "n": 1}},
+        {"m": {"arr": np.ones((2, 2)), "n": 2}},
+        {"m": None},
+    ]
+    batch = record.RecordBatch(chunk_size=chunk_size)
+    batch.extend(recs)
+    table = batch.to_arrow()
+    assert table.schema.field("m").type == pa.struct(
+        {"arr": PaNDArrayType(pa.float64()), "n": pa.int64()}
+    )
+    values = batch.to_df()["m"].tolist()
+    assert values[0] == {"arr": None, "n": 1}
+    assert np.all(values[1]["arr"] == 1.0)
+    assert values[2] is None
+
+
+def test_record_batch_chunks():
+    recs = [{"a": ii, "b": None} for ii in range(10)]
+    recs += [{"a": ii, "b": float(ii), "c": "abc"} for ii in range(10, 15)]
+
+    batch = record.RecordBatch(chunk_size=4)
+    batch.extend(recs)
+    assert len(batch) == 15
+
+    expected_schema = pa.schema({"a": pa.int64(), "b": pa.float64(), "c": pa.string()})
+    table = batch.to_arrow()
+    assert table.schema.equals(expected_schema)
+    assert table["a"].num_chunks == 4
+    assert table["a"].to_pylist() == list(range(15))
+    assert table["b"].null_count == 10
+    assert table["c"].null_count == 10
+
+    batch.clear()
+    assert len(batch) == 0
+    batch.append({"a": 1})
+    assert batch.to_arrow().to_pylist() == [{"a": 1, "b": None, "c": None}]
+
+
+def test_record_batch_failed_chunk():
+    batch = record.RecordBatch(schema={"a": "int64", "b": "int64"}, chunk_size=2)
+    with pytest.raises(pa.ArrowInvalid):
+        batch.extend([{"a": 1, "b": 1}, {"a": 2, "b": "abc"}])
+    # No column is committed when any column fails to convert.
+    assert [len(chunks) for chunks in batch._chunks.values()] == [0, 0]
+    assert batch._chunk_lengths == []
+
+
 if __name__ == "__main__":
     pytest.main(["-x", __file__])
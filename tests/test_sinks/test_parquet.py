@@ -5,6 +5,7 @@ import pyarrow as pa
 import pytest
 from pyarrow import parquet as pq
 
+from elbow.dtypes import PaNDArrayType, get_dtype
 from elbow.sinks import BufferedParquetWriter
 from tests.utils_for_tests import random_record
 
@@ -38,5 +39,40 @@ def test_buffered_parquet_writer(tmp_path: Path):
     assert writer.total_bytes() == 4518248
 
 
+def test_buffered_parquet_writer_promotion(tmp_path: Path):
+    table_path = str(tmp_path / "table.parquet")
+
+    with BufferedParquetWriter(table_path, buffer_size=1024, batch_size=16) as writer:
+        for ii in range(300):
+            writer.write({"x": 0.5 if ii == 0 else ii})
+
+    table = pq.read_table(table_path)
+    assert table.num_rows == 300
+    # Ints arriving after the first write are cast to the written type.
+    assert table.schema.field("x").type == pa.float64()
+    assert table["x"][-1].as_py() == 299.0
+
+    # Wider types can't be written once the schema is fixed.
+    table_path = str(tmp_path / "table2.parquet")
+    with pytest.raises(ValueError, match="doesn't fit"):
+        with BufferedParquetWriter(table_path, buffer_size=1024) as writer:
+            for ii in range(300):
+                writer.write({"x": 0.5 if ii == 299 else ii})
+
+
+def test_buffered_parquet_writer_auto_schema(tmp_path: Path):
+    table_path = str(tmp_path / "table.parquet")
+    schema = pa.schema({"x": get_dtype("ndarray<float32, shape: auto>")})
+
+    # Adaptive types in the given schema are resolved by the first buffer.
+    with BufferedParquetWriter(table_path, schema=schema, buffer_size=1024) as writer:
+        for _ in range(100):
+            writer.write({"x": np.ones((2, 3))})
+
+    table = pq.read_table(table_path)
+    assert table.num_rows == 100
+    assert table.schema.field("x").type == PaNDArrayType(pa.float32(), shape=(2, 3))
+
+
 if __name__ == "__main__":
     pytest.main([__file__])
@@ -0,0 +1,78 @@
+import io
+import pickle
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from elbow.record import Record
+from elbow.sinks import SQLiteSink
+from tests.utils_for_tests import random_record
+
+
+def test_sqlite_sink(tmp_path: Path):
+    rng = np.random.default_rng(2022)
+    db_path = tmp_path / "table.db"
+    num_records = 1000
+
+    with SQLiteSink(db_path, index=["c"], batch_size=256) as sink:
+        for ii in range(num_records):
+            rec = random_record(rng)
+            # new column partway through
+            if ii >= 500:
+                rec["e"] = ii
+            sink.write(rec)
+        assert sink.total_rows() == num_records
+
+    conn = sqlite3.connect(db_path)
+    (count,) = conn.execute("SELECT COUNT(*) FROM elbow").fetchone()
+    assert count == num_records
+
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(elbow)")]
+    assert columns == ["a", "b", "c", "d", "e"]
+
+    (nulls,) = conn.execute("SELECT COUNT(*) FROM elbow WHERE e IS NULL").fetchone()
+    assert nulls == 500
+
+    indices = [row[1] for row in conn.execute("PRAGMA index_list(elbow)")]
+    assert indices == ["elbow_c_idx"]
+
+    (mode,) = conn.execute("PRAGMA journal_mode").fetchone()
+    assert mode == "wal"
+    conn.close()
+
+    with pytest.raises(FileExistsError):
+        SQLiteSink(db_path)
+
+
+def test_sqlite_sink_extension_types(tmp_path: Path):
+    db_path = tmp_path / "table.db"
+    array = np.arange(6, dtype=np.float32).reshape(2, 3)
+    rec = Record(
+        {"meta": {"a": 1}, "obj": {1, 2}, "array": array, "shred": {"b": 2}},
+        types={
+            "meta": "json",
+            "obj": "pickle",
+            "array": "ndarray<float32>",
+            "shred": "json<auto>",
+        },
+    )
+
+    with SQLiteSink(db_path) as sink:
+        sink.write(rec)
+
+    conn = sqlite3.connect(db_path)
+    types = [row[2] for row in conn.execute("PRAGMA table_info(elbow)")]
+    assert types == ["TEXT", "BLOB", "BLOB", "TEXT"]
+
+    meta, obj, array_blob, shred = conn.execute("SELECT * FROM elbow").fetchone()
+    assert meta == '{"a": 1}'
+    assert shred == '{"b": 2}'
+    assert pickle.loads(obj) == {1, 2}
+    assert np.array_equal(np.load(io.BytesIO(array_blob)), array)
+    conn.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,134 @@
+import io
+import json
+import tarfile
+import zipfile
+from pathlib import Path
+
+import pytest
+from pyarrow import parquet as pq
+
+from elbow.builders import build_parquet, build_table
+from elbow.extractors import extract_file_meta
+from elbow.filters import FileModifiedIndex, hash_partitioner
+from elbow.record import as_record
+from elbow.sources import ArchiveMember, ArchiveSource
+from tests.utils_for_tests import random_jsonl_batch
+
+NUM_ARCHIVES = 4
+NUM_MEMBERS = 8
+BATCH_SIZE = 16
+
+
+def extract_jsonl_member(member: ArchiveMember):
+    metadata = as_record(extract_file_meta(member))
+    for line in io.TextIOWrapper(member):
+        yield metadata + json.loads(line)
+
+
+@pytest.fixture
+def archives(tmp_path: Path) -> Path:
+    batches = tmp_path / "batches"
+    batches.mkdir()
+    for ii in range(NUM_ARCHIVES):
+        paths = [
+            random_jsonl_batch(batches, BATCH_SIZE, seed=(ii * NUM_MEMBERS + jj))
+            for jj in range(NUM_MEMBERS)
+        ]
+        if ii % 2 == 0:
+            with tarfile.open(tmp_path / f"bundle{ii}.tar.gz", "w:gz") as tar:
+                tar.add(batches, arcname="batches", recursive=False)
+                for path in paths:
+                    tar.add(path, arcname=f"batches/{path.name}")
+                tar.addfile(tarfile.TarInfo("README.md"), io.BytesIO(b""))
+        else:
+            with zipfile.ZipFile(tmp_path / f"bundle{ii}.zip", "w") as zf:
+                zf.writestr("batches/", "")
+                for path in paths:
+                    zf.write(path, arcname=f"batches/{path.name}")
+                zf.writestr("README.md", "")
+        for path in paths:
+            path.unlink()
+    return tmp_path
+
+
+def test_archive_source(archives: Path):
+    source = ArchiveSource(str(archives / "bundle*"), exclude="*.md")
+    members = []
+    for member in source:
+        assert isinstance(member, ArchiveMember)
+        assert str(member) == str(Path(member.archive) / member.member)
+        assert member.member.startswith("batches/")
+        assert member.seekable() == member.archive.endswith(".zip")
+        assert len(member.read()) == member.size
+        members.append(member)
+    assert len(members) == NUM_ARCHIVES * NUM_MEMBERS
+
+    # Handles are closed when the next member is generated.
+    assert all(member.closed for member in members)
+    with pytest.raises(ValueError):
+        members[0].read()
+
+    source = ArchiveSource(sorted(archives.glob("bundle*")), include="*.md")
+    names = [(Path(m.archive).name, m.member) for m in source]
+    assert names == [
+        (f"bundle{ii}.{'tar.gz' if ii % 2 == 0 else 'zip'}", "README.md")
+        for ii in range(NUM_ARCHIVES)
+    ]
+
+
+def test_archive_source_tar_ending_with_zip(tmp_path: Path):
+    inner = io.BytesIO()
+    with zipfile.ZipFile(inner, "w") as zf:
+        zf.writestr("x.txt", "x")
+
+    # An uncompressed tar ending with a zip member also looks like a zip.
+    for name in ["bundle.tar", "bundle.bin"]:
+        with tarfile.open(tmp_path / name, "w") as tar:
+            tar.addfile(tarfile.TarInfo("a.txt"), io.BytesIO(b""))
+            info = tarfile.TarInfo("inner.zip")
+            info.size = len(inner.getvalue())
+            tar.addfile(info, io.BytesIO(inner.getvalue()))
+        assert zipfile.is_zipfile(tmp_path / name)
+
+        members = [m.member for m in ArchiveSource([tmp_path / name])]
+        assert members == ["a.txt", "inner.zip"]
+
+
+def test_archive_source_partition(archives: Path):
+    source = ArchiveSource(str(archives / "bundle*"), include="*.json")
+    expected = sorted(str(member) for member in source)
+
+    partitions = []
+    for worker_id in range(2):
+        partitioner = hash_partitioner(worker_id, 2)
+        members = list(source.filter_archives(partitioner))
+        # Each archive belongs to exactly one partition.
+        assert all(partitioner(member.archive) for member in members)
+        partitions.extend(str(member) for member in members)
+    assert sorted(partitions) == expected
+
+
+def test_archive_source_build(archives: Path):
+    source = ArchiveSource(str(archives / "bundle*"), include="*.json")
+    df = build_table(source, extract_jsonl_member, workers=2)
+    assert len(df) == NUM_ARCHIVES * NUM_MEMBERS * BATCH_SIZE
+    assert df["file_path"].nunique() == NUM_ARCHIVES * NUM_MEMBERS
+    assert df["file_path"].str.startswith(str(archives)).all()
+    assert df["link_target"].isna().all()
+
+    pq_path = archives / "dset.pqds"
+    build_parquet(source, extract_jsonl_member, pq_path, workers=2)
+    index = FileModifiedIndex.from_parquet(pq_path)
+    assert not any(index(member) for member in source)
+
+    # Only the members of a new archive are extracted in an incremental update.
+    with zipfile.ZipFile(archives / "bundle_new.zip", "w") as zf:
+        zf.writestr("new.json", json.dumps({"a": 1}))
+    build_parquet(source, extract_jsonl_member, pq_path, incremental=True)
+    index = FileModifiedIndex.from_parquet(pq_path)
+    assert str(archives / "bundle_new.zip" / "new.json") in index
+    assert pq.read_table(pq_path).num_rows == len(df) + 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
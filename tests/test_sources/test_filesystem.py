@@ -1,8 +1,12 @@
+import os
+import time
 from pathlib import Path
 
 import pytest
 
-from elbow.sources.filesystem import Crawler
+from elbow.extractors import extract_file_meta
+from elbow.sources import filesystem
+from elbow.sources.filesystem import Crawler, StatPath
 
 
 @pytest.fixture
@@ -34,5 +38,159 @@ def test_crawler(dummy_tree: Path):
     ]
 
 
+@pytest.mark.parametrize("files_only", [False, True])
+def test_crawler_parallel(dummy_tree: Path, files_only: bool):
+    for ii in range(20):
+        (dummy_tree / "A" / f"{ii:02d}").mkdir()
+        (dummy_tree / "A" / f"{ii:02d}" / "d.txt").touch()
+    (dummy_tree / "link").symlink_to(dummy_tree / "A", target_is_directory=True)
+
+    kwargs = dict(root=dummy_tree, skip=[".*"], files_only=files_only)
+    expected = list(Crawler(**kwargs, ordered=True))
+    assert sorted(expected) == sorted(Crawler(**kwargs))
+    assert dummy_tree / "link" / "b.txt" not in expected
+
+    paths = Crawler(**kwargs, threads=4, ordered=True)
+    assert list(paths) == expected
+
+    paths = Crawler(**kwargs, threads=4)
+    assert sorted(paths) == sorted(expected)
+
+    # Stopping early cancels the remaining scans
+    crawl = Crawler(**kwargs, threads=4).crawl()
+    assert next(crawl) in expected
+    crawl.close()
+
+    with pytest.raises(ValueError):
+        Crawler(dummy_tree, threads=0)
+
+
+@pytest.mark.parametrize("ordered", [False, True])
+def test_crawler_backpressure(dummy_tree: Path, ordered: bool, monkeypatch):
+    for ii in range(40):
+        (dummy_tree / "A" / f"{ii:02d}").mkdir()
+        (dummy_tree / "A" / f"{ii:02d}" / "d.txt").touch()
+
+    scanned = []
+    scandir = filesystem._scandir
+
+    def _scandir(path: str, follow_links: bool):
+        scanned.append(path)
+        return scandir(path, follow_links)
+
+    monkeypatch.setattr(filesystem, "_scandir", _scandir)
+
+    # Only a bounded number of scans run ahead of a stalled consumer.
+    crawl = Crawler(dummy_tree, threads=2, ordered=ordered).crawl()
+    for _ in range(8):
+        next(crawl)
+    time.sleep(0.1)
+    assert len(scanned) <= 4 + 2 * filesystem._SCANS_PER_THREAD
+    assert len(list(crawl)) + 8 == len(list(Crawler(dummy_tree)))
+    assert len(scanned) == 46
+
+
+@pytest.mark.parametrize("threads", [None, 4])
+def test_crawler_with_stat(dummy_tree: Path, threads: int):
+    (dummy_tree / "link.txt").symlink_to(dummy_tree / "A" / "b.txt")
+    (dummy_tree / "broken.txt").symlink_to(dummy_tree / "missing.txt")
+
+    paths = list(Crawler(dummy_tree, files_only=True, with_stat=True, threads=threads))
+    expected = Crawler(dummy_tree, files_only=True)
+    assert sorted(paths) == sorted(expected)
+    assert all(isinstance(path, StatPath) for path in paths)
+
+    path = dummy_tree / "A" / "c.json"
+    stat_path = paths[paths.index(path)]
+    size = path.stat().st_size
+    path.write_text("abc")
+    # Stat results are cached from the crawl
+    assert stat_path.stat().st_size == size
+    assert stat_path.absolute().stat().st_size == size
+    assert extract_file_meta(stat_path).mod_time == stat_path.stat().st_mtime
+    # But derived paths aren't
+    assert (stat_path.parent / "c.json").stat().st_size == 3
+
+    link_path = paths[paths.index(dummy_tree / "link.txt")]
+    assert link_path.is_symlink()
+    assert extract_file_meta(link_path).link_target == str(dummy_tree / "A" / "b.txt")
+
+    broken_path = paths[paths.index(dummy_tree / "broken.txt")]
+    assert broken_path.is_symlink() and not broken_path.exists()
+    with pytest.raises(FileNotFoundError):
+        broken_path.stat()
+    assert broken_path.exists(follow_symlinks=False)
+    assert broken_path.stat(follow_symlinks=False).st_size > 0
+
+    # Paths without a cached stat hit the filesystem
+    uncached = StatPath(dummy_tree, "broken.txt")
+    assert uncached.is_symlink() and not uncached.exists()
+    assert uncached.exists(follow_symlinks=False)
+    assert uncached.lstat() == broken_path.stat(follow_symlinks=False)
+    with pytest.raises(FileNotFoundError):
+        uncached.stat()
+
+
+def test_crawler_cache(
+    dummy_tree: Path, tmp_path_factory: pytest.TempPathFactory, monkeypatch
+):
+    cache = tmp_path_factory.mktemp("cache") / "snapshot.json"
+    scanned = []
+    scandir = filesystem._scandir
+
+    def _scandir(path: str, follow_links: bool):
+        scanned.append(Path(path))
+        return scandir(path, follow_links)
+
+    monkeypatch.setattr(filesystem, "_scandir", _scandir)
+
+    # Directories modified just before the crawl aren't cached
+    kwargs = dict(root=dummy_tree, skip=[".*"], cache=cache, ordered=True)
+    expected = list(Crawler(**kwargs))
+    assert cache.exists()
+    assert len(scanned) == 4
+    scanned.clear()
+    assert list(Crawler(**kwargs)) == expected
+    assert len(scanned) == 4
+
+    for subdir in [
+        dummy_tree,
+        dummy_tree / "A",
+        dummy_tree / "B",
+        dummy_tree / "B" / "b",
+    ]:
+        os.utime(subdir, ns=(10**9, 10**9))
+    scanned.clear()
+    assert list(Crawler(**kwargs)) == expected
+    assert len(scanned) == 4
+
+    # Nothing changed
+    scanned.clear()
+    assert list(Crawler(**kwargs)) == expected
+    assert scanned == []
+
+    # Only the changed directory is listed again
+    (dummy_tree / "B" / "b" / "d.txt").touch()
+    os.utime(dummy_tree / "B" / "b", ns=(0, 0))
+    scanned.clear()
+    paths = list(Crawler(**kwargs, with_stat=True))
+    assert scanned == [dummy_tree / "B" / "b"]
+    assert sorted(paths) == sorted(expected + [dummy_tree / "B" / "b" / "d.txt"])
+    assert all(isinstance(path, StatPath) for path in paths)
+
+    # A snapshot for a different root is ignored
+    scanned.clear()
+    assert list(Crawler(dummy_tree / "A", cache=cache)) == sorted(
+        (dummy_tree / "A").iterdir()
+    )
+    assert scanned == [dummy_tree / "A"]
+
+    # As is a snapshot without listings
+    cache.write_text('{"version": 1}')
+    scanned.clear()
+    assert sorted(Crawler(**kwargs)) == sorted(paths)
+    assert len(scanned) == 4
+
+
 if __name__ == "__main__":
     pytest.main([__file__])
@@ -0,0 +1,55 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+from pyarrow import compute as pc
+
+from elbow.sinks import BufferedParquetWriter
+from elbow.tiling import read_tiles, tile_array, tile_grid, tile_records
+
+
+def test_tile_array():
+    array = np.arange(35).reshape(5, 7)
+    assert tile_grid(array.shape, (2, 3)) == (3, 3)
+
+    tiles = list(tile_array(array, (2, 3)))
+    assert len(tiles) == 9
+    tile_id, index, tile = tiles[-1]
+    assert tile_id == 8 and index == (2, 2)
+    assert np.array_equal(tile, array[4:, 6:])
+
+
+def test_read_tiles(tmp_path: Path):
+    rng = np.random.default_rng(2023)
+    arrays = {
+        "a": rng.random((100, 70, 3)).astype(np.float32),
+        "b": rng.random((30, 30, 3)).astype(np.float32),
+    }
+
+    pq_path = tmp_path / "tiles.parquet"
+    with BufferedParquetWriter(pq_path) as writer:
+        for name, array in arrays.items():
+            for rec in tile_records(array, (32, 32, 3), file_path=name):
+                writer.write(rec)
+
+    a, b = arrays["a"], arrays["b"]
+    filt = pc.field("file_path") == "a"
+    crop = read_tiles(pq_path, (slice(10, 50), slice(60, 70)), filter=filt)
+    assert np.array_equal(crop, a[10:50, 60:70])
+    assert np.array_equal(read_tiles(pq_path, filter=filt), a)
+    assert np.array_equal(
+        read_tiles(pq_path, (5, slice(None), 1), filter=filt), a[5, :, 1]
+    )
+
+    filt = pc.field("file_path") == "b"
+    assert np.array_equal(read_tiles(pq_path, slice(-5, None), filter=filt), b[-5:])
+
+    with pytest.raises(ValueError):
+        read_tiles(pq_path, slice(0, 10, 2), filter=filt)
+    # Multiple arrays match
+    with pytest.raises(ValueError):
+        read_tiles(pq_path)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -1,5 +1,7 @@
 # pylint: disable=redefined-outer-name
+import fnmatch
 import logging
+import os
 from pathlib import Path
 
 import pytest
@@ -19,6 +21,18 @@ def test_atomicopen(tmp_path: Path):
     assert not Path(f.name).exists()
 
 
+def test_cpu_count(monkeypatch):
+    monkeypatch.delenv("SLURM_CPUS_ON_NODE", raising=False)
+    if hasattr(os, "sched_getaffinity"):
+        monkeypatch.setattr(os, "sched_getaffinity", lambda pid: {0, 2})
+        assert ut.cpu_count() == 2
+    else:
+        assert ut.cpu_count() == (os.cpu_count() or 1)
+
+    monkeypatch.setenv("SLURM_CPUS_ON_NODE", "3")
+    assert ut.cpu_count() == 3
+
+
 def test_atomicopen_error(tmp_path: Path):
     fname = tmp_path / "file.txt"
     try:
@@ -60,5 +74,25 @@ def test_detect_size_units(size: int, expected: float, expected_units: str):
     assert units == expected_units
 
 
+@pytest.mark.parametrize(
+    "name",
+    ["a.txt", "a.txt.gz", "b.json", "data_01.csv", "data_1.csv", "README", "[x].md"],
+)
+def test_glob_matcher(name: str):
+    patterns = ["*.txt", "*.json", "data_??.csv", "README", "[[]x].md"]
+    matcher = ut.GlobMatcher(patterns)
+    expected = any(fnmatch.fnmatch(name, pat) for pat in patterns)
+    assert matcher.match(name) == expected
+
+
+def test_glob_matcher_filter():
+    names = ["b.txt", "a.json", "a.txt", "c.csv"]
+    matcher = ut.GlobMatcher(["*.txt", "a.*"])
+    # Order is preserved and names aren't duplicated
+    assert matcher.filter(names) == ["b.txt", "a.json", "a.txt"]
+    assert matcher.filter(names, exclude=True) == ["c.csv"]
+    assert not ut.GlobMatcher([])
+
+
 if __name__ == "__main__":
     pytest.main([__file__])